@@ -26,6 +26,48 @@ options:
       - A dict of filters to apply. Each dict item consists of a filter key and a filter value. See U(http://docs.aws.amazon.com/AWSEC2/latest/APIReference/API_DescribeInstances.html) for possible filters.
     required: false
     default: null
+  regions:
+    description:
+      - A list of regions to gather facts from concurrently, instead of the
+        region of the connection. With several regions, each item is given
+        the C(region) it was found in.
+    required: false
+    default: null
+    version_added: "2.2"
+  threads:
+    description:
+      - Number of regions described at the same time.
+    required: false
+    default: 4
+    version_added: "2.2"
+  page_size:
+    description:
+      - Number of items asked for in each request, the following pages
+        being fetched until all are returned. By default everything is
+        asked for in one request.
+    required: false
+    default: null
+    version_added: "2.2"
+  fields:
+    description:
+      - Only return these keys of each item, eg. C(id), C(private_ip_address) and C(tags).
+    required: false
+    default: null
+    version_added: "2.2"
+  cache_dir:
+    description:
+      - Directory where the facts gathered are kept. For I(cache_ttl)
+        seconds, a task with the same options reads them from there instead
+        of describing the regions again.
+    required: false
+    default: null
+    version_added: "2.2"
+  cache_ttl:
+    description:
+      - Number of seconds the facts kept in I(cache_dir) are reused.
+    required: false
+    default: 300
+    version_added: "2.2"
 author:
     - "Michael Schuett (@michaeljs1990)"
 extends_documentation_fragment:
@@ -56,6 +98,18 @@ EXAMPLES = '''
       vpc-id: vpc-123456
       instance-type: t2.small
 
+
+# Gather the id, private IP and tags of all running instances of three
+# regions, reusing them for 10 minutes
+- ec2_remote_facts:
+    regions: [ 'us-east-1', 'us-west-2', 'eu-west-1' ]
+    filters:
+      instance-state-name: running
+    page_size: 1000
+    fields: [ 'id', 'private_ip_address', 'tags' ]
+    cache_dir: /var/tmp/ec2_facts
+    cache_ttl: 600
+
 '''
 
 try:
@@ -65,6 +119,122 @@ try:
 except ImportError:
     HAS_BOTO = False
 
+import hashlib
+import os
+import threading
+import time
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+# Each region is described in its own thread, every instance found is
+# turned into a dict and projected on the fields asked for, and the result
+# may be kept on local disk for a while.
+
+def json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+def cached_facts_path(cache_dir, key):
+    return os.path.join(cache_dir, "%s.json" % hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+def read_cached_facts(cache_dir, cache_ttl, key):
+    if not cache_dir:
+        return None
+    path = cached_facts_path(cache_dir, key)
+    try:
+        if time.time() - os.path.getmtime(path) > cache_ttl:
+            return None
+        f = open(path)
+        try:
+            return json.load(f)
+        finally:
+            f.close()
+    except (IOError, OSError, ValueError):
+        return None
+
+def write_cached_facts(cache_dir, key, data):
+    if not cache_dir:
+        return
+    content = json.dumps(data, default=json_default)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    path = cached_facts_path(cache_dir, key)
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+    try:
+        os.write(fd, content.encode('utf-8'))
+    finally:
+        os.close(fd)
+    os.rename(tmp, path)
+
+def project_fields(info, fields):
+    if not fields:
+        return info
+    return dict((field, info.get(field)) for field in fields)
+
+def gather_ec2_facts(module, region, describe, transform):
+    """
+    Describe every region through a pool of threads, describe(region)
+    yielding the objects found in a region and transform(obj) turning one
+    into a dict. Returns the list of dicts, read from cache_dir when it
+    holds a result younger than cache_ttl for the same options.
+    """
+    regions = module.params.get('regions') or [region]
+    if not regions[0]:
+        module.fail_json(msg="region must be specified")
+    fields = module.params.get('fields')
+
+    key_params = dict((k, v) for k, v in module.params.items() if k not in ('cache_dir', 'cache_ttl', 'threads'))
+    key = json.dumps([describe.__name__, regions, key_params], sort_keys=True, default=json_default)
+    cached = read_cached_facts(module.params.get('cache_dir'), module.params.get('cache_ttl'), key)
+    if cached is not None:
+        return cached
+
+    results = dict((name, []) for name in regions)
+    errors = []
+    pending = queue.Queue()
+    for name in regions:
+        pending.put(name)
+
+    def worker():
+        while not errors:
+            try:
+                name = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                for obj in describe(name):
+                    info = project_fields(transform(obj), fields)
+                    if len(regions) > 1:
+                        info.setdefault('region', name)
+                    results[name].append(info)
+            except Exception, e:
+                errors.append("%s: %s" % (name, getattr(e, 'message', None) or str(e)))
+
+    workers = [threading.Thread(target=worker) for i in range(max(1, min(module.params.get('threads'), len(regions))))]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    if errors:
+        module.fail_json(msg=", ".join(errors))
+
+    facts = []
+    for name in regions:
+        facts.extend(results[name])
+    write_cached_facts(module.params.get('cache_dir'), key, facts)
+    return facts
+
+
 def get_instance_info(instance):
 
     # Get groups
@@ -120,18 +290,24 @@ def get_instance_info(instance):
     return instance_info
 
 
-def list_ec2_instances(connection, module):
+def list_ec2_instances(module, region, aws_connect_params):
 
     filters = module.params.get("filters")
-    instance_dict_array = []
+    page_size = module.params.get("page_size")
 
-    try:
-        all_instances = connection.get_only_instances(filters=filters)
-    except BotoServerError as e:
-        module.fail_json(msg=e.message)
+    def instances(name):
+        connection = connect_to_aws(boto.ec2, name, **aws_connect_params)
+        next_token = None
+        while True:
+            reservations = connection.get_all_reservations(filters=filters, max_results=page_size, next_token=next_token)
+            for reservation in reservations:
+                for instance in reservation.instances:
+                    yield instance
+            next_token = getattr(reservations, 'next_token', None)
+            if not next_token:
+                break
 
-    for instance in all_instances:
-        instance_dict_array.append(get_instance_info(instance))
+    instance_dict_array = gather_ec2_facts(module, region, instances, get_instance_info)
 
     module.exit_json(instances=instance_dict_array)
 
@@ -140,7 +316,13 @@ def main():
     argument_spec = ec2_argument_spec()
     argument_spec.update(
         dict(
-            filters = dict(default=None, type='dict')
+            filters = dict(default=None, type='dict'),
+            regions = dict(default=None, type='list'),
+            threads = dict(default=4, type='int'),
+            page_size = dict(default=None, type='int'),
+            fields = dict(default=None, type='list'),
+            cache_dir = dict(default=None, type='path'),
+            cache_ttl = dict(default=300, type='int'),
         )
     )
 
@@ -151,15 +333,10 @@ def main():
 
     region, ec2_url, aws_connect_params = get_aws_connection_info(module)
 
-    if region:
-        try:
-            connection = connect_to_aws(boto.ec2, region, **aws_connect_params)
-        except (boto.exception.NoAuthHandlerFound, AnsibleAWSError), e:
-            module.fail_json(msg=str(e))
-    else:
+    if not (region or module.params.get('regions')):
         module.fail_json(msg="region must be specified")
 
-    list_ec2_instances(connection, module)
+    list_ec2_instances(module, region, aws_connect_params)
 
 # import module snippets
 from ansible.module_utils.basic import *
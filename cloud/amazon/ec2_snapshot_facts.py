@@ -47,6 +47,49 @@ options:
       names and values are case sensitive.
     required: false
     default: {}
+  page_size:
+    description:
+      - Number of items asked for in each request, the following pages
+        being fetched until all are returned. By default everything is
+        asked for in one request.
+    required: false
+    default: null
+    version_added: "2.2"
+  state_file:
+    description:
+      - Local file keeping, for the region, the start time of the newest
+        snapshot returned by the previous run with the same snapshot_ids,
+        owner_ids, restorable_by_user_ids and filters. Only the snapshots
+        started after it are returned and aggregated, and the file is
+        updated at the end of the run.
+      - The snapshots are still listed in full, as DescribeSnapshots cannot
+        filter on a range of start times, but the older ones are skipped
+        as soon as they are read.
+    required: false
+    default: null
+    version_added: "2.2"
+  aggregate_by_volume:
+    description:
+      - Return in C(volumes) the number of snapshots and their total size
+        for each volume, computed as the snapshots are listed.
+    required: false
+    default: false
+    version_added: "2.2"
+  aggregate_by_tags:
+    description:
+      - Return in C(tags), for each value of each of these tag keys, the
+        number of snapshots and the oldest and newest of them.
+    required: false
+    default: null
+    version_added: "2.2"
+  return_snapshots:
+    description:
+      - Whether to return the snapshots themselves. Set to C(false) with the
+        aggregate options to keep only the aggregates, whatever the number
+        of snapshots.
+    required: false
+    default: true
+    version_added: "2.2"
 notes:
   - By default, the module will return all snapshots, including public ones. To limit results to snapshots owned by \
   the account use the filter 'owner-id'.
@@ -92,6 +135,18 @@ EXAMPLES = '''
     filters:
       status: error
 
+# Count the snapshots taken since the previous run and their size per
+# volume, and the oldest and newest one per application, without
+# returning the snapshots themselves
+- ec2_snapshot_facts:
+    filters:
+      owner-id: 123456789012
+    page_size: 1000
+    state_file: /var/lib/ansible/snapshots.state
+    aggregate_by_volume: true
+    aggregate_by_tags: [ 'application' ]
+    return_snapshots: false
+
 '''
 
 RETURN = '''
@@ -153,6 +208,21 @@ data_encryption_key_id:
     corresponds to the data encryption key that was used to encrypt the original volume or snapshot copy.
     type: string
     sample: "arn:aws:kms:ap-southeast-2:012345678900:key/74c9742a-a1b2-45cb-b3fe-abcdef123456"
+volumes:
+    description: With aggregate_by_volume, the number of snapshots and their total size in GiB for each volume.
+    type: dictionary
+    sample: "{ 'vol-01234567': { 'count': 14, 'total_size': 112 } }"
+tags:
+    description: With aggregate_by_tags, for each tag key and value, the number of snapshots and the oldest and \
+    newest of them.
+    type: dictionary
+    sample: "{ 'application': { 'billing': { 'count': 3, 'oldest': { 'snapshot_id': 'snap-01234567', \
+    'start_time': '2016-09-01T02:14:02.000000' }, 'newest': { 'snapshot_id': 'snap-89abcdef', \
+    'start_time': '2016-10-01T02:14:02.000000' } } } }"
+count:
+    description: The number of snapshots listed, with state_file the number of new ones.
+    type: integer
+    sample: 42
 
 '''
 
@@ -163,30 +233,143 @@ try:
 except ImportError:
     HAS_BOTO3 = False
 
+import os
+import time
 
-def list_ec2_snapshots(connection, module):
+try:
+    import json
+except ImportError:
+    import simplejson as json
 
-    snapshot_ids = module.params.get("snapshot_ids")
-    owner_ids = module.params.get("owner_ids")
-    restorable_by_user_ids = module.params.get("restorable_by_user_ids")
-    filters = ansible_dict_to_boto3_filter_list(module.params.get("filters"))
 
-    try:
-        snapshots = connection.describe_snapshots(SnapshotIds=snapshot_ids, OwnerIds=owner_ids, RestorableByUserIds=restorable_by_user_ids, Filters=filters)
-    except ClientError, e:
-        module.fail_json(msg=e.message)
+def get_snapshot_info(snapshot):
 
     # Turn the boto3 result in to ansible_friendly_snaked_names
-    snaked_snapshots = []
-    for snapshot in snapshots['Snapshots']:
-        snaked_snapshots.append(camel_dict_to_snake_dict(snapshot))
+    snaked_snapshot = camel_dict_to_snake_dict(snapshot)
 
     # Turn the boto3 result in to ansible friendly tag dictionary
-    for snapshot in snaked_snapshots:
-        if 'tags' in snapshot:
-            snapshot['tags'] = boto3_tag_list_to_ansible_dict(snapshot['tags'])
+    if 'tags' in snaked_snapshot:
+        snaked_snapshot['tags'] = boto3_tag_list_to_ansible_dict(snaked_snapshot['tags'])
+
+    return snaked_snapshot
+
+
+def snapshot_time(value):
+    """Start time as a string in UTC, which sorts like the time"""
+    if hasattr(value, 'utctimetuple'):
+        return time.strftime('%Y-%m-%dT%H:%M:%S', value.utctimetuple()) + '.%06d' % value.microsecond
+    return str(value)
+
+
+def read_snapshots_state(path, key):
+    try:
+        f = open(path)
+        try:
+            state = json.load(f)
+        finally:
+            f.close()
+    except (IOError, OSError, ValueError):
+        return {}
+    # a cursor only holds for the query it was taken with
+    if state.get('key') != key:
+        return {}
+    return state.get('regions', {})
+
+
+def write_snapshots_state(path, key, regions):
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+    try:
+        os.write(fd, json.dumps(dict(key=key, regions=regions)))
+    finally:
+        os.close(fd)
+    os.rename(tmp, path)
+
+
+class SnapshotAggregates(object):
+    """Counts updated as the snapshots are listed"""
+
+    def __init__(self, tag_keys):
+        self.tag_keys = tag_keys or []
+        self.count = 0
+        self.volumes = {}
+        self.tags = dict((key, {}) for key in self.tag_keys)
+
+    def add(self, snapshot):
+        start_time = snapshot_time(snapshot.get('StartTime'))
+        tags = dict((tag['Key'], tag['Value']) for tag in snapshot.get('Tags', []))
+        self.count += 1
+        volume = self.volumes.setdefault(snapshot.get('VolumeId'), dict(count=0, total_size=0))
+        volume['count'] += 1
+        volume['total_size'] += snapshot.get('VolumeSize') or 0
+        for key in self.tag_keys:
+            if key not in tags:
+                continue
+            entry = dict(snapshot_id=snapshot['SnapshotId'], start_time=start_time)
+            value = self.tags[key].setdefault(tags[key], dict(count=0, oldest=entry, newest=entry))
+            value['count'] += 1
+            if start_time < value['oldest']['start_time']:
+                value['oldest'] = entry
+            if start_time > value['newest']['start_time']:
+                value['newest'] = entry
+
+
+def list_ec2_snapshots(connection, module, region):
+
+    params = dict(
+        SnapshotIds=module.params.get("snapshot_ids"),
+        OwnerIds=module.params.get("owner_ids"),
+        RestorableByUserIds=module.params.get("restorable_by_user_ids"),
+        Filters=ansible_dict_to_boto3_filter_list(module.params.get("filters")),
+    )
+    query_key = json.dumps(params, sort_keys=True)
+    if module.params.get("page_size"):
+        params['MaxResults'] = module.params.get("page_size")
+
+    state_file = module.params.get("state_file")
+    cursors = {}
+    if state_file:
+        cursors = read_snapshots_state(state_file, query_key)
+    cursor = cursors.get(region, dict(start_time='', snapshot_ids=[]))
+    seen_ids = set(cursor['snapshot_ids'])
+    newest = dict(start_time=cursor['start_time'], snapshot_ids=list(cursor['snapshot_ids']))
+    aggregates = SnapshotAggregates(module.params.get("aggregate_by_tags"))
+    return_snapshots = module.params.get("return_snapshots")
+
+    snaked_snapshots = []
+    while True:
+        try:
+            result = connection.describe_snapshots(**params)
+        except ClientError, e:
+            module.fail_json(msg=e.message)
+        for snapshot in result['Snapshots']:
+            start_time = snapshot_time(snapshot.get('StartTime'))
+            # skip what was returned by the previous run
+            if start_time < cursor['start_time'] or (start_time == cursor['start_time'] and snapshot['SnapshotId'] in seen_ids):
+                continue
+            if start_time > newest['start_time']:
+                newest = dict(start_time=start_time, snapshot_ids=[])
+            if start_time == newest['start_time']:
+                newest['snapshot_ids'].append(snapshot['SnapshotId'])
+            aggregates.add(snapshot)
+            if return_snapshots:
+                snaked_snapshots.append(get_snapshot_info(snapshot))
+        if not result.get('NextToken'):
+            break
+        params['NextToken'] = result['NextToken']
+
+    if state_file:
+        cursors[region] = newest
+        write_snapshots_state(state_file, query_key, cursors)
 
-    module.exit_json(snapshots=snaked_snapshots)
+    result = dict(count=aggregates.count)
+    if return_snapshots:
+        result['snapshots'] = snaked_snapshots
+    if module.params.get("aggregate_by_volume"):
+        result['volumes'] = aggregates.volumes
+    if module.params.get("aggregate_by_tags"):
+        result['tags'] = aggregates.tags
+    module.exit_json(**result)
 
 
 def main():
@@ -197,7 +380,12 @@ def main():
             snapshot_ids=dict(default=[], type='list'),
             owner_ids=dict(default=[], type='list'),
             restorable_by_user_ids=dict(default=[], type='list'),
-            filters=dict(default={}, type='dict')
+            filters=dict(default={}, type='dict'),
+            page_size=dict(default=None, type='int'),
+            state_file=dict(default=None, type='path'),
+            aggregate_by_volume=dict(default=False, type='bool'),
+            aggregate_by_tags=dict(default=None, type='list'),
+            return_snapshots=dict(default=True, type='bool'),
         )
     )
 
@@ -217,7 +405,7 @@ def main():
     else:
         module.fail_json(msg="region must be specified")
 
-    list_ec2_snapshots(connection, module)
+    list_ec2_snapshots(connection, module, region)
 
 from ansible.module_utils.basic import *
 from ansible.module_utils.ec2 import *
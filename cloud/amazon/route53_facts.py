@@ -44,10 +44,53 @@ options:
     description:
       - The Hosted Zone ID of the DNS zone
     required: false
+  hosted_zone_ids:
+    description:
+      - "A list of Hosted Zone IDs whose record sets are all listed
+        concurrently, for query: record_sets. Each record set returned is
+        given the C(HostedZoneId) it belongs to. Implies I(paginate)."
+    required: false
+    version_added: "2.2"
+  threads:
+    description:
+      - Number of hosted zones of I(hosted_zone_ids) listed at the same time.
+    required: false
+    default: 4
+    version_added: "2.2"
   max_items:
     description:
       - Maximum number of items to return for various get/list requests
+      - With I(paginate), the number of items asked for in each request.
+    required: false
+  paginate:
+    description:
+      - "Follow NextMarker (query: hosted_zone and health_check lists) or
+        NextRecordName (query: record_sets) and return every item instead of
+        the first page."
+    required: false
+    default: false
+    version_added: "2.2"
+  name_prefix:
+    description:
+      - "Only return the record sets whose name starts with this, for query:
+        record_sets. Record names are fully qualified and end with a dot.
+        Implies I(paginate)."
+    required: false
+    version_added: "2.2"
+  record_types:
+    description:
+      - "Only return the record sets of these types, for query: record_sets.
+        Implies I(paginate)."
     required: false
+    version_added: "2.2"
+  dest:
+    description:
+      - "Write the record sets to this local file, one JSON object per line,
+        instead of returning them, for query: record_sets. Only the number of
+        record sets written is returned, which keeps the memory used and the
+        size of the result small for very large zones. Implies I(paginate)."
+    required: false
+    version_added: "2.2"
   next_marker:
     description:
       - "Some requests such as list_command: hosted_zones will return a maximum
@@ -138,6 +181,29 @@ EXAMPLES = '''
     max_items: 20
   register: record_sets
 
+- name: List every resource record set in a given hosted zone
+  route53_facts:
+    query: record_sets
+    hosted_zone_id: 'ZZZ1111112222'
+    paginate: true
+  register: record_sets
+
+- name: Find the MX and TXT records of mail.example.com. in many zones
+  route53_facts:
+    query: record_sets
+    hosted_zone_ids: "{{ hosted_zones.HostedZones | map(attribute='Id') | list }}"
+    name_prefix: mail.example.com.
+    record_types: [ 'MX', 'TXT' ]
+    threads: 8
+  register: mail_records
+
+- name: Dump a very large zone to a local file
+  route53_facts:
+    query: record_sets
+    hosted_zone_id: 'ZZZ1111112222'
+    max_items: 300
+    dest: /var/tmp/ZZZ1111112222.ndjson
+
 - name: List first 20 health checks
   route53_facts:
     query: health_check
@@ -172,6 +238,53 @@ try:
 except ImportError:
     HAS_BOTO3 = False
 
+import threading
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+# Request parameters of each paginated call, and the response fields that
+# hold their value for the next page
+RECORD_SET_MARKERS = {
+    'StartRecordName': 'NextRecordName',
+    'StartRecordType': 'NextRecordType',
+    'StartRecordIdentifier': 'NextRecordIdentifier',
+}
+MARKERS = {
+    'Marker': 'NextMarker',
+}
+
+
+def paginate(call, params, items_key, markers):
+    """Call a list API until its results are not truncated, yielding the items of every page"""
+    params = dict(params)
+    while True:
+        results = call(**params)
+        for item in results.get(items_key, []):
+            yield item
+        if not results.get('IsTruncated'):
+            return
+        for param, field in markers.items():
+            if field in results:
+                params[param] = results[field]
+            else:
+                params.pop(param, None)
+
+
+def paginated(module):
+    for option in ('paginate', 'hosted_zone_ids', 'name_prefix', 'record_types', 'dest'):
+        if module.params.get(option):
+            return True
+    return False
+
 
 def get_hosted_zone(client, module):
     params = dict()
@@ -214,6 +327,10 @@ def list_hosted_zones(client, module):
     if module.params.get('delegation_set_id'):
         params['DelegationSetId'] = module.params.get('delegation_set_id')
 
+    if paginated(module):
+        zones = list(paginate(client.list_hosted_zones, params, 'HostedZones', MARKERS))
+        return dict(HostedZones=zones, IsTruncated=False)
+
     results = client.list_hosted_zones(**params)
     return results
 
@@ -304,14 +421,98 @@ def list_health_checks(client, module):
     if module.params.get('next_marker'):
         params['Marker'] = module.params.get('next_marker')
 
+    if paginated(module):
+        checks = list(paginate(client.list_health_checks, params, 'HealthChecks', MARKERS))
+        return dict(HealthChecks=checks, IsTruncated=False)
+
     results = client.list_health_checks(**params)
     return results
 
 
+def record_sets_filter(module):
+    """Return a predicate selecting the record sets matching name_prefix and record_types"""
+    name_prefix = module.params.get('name_prefix')
+    record_types = module.params.get('record_types')
+
+    def matches(record_set):
+        if name_prefix and not record_set['Name'].startswith(name_prefix):
+            return False
+        if record_types and record_set['Type'] not in record_types:
+            return False
+        return True
+    return matches
+
+
+def scan_record_sets(client, module, params, zone_ids):
+    """
+    List the record sets of the zones through a pool of threads, filtering
+    them as the pages come. They are written to dest as they are found if
+    it is set, otherwise returned.
+    """
+    matches = record_sets_filter(module)
+    dest = module.params.get('dest')
+    output = None
+    if dest:
+        output = open(dest, 'w')
+    lock = threading.Lock()
+    record_sets = dict((zone_id, []) for zone_id in zone_ids)
+    counts = dict((zone_id, 0) for zone_id in zone_ids)
+    errors = []
+    pending = queue.Queue()
+    for zone_id in zone_ids:
+        pending.put(zone_id)
+
+    def worker():
+        while not errors:
+            try:
+                zone_id = pending.get_nowait()
+            except queue.Empty:
+                return
+            zone_params = dict(params, HostedZoneId=zone_id)
+            try:
+                for record_set in paginate(client.list_resource_record_sets, zone_params, 'ResourceRecordSets', RECORD_SET_MARKERS):
+                    if not matches(record_set):
+                        continue
+                    if len(zone_ids) > 1 or output is not None:
+                        record_set = dict(record_set, HostedZoneId=zone_id)
+                    counts[zone_id] += 1
+                    if output is not None:
+                        line = json.dumps(record_set) + "\n"
+                        lock.acquire()
+                        try:
+                            output.write(line)
+                        finally:
+                            lock.release()
+                    else:
+                        record_sets[zone_id].append(record_set)
+            except Exception, e:
+                errors.append("%s: %s" % (zone_id, str(e)))
+
+    workers = [threading.Thread(target=worker) for i in range(max(1, min(module.params.get('threads'), len(zone_ids))))]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    if output is not None:
+        output.close()
+    if errors:
+        module.fail_json(msg="Failed to list record sets of %s" % ", ".join(errors))
+
+    if output is not None:
+        return dict(dest=dest, count=sum(counts.values()), counts=counts)
+    results = []
+    for zone_id in zone_ids:
+        results.extend(record_sets[zone_id])
+    return dict(ResourceRecordSets=results, IsTruncated=False)
+
+
 def record_sets_details(client, module):
     params = dict()
 
-    if module.params.get('hosted_zone_id'):
+    if module.params.get('hosted_zone_ids'):
+        zone_ids = module.params.get('hosted_zone_ids')
+    elif module.params.get('hosted_zone_id'):
+        zone_ids = [module.params.get('hosted_zone_id')]
         params['HostedZoneId'] = module.params.get('hosted_zone_id')
     else:
         module.fail_json(msg="Hosted Zone Id is required")
@@ -327,6 +528,10 @@ def record_sets_details(client, module):
     elif module.params.get('type'):
         params['StartRecordType'] = module.params.get('type')
 
+    if paginated(module):
+        params.pop('HostedZoneId', None)
+        return scan_record_sets(client, module, params, zone_ids)
+
     results = client.list_resource_record_sets(**params)
     return results
 
@@ -371,7 +576,13 @@ def main():
         ], required=True),
         change_id=dict(),
         hosted_zone_id=dict(),
+        hosted_zone_ids=dict(type='list'),
+        threads=dict(type='int', default=4),
         max_items=dict(type='str'),
+        paginate=dict(type='bool', default=False),
+        name_prefix=dict(),
+        record_types=dict(type='list'),
+        dest=dict(type='path'),
         next_marker=dict(),
         delegation_set_id=dict(),
         start_record_name=dict(),
@@ -403,6 +614,7 @@ def main():
         argument_spec=argument_spec,
         mutually_exclusive=[
             ['hosted_zone_method', 'health_check_method'],
+            ['hosted_zone_id', 'hosted_zone_ids'],
         ],
     )
 
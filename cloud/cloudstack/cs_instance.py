@@ -31,7 +31,7 @@ options:
     description:
       - Host name of the instance. C(name) can only contain ASCII letters.
       - Name will be generated (UUID) by CloudStack if not specified and can not be changed afterwards.
-      - Either C(name) or C(display_name) is required.
+      - Either C(name), C(display_name) or C(instances) is required.
     required: false
     default: null
   display_name:
@@ -209,6 +209,47 @@ options:
       - Poll async jobs until job has finished.
     required: false
     default: true
+  page_size:
+    description:
+      - Number of objects requested per page of the list API calls.
+    required: false
+    default: 500
+    version_added: "2.2"
+  lookup_cache:
+    description:
+      - Path of a file in which the IDs of the instances, networks,
+        templates, ISOs and offerings found by name are kept, so that the
+        other tasks of a play do not have to list them again.
+      - Entries are per API endpoint, domain, account, project and zone.
+    required: false
+    default: null
+    version_added: "2.2"
+  lookup_cache_ttl:
+    description:
+      - Seconds the entries of C(lookup_cache) are used for.
+    required: false
+    default: 300
+    version_added: "2.2"
+  instances:
+    description:
+      - List of instances to deploy at once instead of the C(name) one.
+        Every item is a dict with the C(name) or C(display_name) of the
+        instance and any of the other options of this module, which take
+        the value given to the module when they are not set in the item.
+      - All the instances missing are deployed first, then their jobs are
+        polled together. Instances which already exist are only started
+        with C(state=started) or stopped with C(state=stopped).
+      - Only C(state=present), C(state=deployed), C(state=started) and
+        C(state=stopped) are supported.
+    required: false
+    default: null
+    version_added: "2.2"
+  poll_timeout:
+    description:
+      - Seconds to wait for the jobs deploying C(instances) to finish.
+    required: false
+    default: 1800
+    version_added: "2.2"
 extends_documentation_fragment: cloudstack
 '''
 
@@ -273,10 +314,51 @@ EXAMPLES = '''
 
 # Remove an instance
 - local_action: cs_instance name=web-vm-1 state=absent
+
+# Deploy 3 instances at once
+- local_action:
+    module: cs_instance
+    template: Linux Debian 7 64-bit
+    service_offering: Tiny
+    zone: ch-gva-2
+    instances:
+      - name: web-01
+      - name: web-02
+      - name: db-01
+        service_offering: Medium
+        disk_offering: PerfPlus Storage
+        disk_size: 50
+  register: deployed
+
+# Ensure many instances are running, looking up their IDs, the template and
+# the offering only once per hour for the whole play.
+- local_action:
+    module: cs_instance
+    name: "{{ inventory_hostname_short }}"
+    template: Linux Debian 7 64-bit
+    service_offering: Tiny
+    state: started
+    lookup_cache: /tmp/cs_instance_lookup.json
+    lookup_cache_ttl: 3600
 '''
 
 RETURN = '''
 ---
+instances:
+  description: Result of every instance of C(instances), in the same order, with the keys returned for a single instance.
+  returned: when instances is used
+  type: list
+  contains:
+    failed:
+      description: True if the instance could not be deployed, C(msg) tells why.
+      returned: failure
+      type: boolean
+      sample: true
+    duration:
+      description: Seconds it took to deploy the instance.
+      returned: when the instance was deployed
+      type: float
+      sample: 42.5
 id:
   description: UUID of the instance.
   returned: success
@@ -395,6 +477,10 @@ instance_name:
 '''
 
 import base64
+import json
+import os
+import re
+import time
 
 try:
     from cs import CloudStack, CloudStackException, read_config
@@ -406,6 +492,93 @@ except ImportError:
 from ansible.module_utils.cloudstack import *
 
 
+UUID_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.I)
+
+
+class LookupCache(object):
+    """ Keeps what was found by name, in a file for the next tasks of a play when a path is given """
+
+    def __init__(self, path, ttl, scope):
+        self.path = path
+        self.ttl = ttl
+        self.scope = scope
+        self.entries = {}
+        self.changes = {}
+        self.removed = set()
+        if path:
+            self.entries = self._read().get(scope, {})
+
+    def _read(self):
+        try:
+            f = open(self.path)
+            try:
+                return json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return {}
+
+    def get(self, kind, name):
+        entry = self.entries.get('%s/%s' % (kind, name))
+        if entry and time.time() - entry[0] < self.ttl:
+            return entry[1]
+        return None
+
+    def set(self, kind, name, value):
+        key = '%s/%s' % (kind, name)
+        self.entries[key] = self.changes[key] = [time.time(), value]
+        self.removed.discard(key)
+
+    def discard(self, kind, name):
+        key = '%s/%s' % (kind, name)
+        if self.entries.pop(key, None) is not None:
+            self.changes.pop(key, None)
+            self.removed.add(key)
+
+    def save(self):
+        if not self.path or not (self.changes or self.removed):
+            return
+        # Other tasks may have written the file meanwhile, merge with it.
+        content = self._read()
+        entries = content.setdefault(self.scope, {})
+        now = time.time()
+        for key, entry in entries.items():
+            if key in self.removed or now - entry[0] >= self.ttl:
+                del entries[key]
+        entries.update(self.changes)
+        tmp = "%s.%d.tmp" % (self.path, os.getpid())
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        try:
+            os.write(fd, json.dumps(content))
+        finally:
+            os.close(fd)
+        os.rename(tmp, self.path)
+        self.changes = {}
+        self.removed = set()
+
+
+class InstanceSpecError(Exception):
+    pass
+
+
+class AnsibleCloudStackInstanceSpec(object):
+    """ Stands in for the module of one of the instances, with its own params
+
+    Failures raise InstanceSpecError instead of exiting the module, so the
+    other instances still get deployed.
+    """
+
+    def __init__(self, module, params):
+        self.module = module
+        self.params = params
+
+    def fail_json(self, **kwargs):
+        raise InstanceSpecError(kwargs.get('msg'))
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+
 class AnsibleCloudStackInstance(AnsibleCloudStack):
 
     def __init__(self, module):
@@ -425,19 +598,75 @@ class AnsibleCloudStackInstance(AnsibleCloudStack):
         self.instance = None
         self.template = None
         self.iso = None
+        self.lookup_cache = LookupCache(
+            path=self.module.params.get('lookup_cache'),
+            ttl=self.module.params.get('lookup_cache_ttl'),
+            scope=json.dumps([
+                self.cs.endpoint,
+                self.module.params.get('domain'),
+                self.module.params.get('account'),
+                self.module.params.get('project'),
+                self.module.params.get('zone'),
+            ]),
+        )
+
+
+    def list_paged(self, api, key, **args):
+        """ Yields the objects listed by api, requesting them a page at a time """
+        page_size = self.module.params.get('page_size')
+        args['pagesize'] = page_size
+        args['page'] = 1
+        while True:
+            res = getattr(self.cs, api)(**args)
+            if res and 'errortext' in res:
+                self.module.fail_json(msg="Failed: '%s'" % res['errortext'])
+            items = res.get(key, []) if res else []
+            for item in items:
+                yield item
+            if len(items) < page_size or args['page'] * page_size >= res.get('count', 0):
+                return
+            args['page'] += 1
+
+
+    def find_by_name(self, api, key, value, fields, exhaustive=True, **args):
+        """ Returns the first object listed by api having value in one of its fields.
+
+        The API is asked for the ID or for the keyword, if nothing is found
+        and exhaustive is set everything is listed, because the keyword does
+        not match all the fields with every API.
+        """
+        if UUID_RE.match(value):
+            filters = [ dict(id=value) ]
+        else:
+            filters = [ dict(keyword=value) ]
+        if exhaustive:
+            filters.append({})
+
+        for f in filters:
+            f.update(args)
+            for item in self.list_paged(api, key, **f):
+                if value in [ item.get(field) for field in fields ]:
+                    return item
+        return None
 
 
     def get_service_offering_id(self):
         service_offering = self.module.params.get('service_offering')
 
-        service_offerings = self.cs.listServiceOfferings()
-        if service_offerings:
-            if not service_offering:
+        if not service_offering:
+            service_offerings = self.cs.listServiceOfferings(page=1, pagesize=1)
+            if service_offerings:
                 return service_offerings['serviceoffering'][0]['id']
+            self.module.fail_json(msg="Service offering '%s' not found" % service_offering)
 
-            for s in service_offerings['serviceoffering']:
-                if service_offering in [ s['name'], s['id'] ]:
-                    return s['id']
+        offering_id = self.lookup_cache.get('serviceoffering', service_offering)
+        if offering_id:
+            return offering_id
+
+        s = self.find_by_name('listServiceOfferings', 'serviceoffering', service_offering, [ 'name', 'id' ])
+        if s:
+            self.lookup_cache.set('serviceoffering', service_offering, s['id'])
+            return s['id']
         self.module.fail_json(msg="Service offering '%s' not found" % service_offering)
 
 
@@ -455,30 +684,34 @@ class AnsibleCloudStackInstance(AnsibleCloudStack):
         args['zoneid']      = self.get_zone(key='id')
         args['isrecursive'] = True
 
+        template_filter = self.module.params.get('template_filter')
         if template:
             if self.template:
                 return self._get_by_key(key, self.template)
 
-            args['templatefilter'] = self.module.params.get('template_filter')
-            templates = self.cs.listTemplates(**args)
-            if templates:
-                for t in templates['template']:
-                    if template in [ t['displaytext'], t['name'], t['id'] ]:
-                        self.template = t
-                        return self._get_by_key(key, self.template)
-            self.module.fail_json(msg="Template '%s' not found" % template)
+            kind = 'template/%s' % template_filter
+            self.template = self.lookup_cache.get(kind, template)
+            if not self.template:
+                args['templatefilter'] = template_filter
+                self.template = self.find_by_name('listTemplates', 'template', template, [ 'displaytext', 'name', 'id' ], **args)
+                if not self.template:
+                    self.module.fail_json(msg="Template '%s' not found" % template)
+                self.lookup_cache.set(kind, template, self.template)
+            return self._get_by_key(key, self.template)
 
         elif iso:
             if self.iso:
                 return self._get_by_key(key, self.iso)
-            args['isofilter'] = self.module.params.get('template_filter')
-            isos = self.cs.listIsos(**args)
-            if isos:
-                for i in isos['iso']:
-                    if iso in [ i['displaytext'], i['name'], i['id'] ]:
-                        self.iso = i
-                        return self._get_by_key(key, self.iso)
-            self.module.fail_json(msg="ISO '%s' not found" % iso)
+
+            kind = 'iso/%s' % template_filter
+            self.iso = self.lookup_cache.get(kind, iso)
+            if not self.iso:
+                args['isofilter'] = template_filter
+                self.iso = self.find_by_name('listIsos', 'iso', iso, [ 'displaytext', 'name', 'id' ], **args)
+                if not self.iso:
+                    self.module.fail_json(msg="ISO '%s' not found" % iso)
+                self.lookup_cache.set(kind, iso, self.iso)
+            return self._get_by_key(key, self.iso)
 
 
     def get_disk_offering_id(self):
@@ -487,11 +720,14 @@ class AnsibleCloudStackInstance(AnsibleCloudStack):
         if not disk_offering:
             return None
 
-        disk_offerings = self.cs.listDiskOfferings()
-        if disk_offerings:
-            for d in disk_offerings['diskoffering']:
-                if disk_offering in [ d['displaytext'], d['name'], d['id'] ]:
-                    return d['id']
+        offering_id = self.lookup_cache.get('diskoffering', disk_offering)
+        if offering_id:
+            return offering_id
+
+        d = self.find_by_name('listDiskOfferings', 'diskoffering', disk_offering, [ 'displaytext', 'name', 'id' ])
+        if d:
+            self.lookup_cache.set('diskoffering', disk_offering, d['id'])
+            return d['id']
         self.module.fail_json(msg="Disk offering '%s' not found" % disk_offering)
 
 
@@ -505,12 +741,31 @@ class AnsibleCloudStackInstance(AnsibleCloudStack):
             args['domainid']    = self.get_domain(key='id')
             args['projectid']   = self.get_project(key='id')
             # Do not pass zoneid, as the instance name must be unique across zones.
-            instances = self.cs.listVirtualMachines(**args)
-            if instances:
-                for v in instances['virtualmachine']:
+
+            instance_id = self.lookup_cache.get('virtualmachine', instance_name)
+            if instance_id:
+                try:
+                    instances = self.cs.listVirtualMachines(id=instance_id, **args)
+                except CloudStackException:
+                    # The instance is gone
+                    instances = None
+                if instances:
+                    v = instances['virtualmachine'][0]
                     if instance_name.lower() in [ v['name'].lower(), v['displayname'].lower(), v['id'] ]:
                         self.instance = v
-                        break
+                        return self.instance
+                self.lookup_cache.discard('virtualmachine', instance_name)
+
+            # The keyword matches the name and the display name, case insensitively.
+            if UUID_RE.match(instance_name):
+                args['id'] = instance_name
+            else:
+                args['keyword'] = instance_name
+            for v in self.list_paged('listVirtualMachines', 'virtualmachine', **args):
+                if instance_name.lower() in [ v['name'].lower(), v['displayname'].lower(), v['id'] ]:
+                    self.instance = v
+                    self.lookup_cache.set('virtualmachine', instance_name, v['id'])
+                    break
         return self.instance
 
 
@@ -558,27 +813,34 @@ class AnsibleCloudStackInstance(AnsibleCloudStack):
         if not network_names:
             return None
 
-        args                = {}
-        args['account']     = self.get_account(key='name')
-        args['domainid']    = self.get_domain(key='id')
-        args['projectid']   = self.get_project(key='id')
-        args['zoneid']      = self.get_zone(key='id')
+        found = {}
+        for network_name in network_names:
+            network_id = self.lookup_cache.get('network', network_name)
+            if network_id:
+                found[network_name] = network_id
 
-        networks = self.cs.listNetworks(**args)
-        if not networks:
-            self.module.fail_json(msg="No networks available")
+        missing = [ n for n in network_names if n not in found ]
+        if missing:
+            args                = {}
+            args['account']     = self.get_account(key='name')
+            args['domainid']    = self.get_domain(key='id')
+            args['projectid']   = self.get_project(key='id')
+            args['zoneid']      = self.get_zone(key='id')
 
-        network_ids = []
-        network_displaytexts = []
-        for network_name in network_names:
-            for n in networks['network']:
-                if network_name in [ n['displaytext'], n['name'], n['id'] ]:
-                    network_ids.append(n['id'])
-                    network_displaytexts.append(n['name'])
-                    break
+            networks = list(self.list_paged('listNetworks', 'network', **args))
+            if not networks:
+                self.module.fail_json(msg="No networks available")
+
+            for network_name in missing:
+                for n in networks:
+                    if network_name in [ n['displaytext'], n['name'], n['id'] ]:
+                        found[network_name] = n['id']
+                        self.lookup_cache.set('network', network_name, n['id'])
+                        break
 
+        network_ids = [ found[n] for n in network_names if n in found ]
         if len(network_ids) != len(network_names):
-            self.module.fail_json(msg="Could not find all networks, networks list found: %s" % network_displaytexts)
+            self.module.fail_json(msg="Could not find all networks, networks not found: %s" % [ n for n in network_names if n not in found ])
 
         return network_ids
 
@@ -622,8 +884,7 @@ class AnsibleCloudStackInstance(AnsibleCloudStack):
         return res
 
 
-    def deploy_instance(self, start_vm=True):
-        self.result['changed'] = True
+    def get_deploy_args(self, start_vm=True):
         networkids = self.get_network_ids()
         if networkids is not None:
             networkids = ','.join(networkids)
@@ -662,6 +923,12 @@ class AnsibleCloudStackInstance(AnsibleCloudStack):
         template_iso = self.get_template_or_iso()
         if 'hypervisor' not in template_iso:
             args['hypervisor'] = self.get_hypervisor()
+        return args
+
+
+    def deploy_instance(self, start_vm=True):
+        self.result['changed'] = True
+        args = self.get_deploy_args(start_vm=start_vm)
 
         instance = None
         if not self.module.check_mode:
@@ -673,6 +940,7 @@ class AnsibleCloudStackInstance(AnsibleCloudStack):
             poll_async = self.module.params.get('poll_async')
             if poll_async:
                 instance = self._poll_job(instance, 'virtualmachine')
+                self.lookup_cache.set('virtualmachine', self.get_or_fallback('name', 'display_name'), instance['id'])
         return instance
 
 
@@ -909,6 +1177,180 @@ class AnsibleCloudStackInstance(AnsibleCloudStack):
         return self.result
 
 
+def instance_option(module, spec, key, value):
+    """ Returns the value of an option of one of the instances converted to its type
+
+    AnsibleModule only checks the options given to the module itself.
+    """
+    if value is None:
+        return value
+    option = module.argument_spec[key]
+    option_type = option.get('type', 'str')
+    try:
+        if option_type == 'bool':
+            if value in BOOLEANS_TRUE:
+                value = True
+            elif value in BOOLEANS_FALSE:
+                value = False
+            else:
+                raise ValueError()
+        elif option_type == 'int':
+            if isinstance(value, bool):
+                raise ValueError()
+            value = int(value)
+        elif option_type == 'list':
+            if isinstance(value, basestring):
+                value = [ v.strip() for v in value.split(',') ]
+            elif not isinstance(value, list):
+                value = [ value ]
+        elif option_type == 'path':
+            value = os.path.expanduser(os.path.expandvars(str(value)))
+        elif option_type == 'str' and not isinstance(value, basestring):
+            value = str(value)
+    except (TypeError, ValueError):
+        module.fail_json(msg="Invalid %s in instances for %s: %s is not a %s" % (key, spec.get('name') or spec.get('display_name'), value, option_type))
+
+    if option.get('choices') and value not in option['choices']:
+        module.fail_json(msg="Invalid %s in instances for %s: %s is not one of %s" % (key, spec.get('name') or spec.get('display_name'), value, ', '.join(option['choices'])))
+    return value
+
+
+def instance_params(module, spec):
+    """ Returns the params of one of the instances, merged with the module ones """
+    if not isinstance(spec, dict) or not (spec.get('name') or spec.get('display_name')):
+        module.fail_json(msg="Every item of instances needs a name or a display_name: %s" % (spec,))
+
+    aliases = {}
+    for key, option in module.argument_spec.items():
+        for alias in option.get('aliases') or []:
+            aliases[alias] = key
+
+    params = dict(module.params)
+    unknown = []
+    for key, value in spec.items():
+        option = aliases.get(key, key)
+        if option not in module.argument_spec or option in [ 'instances', 'state' ]:
+            unknown.append(key)
+        else:
+            params[option] = instance_option(module, spec, option, value)
+    if unknown:
+        module.fail_json(msg="Unsupported options in instances: %s" % ', '.join(sorted(unknown)))
+
+    params['instances'] = None
+    return params
+
+
+def deploy_instances(module):
+    """ Deploys the missing instances at once and polls their jobs together """
+    state = module.params.get('state')
+    if state not in [ 'present', 'deployed', 'started', 'stopped' ]:
+        module.fail_json(msg="State '%s' is not supported with instances." % state)
+    start_vm = state != 'stopped'
+
+    lookup_caches = {}
+    results = []
+    pending = {}
+    for spec in module.params.get('instances'):
+        params = instance_params(module, spec)
+        name = params.get('name') or params.get('display_name')
+        result = { 'name': name, 'changed': False }
+        results.append(result)
+        try:
+            acs_instance = AnsibleCloudStackInstance(AnsibleCloudStackInstanceSpec(module, params))
+            # The lookups done for an instance are reused for the next ones
+            # in the same endpoint, domain, account, project and zone.
+            scope = acs_instance.lookup_cache.scope
+            acs_instance.lookup_cache = lookup_caches.setdefault(scope, acs_instance.lookup_cache)
+
+            instance = acs_instance.get_instance()
+            if instance:
+                if state == 'started':
+                    instance = acs_instance.start_instance()
+                elif state == 'stopped':
+                    instance = acs_instance.stop_instance()
+                result.update(acs_instance.get_result(instance))
+                continue
+
+            args = acs_instance.get_deploy_args(start_vm=start_vm)
+            result['changed'] = True
+            if module.check_mode:
+                continue
+
+            res = acs_instance.cs.deployVirtualMachine(**args)
+            if 'errortext' in res:
+                raise InstanceSpecError("Failed: '%s'" % res['errortext'])
+            result['id'] = res.get('id')
+            result['jobid'] = res['jobid']
+            pending[res['jobid']] = (acs_instance, result, time.time())
+        except (InstanceSpecError, CloudStackException) as e:
+            result.update(failed=True, msg=str(e))
+
+    if module.params.get('poll_async'):
+        poll_deploy_jobs(module, pending)
+
+    for lookup_cache in lookup_caches.values():
+        lookup_cache.save()
+
+    changed = any(r['changed'] for r in results)
+    failed = [ r['name'] for r in results if r.get('failed') ]
+    if failed:
+        module.fail_json(msg="Failed to deploy instances: %s" % ', '.join(failed), changed=changed, instances=results)
+    module.exit_json(changed=changed, instances=results)
+
+
+def poll_deploy_jobs(module, pending):
+    """ Polls the jobs of pending until they are all done
+
+    The interval between the rounds grows while no job finishes and goes
+    back to 1 second once one does.
+    """
+    deadline = time.time() + module.params.get('poll_timeout')
+    interval = 1
+    while pending:
+        finished = 0
+        for jobid, (acs_instance, result, submitted) in pending.items():
+            try:
+                res = acs_instance.cs.queryAsyncJobResult(jobid=jobid)
+            except CloudStackException as e:
+                res = { 'jobstatus': 2, 'jobresult': { 'errortext': str(e) } }
+            if res['jobstatus'] == 0:
+                continue
+
+            finished += 1
+            del pending[jobid]
+            result['duration'] = round(time.time() - submitted, 1)
+            jobresult = res.get('jobresult', {})
+            if 'errortext' in jobresult:
+                result.update(failed=True, msg="Failed: '%s'" % jobresult['errortext'])
+                continue
+
+            instance = jobresult.get('virtualmachine')
+            try:
+                if instance:
+                    instance = acs_instance.ensure_tags(resource=instance, resource_type='UserVm')
+                    acs_instance.lookup_cache.set('virtualmachine', result['name'], instance['id'])
+                result.update(acs_instance.get_result(instance))
+            except (InstanceSpecError, CloudStackException) as e:
+                result.update(failed=True, msg=str(e))
+                continue
+            result['changed'] = True
+            if instance and instance.get('state', '').lower() == 'error':
+                result.update(failed=True, msg="Instance named '%s' in error state." % result['name'])
+
+        if not pending:
+            break
+        if time.time() >= deadline:
+            for jobid, (acs_instance, result, submitted) in pending.items():
+                result.update(failed=True, msg="Timed out waiting for job %s" % jobid)
+            break
+
+        if finished:
+            interval = 1
+        else:
+            interval = min(interval * 2, 10)
+        time.sleep(min(interval, max(0, deadline - time.time())))
+
+
 def main():
     argument_spec = cs_argument_spec()
     argument_spec.update(dict(
@@ -943,6 +1385,11 @@ def main():
         force = dict(type='bool', default=False),
         tags = dict(type='list', aliases=[ 'tag' ], default=None),
         poll_async = dict(type='bool', default=True),
+        page_size = dict(type='int', default=500),
+        lookup_cache = dict(type='path', default=None),
+        lookup_cache_ttl = dict(type='int', default=300),
+        instances = dict(type='list', default=None),
+        poll_timeout = dict(type='int', default=1800),
     ))
 
     required_together = cs_required_together()
@@ -954,10 +1401,12 @@ def main():
         argument_spec=argument_spec,
         required_together=required_together,
         required_one_of = (
-            ['display_name', 'name'],
+            ['display_name', 'name', 'instances'],
         ),
         mutually_exclusive = (
             ['template', 'iso'],
+            ['name', 'instances'],
+            ['display_name', 'instances'],
         ),
         supports_check_mode=True
     )
@@ -966,6 +1415,9 @@ def main():
         module.fail_json(msg="python library cs required: pip install cs")
 
     try:
+        if module.params.get('instances'):
+            deploy_instances(module)
+
         acs_instance = AnsibleCloudStackInstance(module)
 
         state = module.params.get('state')
@@ -999,6 +1451,7 @@ def main():
             module.fail_json(msg="Instance named '%s' in error state." % module.params.get('name'))
 
         result = acs_instance.get_result(instance)
+        acs_instance.lookup_cache.save()
 
     except CloudStackException as e:
         module.fail_json(msg='CloudStackException: %s' % str(e))
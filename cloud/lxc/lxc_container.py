@@ -30,8 +30,22 @@ author: "Kevin Carter (@cloudnull)"
 options:
     name:
         description:
-          - Name of a container.
-        required: true
+          - Name of a container. Required unless I(containers) is used.
+        required: false
+    containers:
+        version_added: "2.2"
+        description:
+          - List of containers to manage concurrently instead of the I(name)
+            one. Every item is a dict with the C(name) of the container and
+            any of the other options of this module, which take the value
+            given to the module when they are not set in the item.
+        required: false
+    threads:
+        version_added: "2.2"
+        description:
+          - Number of containers of I(containers) managed at the same time.
+        required: false
+        default: 4
     backing_store:
         choices:
           - dir
@@ -149,11 +163,55 @@ options:
         choices:
           - gzip
           - bzip2
+          - xz
+          - zstd
           - none
         description:
           - Type of compression to use when creating an archive of a running
             container.
         default: gzip
+    archive_threads:
+        version_added: "2.2"
+        description:
+          - Number of threads used to compress the archive, 0 uses one thread
+            per CPU. When more than one thread is used the archive is
+            compressed with pigz, pbzip2, "xz -T" or "zstd -T"; if pigz or
+            pbzip2 is not installed the single threaded gzip or bzip2 is used.
+        required: false
+        default: 1
+    archive_mode:
+        version_added: "2.2"
+        choices:
+          - copy
+          - snapshot
+        description:
+          - With C(copy) the container is copied to a temporary directory
+            with rsync and the copy is archived. With C(snapshot) only the
+            container configuration is copied, the root file system is
+            archived directly from the LVM snapshot or the overlayfs mount,
+            and "dir" backed containers are archived in place while frozen.
+            An LVM backed container is restored to its state as soon as the
+            snapshot is taken.
+        required: false
+        default: copy
+    archive_incremental:
+        version_added: "2.2"
+        choices:
+          - true
+          - false
+        description:
+          - Create incremental archives, which only contain the files changed
+            since the previous archive. The state is kept in the
+            "CONTAINER_NAME.snar" file in I(archive_path), remove it to
+            start again with a full archive. The archives are named after
+            the container and the time they are created so they do not
+            replace each other.
+          - Requires C(archive_mode=snapshot). tar tells changed files by
+            their inode and change time, which the copy made by
+            C(archive_mode=copy) renews on every run, so each archive would
+            hold every file again.
+        required: false
+        default: false
     state:
         choices:
           - started
@@ -316,6 +374,17 @@ EXAMPLES = """
     archive: true
     archive_path: /opt/archives
 
+# Create a nightly incremental archive of an LVM backed container straight
+# from the snapshot, compressed with pigz on 8 threads.
+- name: Incremental container archive
+  lxc_container:
+    name: test-container-lvm
+    archive: true
+    archive_path: /opt/archives
+    archive_mode: snapshot
+    archive_incremental: true
+    archive_threads: 8
+
 # Create a container using overlayfs, create an archive of it, create a
 # snapshot clone of the container and and finally leave the container
 # in a frozen state. The container archive will be compressed using gzip.
@@ -362,6 +431,33 @@ EXAMPLES = """
     name: test-container-new-archive-destroyed-clone
     state: started
 
+# Create and start test containers, 8 at a time.
+- name: Create test containers
+  lxc_container:
+    template: ubuntu
+    state: started
+    threads: 8
+    containers:
+      - name: ci-01
+      - name: ci-02
+      - name: ci-03
+        backing_store: overlayfs
+
+- name: Start and stop containers concurrently
+  lxc_container:
+    containers:
+      - name: test-container-started
+        state: started
+      - name: test-container-stopped
+        state: stopped
+      - name: test-container-new-archive
+        clone_name: test-container-new-archive-clone2
+        state: stopped
+  register: bulk_info
+
+- name: Debug info on the containers
+  debug: var=bulk_info.lxc_containers
+
 - name: Destroy a container
   lxc_container:
     name: "{{ item }}"
@@ -379,6 +475,9 @@ EXAMPLES = """
     - test-container-new-archive
     - test-container-new-archive-clone
     - test-container-new-archive-destroyed-clone
+    - ci-01
+    - ci-02
+    - ci-03
 """
 
 RETURN="""
@@ -422,9 +521,45 @@ lxc_container:
             returned: success, when clone_name is specified
             type: boolean
             sample: True
+lxc_containers:
+    description: result of every container of containers, in the same order
+    returned: when containers is used
+    type: list
+    contains:
+        name:
+            description: name of the lxc container
+            returned: always
+            type: string
+            sample: ci-01
+        changed:
+            description: if the container was changed
+            returned: success
+            type: boolean
+            sample: True
+        lxc_container:
+            description: container information, as lxc_container above
+            returned: success
+            type: dict
+        failed:
+            description: if the container could not be managed, msg tells why
+            returned: failure
+            type: boolean
+            sample: True
+        elapsed:
+            description: seconds it took to manage the container
+            returned: always
+            type: float
+            sample: 4.21
 """
 
+import multiprocessing
 import re
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
 
 try:
     import lxc
@@ -439,11 +574,24 @@ else:
 LXC_COMPRESSION_MAP = {
     'gzip': {
         'extension': 'tar.tgz',
-        'argument': '-czf'
+        'argument': '-czf',
+        'threaded': ['pigz', '-p %(threads)s']
     },
     'bzip2': {
         'extension': 'tar.bz2',
-        'argument': '-cjf'
+        'argument': '-cjf',
+        'threaded': ['pbzip2', '-p%(threads)s']
+    },
+    'xz': {
+        'extension': 'tar.xz',
+        'argument': '-cJf',
+        'threaded': ['xz', '-T %(threads)s']
+    },
+    'zstd': {
+        'extension': 'tar.zst',
+        'argument': '-cf',
+        'program': 'zstd',
+        'threaded': ['zstd', '-T%(threads)s']
     },
     'none': {
         'extension': 'tar',
@@ -592,6 +740,36 @@ def create_script(command):
         os.remove(script_file)
 
 
+class LxcContainerError(Exception):
+    """Failure of one of the `containers`, with the result to report."""
+
+    def __init__(self, result):
+        Exception.__init__(self, result.get('msg'))
+        self.result = result
+
+
+class LxcContainerSpec(object):
+    def __init__(self, module, params):
+        """Stand in for the Ansible Module when managing one of `containers`.
+
+        Failures raise ``LxcContainerError`` instead of exiting the module so
+        the other containers are still managed.
+
+        :param module: Processed Ansible Module.
+        :type module: ``object``
+        :param params: Options of the container.
+        :type params: ``dict``
+        """
+        self.module = module
+        self.params = params
+
+    def fail_json(self, **kwargs):
+        raise LxcContainerError(kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+
 class LxcContainerManagement(object):
     def __init__(self, module):
         """Management of LXC containers via Ansible.
@@ -971,12 +1149,17 @@ class LxcContainerManagement(object):
         """
 
         self.container = self.get_container_bind()
-        for _ in xrange(timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
             if self._get_state() != 'running':
-                self.container.start()
                 self.state_change = True
-                # post startup sleep for 1 second.
-                time.sleep(1)
+                if self.container.start():
+                    self.container.wait(
+                        'RUNNING',
+                        max(1, int(deadline - time.time()))
+                    )
+                else:
+                    time.sleep(1)
             else:
                 return True
         else:
@@ -1038,12 +1221,13 @@ class LxcContainerManagement(object):
             if self._get_state() != 'stopped':
                 self.state_change = True
                 self.container.stop()
+                self.container.wait('STOPPED', timeout)
 
             if self.container.destroy():
                 self.state_change = True
-
-            # post destroy attempt sleep for 1 second.
-            time.sleep(1)
+            else:
+                # post failed destroy attempt sleep for 1 second.
+                time.sleep(1)
         else:
             self.failure(
                 lxc_container=self._container_data(),
@@ -1364,6 +1548,32 @@ class LxcContainerManagement(object):
                     % (vg, lv_name, mount_point)
             )
 
+    def _compress_program(self, compression_type):
+        """Return the compression program tar should use, if any.
+
+        :param compression_type: Entry of ``LXC_COMPRESSION_MAP``.
+        :type compression_type: ``dict``
+        :returns: Compression command or None to use the tar argument.
+        :rtype: ``str``
+        """
+
+        threads = self.module.params.get('archive_threads')
+        if threads == 0:
+            threads = multiprocessing.cpu_count()
+
+        threaded = compression_type.get('threaded')
+        if threaded and threads > 1:
+            program = self.module.get_bin_path(threaded[0])
+            if program:
+                return ' '.join(
+                    [program] + [i % {'threads': threads} for i in threaded[1:]]
+                )
+
+        if 'program' in compression_type:
+            return self.module.get_bin_path(compression_type['program'], True)
+
+        return None
+
     def _create_tar(self, source_dir):
         """Create an archive of a given ``source_dir`` to ``output_path``.
 
@@ -1371,41 +1581,73 @@ class LxcContainerManagement(object):
         :type source_dir: ``str``
         """
 
-        old_umask = os.umask(0077)
-
         archive_path = self.module.params.get('archive_path')
         if not os.path.isdir(archive_path):
-            os.makedirs(archive_path)
+            os.makedirs(archive_path, 0700)
 
         archive_compression = self.module.params.get('archive_compression')
         compression_type = LXC_COMPRESSION_MAP[archive_compression]
 
+        # Incremental archives are named after their creation time so that
+        # every level of the backup is kept.
+        archive_incremental = self.module.params.get('archive_incremental')
+        if archive_incremental in BOOLEANS_TRUE:
+            archive_base = '%s-%s' % (
+                self.container_name,
+                time.strftime('%Y%m%d%H%M%S')
+            )
+        else:
+            archive_base = self.container_name
+
         # remove trailing / if present.
         archive_name = '%s.%s' % (
             os.path.join(
                 archive_path,
-                self.container_name
+                archive_base
             ),
             compression_type['extension']
         )
 
+        # The umask is only set for tar, os.umask would change it for the
+        # threads archiving other containers too.
         build_command = [
+            'umask 0077 &&',
             self.module.get_bin_path('tar', True),
             '--directory=%s' % os.path.realpath(
                 os.path.expanduser(source_dir)
-            ),
-            compression_type['argument'],
+            )
+        ]
+
+        if archive_incremental in BOOLEANS_TRUE:
+            # The snapshot mount point gets a new device number every time,
+            # which would otherwise make tar archive every file again.
+            build_command.extend([
+                '--listed-incremental=%s' % os.path.join(
+                    archive_path,
+                    '%s.snar' % self.container_name
+                ),
+                '--no-check-device'
+            ])
+
+        compress_program = self._compress_program(compression_type)
+        if compress_program:
+            build_command.extend([
+                '--use-compress-program="%s"' % compress_program,
+                '-cf'
+            ])
+        else:
+            build_command.append(compression_type['argument'])
+
+        build_command.extend([
             archive_name,
             '.'
-        ]
+        ])
 
         rc, stdout, err = self._run_command(
             build_command=build_command,
             unsafe_shell=True
         )
 
-        os.umask(old_umask)
-
         if rc != 0:
             self.failure(
                 err=err,
@@ -1438,13 +1680,15 @@ class LxcContainerManagement(object):
                 command=' '.join(build_command)
             )
 
-    def _rsync_data(self, container_path, temp_dir):
+    def _rsync_data(self, container_path, temp_dir, exclude=None):
         """Sync the container directory to the temp directory.
 
         :param container_path: path to the container container
         :type container_path: ``str``
         :param temp_dir: path to the temporary local working directory
         :type temp_dir: ``str``
+        :param exclude: names of the files not to sync
+        :type exclude: ``list``
         """
         # This loop is created to support overlayfs archives. This should
         # squash all of the layers into a single archive.
@@ -1459,10 +1703,16 @@ class LxcContainerManagement(object):
             # Run the sync command
             build_command = [
                 self.module.get_bin_path('rsync', True),
-                '-aHAX',
+                '-aHAX'
+            ]
+            for name in exclude or []:
+                build_command.append(
+                    '--exclude=/%s/%s' % (os.path.basename(fs_path), name)
+                )
+            build_command.extend([
                 fs_path,
                 temp_dir
-            ]
+            ])
             rc, stdout, err = self._run_command(
                 build_command,
                 unsafe_shell=True
@@ -1528,15 +1778,22 @@ class LxcContainerManagement(object):
         The process is as follows:
             * Stop or Freeze the container
             * Create temporary dir
-            * Copy container and config to temporary directory
+            * Copy container and config to temporary directory, or only the
+              config when `archive_mode` is "snapshot"
             * If LVM backed:
                 * Create LVM snapshot of LV backing the container
                 * Mount the snapshot to tmpdir/rootfs
             * Restore the state of the container
             * Create tar of tmpdir
             * Clean up
+
+        When `archive_mode` is "snapshot" a "dir" backed container is archived
+        in place from its directory and an LVM backed container is restored as
+        soon as its snapshot is taken.
         """
 
+        archive_mode = self.module.params.get('archive_mode')
+
         # Create a temp dir
         temp_dir = tempfile.mkdtemp()
 
@@ -1552,12 +1809,16 @@ class LxcContainerManagement(object):
         # Test if the container is using overlayfs
         overlayfs_backed = lxc_rootfs.startswith('overlayfs')
 
+        # Directory holding the container config
+        container_dir = os.path.dirname(self.container.config_file_name)
+
         mount_point = os.path.join(work_dir, 'rootfs')
 
         # Set the snapshot name if needed
         snapshot_name = '%s_lxc_snapshot' % self.container_name
 
         container_state = self._get_state()
+        restored = False
         try:
             # Ensure the original container is stopped or frozen
             if container_state not in ['stopped', 'frozen']:
@@ -1566,8 +1827,29 @@ class LxcContainerManagement(object):
                 else:
                     self.container.stop()
 
-            # Sync the container data from the container_path to work_dir
-            self._rsync_data(lxc_rootfs, temp_dir)
+            if archive_mode != 'snapshot':
+                # Sync the container data from the container_path to work_dir
+                self._rsync_data(lxc_rootfs, temp_dir)
+            elif block_backed or overlayfs_backed:
+                # Only sync the config, the root file system is archived from
+                # the mount of the snapshot or of the overlay.
+                exclude = ['rootfs']
+                for fs_path in lxc_rootfs.split(':')[1:]:
+                    if os.path.dirname(fs_path) == container_dir:
+                        exclude.append(os.path.basename(fs_path))
+                self._rsync_data(
+                    os.path.join(container_dir, 'rootfs'),
+                    temp_dir,
+                    exclude=exclude
+                )
+                work_dir = os.path.join(
+                    temp_dir,
+                    os.path.basename(container_dir)
+                )
+                mount_point = os.path.join(work_dir, 'rootfs')
+            else:
+                # Archive the frozen container directory in place
+                work_dir = container_dir
 
             if block_backed:
                 if snapshot_name not in self._lvm_lv_list():
@@ -1589,6 +1871,12 @@ class LxcContainerManagement(object):
                         lv_name=snapshot_name,
                         mount_point=mount_point
                     )
+
+                    # The snapshot holds the data to archive, the container
+                    # can go back to work while the archive is created.
+                    if archive_mode == 'snapshot':
+                        self._restore_state(container_state)
+                        restored = True
                 else:
                     self.failure(
                         err='snapshot [ %s ] already exists' % snapshot_name,
@@ -1618,15 +1906,25 @@ class LxcContainerManagement(object):
                 self._lvm_lv_remove(snapshot_name)
 
             # Restore original state of container
-            if container_state == 'running':
-                if self._get_state() == 'frozen':
-                    self.container.unfreeze()
-                else:
-                    self.container.start()
+            if not restored:
+                self._restore_state(container_state)
 
             # Remove tmpdir
             shutil.rmtree(temp_dir)
 
+    def _restore_state(self, container_state):
+        """Return a container to the state it was in before an archive.
+
+        :param container_state: State of the container before the archive.
+        :type container_state: ``str``
+        """
+
+        if container_state == 'running':
+            if self._get_state() == 'frozen':
+                self.container.unfreeze()
+            else:
+                self.container.start()
+
     def check_count(self, count, method):
         if count > 1:
             self.failure(
@@ -1647,8 +1945,12 @@ class LxcContainerManagement(object):
 
         self.module.fail_json(**kwargs)
 
-    def run(self):
-        """Run the main method."""
+    def apply(self):
+        """Bring the container to its state.
+
+        :returns: container data
+        :rtype: ``dict``
+        """
 
         action = getattr(self, LXC_ANSIBLE_STATES[self.state])
         action()
@@ -1660,20 +1962,205 @@ class LxcContainerManagement(object):
         if self.clone_info:
             outcome.update(self.clone_info)
 
+        return outcome
+
+    def run(self):
+        """Run the main method."""
+
+        outcome = self.apply()
         self.module.exit_json(
             changed=self.state_change,
             lxc_container=outcome
         )
 
 
+def container_option(module, name, key, value):
+    """Return the value of an option of `containers` as its type.
+
+    AnsibleModule only checks the options given to the module, the ones of
+    every item are converted and checked here the same way.
+
+    :param module: Processed Ansible Module.
+    :type module: ``object``
+    :param name: Name of the container.
+    :type name: ``str``
+    :param key: Name of the option.
+    :type key: ``str``
+    :param value: Value given in the item.
+    :type value: ``object``
+    :returns: converted value
+    :rtype: ``object``
+    """
+
+    if value is None:
+        return value
+
+    option = module.argument_spec[key]
+    option_type = option.get('type', 'str')
+    try:
+        if option_type == 'bool':
+            if value in BOOLEANS_TRUE:
+                value = True
+            elif value in BOOLEANS_FALSE:
+                value = False
+            else:
+                raise ValueError
+        elif option_type == 'int':
+            if isinstance(value, bool):
+                raise ValueError
+            value = int(value)
+        elif option_type == 'list':
+            if isinstance(value, basestring):
+                value = value.split(',')
+            elif not isinstance(value, list):
+                raise ValueError
+        elif option_type == 'path':
+            value = os.path.expanduser(os.path.expandvars(str(value)))
+        elif not isinstance(value, basestring):
+            value = str(value)
+    except (TypeError, ValueError):
+        module.fail_json(
+            msg='Invalid %s for container [ %s ]: %s is not a %s'
+                % (key, name, value, option_type)
+        )
+
+    if option.get('choices') and value not in option['choices']:
+        module.fail_json(
+            msg='Invalid %s for container [ %s ]: %s'
+                % (key, name, value)
+        )
+
+    return value
+
+
+def container_params(module, spec):
+    """Return the options of one of `containers`.
+
+    :param module: Processed Ansible Module.
+    :type module: ``object``
+    :param spec: Item of `containers`.
+    :type spec: ``dict``
+    :returns: options of the container
+    :rtype: ``dict``
+    """
+
+    if not isinstance(spec, dict) or not spec.get('name'):
+        module.fail_json(
+            msg='Every item of containers needs a name: %s' % (spec,)
+        )
+
+    unknown = [
+        i for i in spec
+        if i not in module.argument_spec or i in ['containers', 'threads']
+    ]
+    if unknown:
+        module.fail_json(
+            msg='Unsupported options for container [ %s ]: %s'
+                % (spec['name'], ', '.join(sorted(unknown)))
+        )
+
+    params = dict(module.params)
+    for key, value in spec.items():
+        params[key] = container_option(module, spec['name'], key, value)
+    params['lv_name'] = spec.get('lv_name') or spec['name']
+
+    if params['archive'] in BOOLEANS_TRUE and not params['archive_path']:
+        module.fail_json(
+            msg='archive_path is required to archive container [ %s ]'
+                % spec['name']
+        )
+
+    if params['archive_incremental'] and params['archive_mode'] != 'snapshot':
+        module.fail_json(
+            msg='archive_incremental requires archive_mode snapshot for'
+                ' container [ %s ]' % spec['name']
+        )
+
+    return params
+
+
+def manage_containers(module):
+    """Manage all the `containers` with a pool of threads.
+
+    :param module: Processed Ansible Module.
+    :type module: ``object``
+    """
+
+    specs = [
+        container_params(module, i) for i in module.params['containers']
+    ]
+    results = [None] * len(specs)
+
+    pending = queue.Queue()
+    for index, params in enumerate(specs):
+        pending.put((index, params))
+
+    def worker():
+        while True:
+            try:
+                index, params = pending.get_nowait()
+            except queue.Empty:
+                return
+
+            started = time.time()
+            try:
+                lxc_manage = LxcContainerManagement(
+                    module=LxcContainerSpec(module, params)
+                )
+                outcome = lxc_manage.apply()
+                result = {
+                    'changed': lxc_manage.state_change,
+                    'lxc_container': outcome
+                }
+            except LxcContainerError, e:
+                result = e.result
+                result['failed'] = True
+            except Exception, e:
+                result = {
+                    'failed': True,
+                    'msg': str(e)
+                }
+
+            result['name'] = params['name']
+            result['elapsed'] = round(time.time() - started, 2)
+            results[index] = result
+
+    threads = max(1, min(module.params['threads'], len(specs)))
+    workers = [threading.Thread(target=worker) for _ in xrange(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+    changed = any(i.get('changed') for i in results)
+    failed = [i['name'] for i in results if i.get('failed')]
+    if failed:
+        module.fail_json(
+            msg='Failed to manage containers: %s' % ', '.join(failed),
+            changed=changed,
+            lxc_containers=results
+        )
+
+    module.exit_json(
+        changed=changed,
+        lxc_containers=results
+    )
+
+
 def main():
     """Ansible Main module."""
 
     module = AnsibleModule(
         argument_spec=dict(
             name=dict(
-                type='str',
-                required=True
+                type='str'
+            ),
+            containers=dict(
+                type='list'
+            ),
+            threads=dict(
+                type='int',
+                default=4
             ),
             template=dict(
                 type='str',
@@ -1753,12 +2240,26 @@ def main():
             archive_compression=dict(
                 choices=LXC_COMPRESSION_MAP.keys(),
                 default='gzip'
+            ),
+            archive_threads=dict(
+                type='int',
+                default=1
+            ),
+            archive_mode=dict(
+                choices=['copy', 'snapshot'],
+                default='copy'
+            ),
+            archive_incremental=dict(
+                type='bool',
+                default='false'
             )
         ),
         supports_check_mode=False,
         required_if = ([
             ('archive', True, ['archive_path'])
         ]),
+        required_one_of=[['name', 'containers']],
+        mutually_exclusive=[['name', 'containers']],
     )
 
     if not HAS_LXC:
@@ -1766,6 +2267,15 @@ def main():
             msg='The `lxc` module is not importable. Check the requirements.'
         )
 
+    if module.params.get('containers'):
+        manage_containers(module)
+
+    if (module.params.get('archive_incremental') and
+            module.params.get('archive_mode') != 'snapshot'):
+        module.fail_json(
+            msg='archive_incremental requires archive_mode snapshot'
+        )
+
     lv_name = module.params.get('lv_name')
     if not lv_name:
         module.params['lv_name'] = module.params.get('name')
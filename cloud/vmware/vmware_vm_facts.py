@@ -24,13 +24,34 @@ module: vmware_vm_facts
 short_description: Return basic facts pertaining to a vSphere virtual machine guest
 description:
     - Return basic facts pertaining to a vSphere virtual machine guest
+    - The properties of all the virtual machines, and the names of their
+      hosts, datastores and folders, are read with a single property
+      collector query over a container view, fetched page by page.
 version_added: 2.0
 author: "Joseph Callen (@jcpowermac)"
 notes:
     - Tested on vSphere 5.5
+    - Tags are not part of the vSphere API this module uses, custom
+      attributes are returned instead.
 requirements:
     - "python >= 2.6"
     - PyVmomi
+options:
+    properties:
+        description:
+            - Additional properties of the virtual machines to return in
+              C(properties), as vSphere property paths (e.g.
+              C(config.hardware.numCPU) or C(summary.storage.committed)).
+        required: false
+        default: null
+        version_added: "2.2"
+    page_size:
+        description:
+            - Maximum number of objects asked for in each request to the
+              property collector.
+        required: false
+        default: 500
+        version_added: "2.2"
 extends_documentation_fragment: vmware.documentation
 '''
 
@@ -41,6 +62,37 @@ EXAMPLES = '''
     hostname: esxi_or_vcenter_ip_or_hostname
     username: username
     password: password
+
+- name: Gather all registered virtual machines with their CPU, memory and disk usage
+  local_action:
+    module: vmware_vm_facts
+    hostname: esxi_or_vcenter_ip_or_hostname
+    username: username
+    password: password
+    properties:
+      - config.hardware.numCPU
+      - config.hardware.memoryMB
+      - summary.storage.committed
+'''
+
+RETURN = '''
+virtual_machines:
+    description: The virtual machines, by name.
+    returned: success
+    type: dictionary
+    sample: {
+        "web01": {
+            "guest_fullname": "CentOS 4/5/6/7 (64-bit)",
+            "power_state": "poweredOn",
+            "ip_address": "192.0.2.10",
+            "uuid": "4214a6b4-8ba8-6a82-5bb5-8df87d84ec1a",
+            "host": "esxi01.example.com",
+            "datastores": ["datastore1"],
+            "folder": "/DC1/vm/web",
+            "custom_attributes": {"owner": "web team"},
+            "properties": {"config.hardware.numCPU": 2}
+        }
+    }
 '''
 
 try:
@@ -50,34 +102,128 @@ except ImportError:
     HAS_PYVMOMI = False
 
 
-# https://github.com/vmware/pyvmomi-community-samples/blob/master/samples/getallvms.py
-def get_all_virtual_machines(content):
-    virtual_machines = get_all_objs(content, [vim.VirtualMachine])
-    _virtual_machines = {}
+VM_PROPERTIES = [
+    'name',
+    'config.guestFullName',
+    'config.uuid',
+    'runtime.powerState',
+    'runtime.host',
+    'guest.ipAddress',
+    'datastore',
+    'parent',
+    'customValue',
+]
+
+
+def to_facts(value):
+    # Turn what pyVmomi returns into data that can be returned by the module
+    if isinstance(value, vim.ManagedObject):
+        return value._moId
+    if isinstance(value, vim.DataObject):
+        return dict((prop.name, to_facts(getattr(value, prop.name))) for prop in value._GetPropertyList())
+    if isinstance(value, (list, tuple)):
+        return [to_facts(item) for item in value]
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def retrieve_properties(content, specs, page_size):
+    # Read the properties of all the objects of the types in specs, a dict
+    # of type to property paths, through a container view. Yields the
+    # object and a dict of its properties for each of them.
+    view = content.viewManager.CreateContainerView(content.rootFolder, list(specs), True)
+    try:
+        traversal_spec = vmodl.query.PropertyCollector.TraversalSpec(name='traverseEntities', path='view', skip=False,
+                                                                     type=vim.view.ContainerView)
+        object_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=view, skip=True, selectSet=[traversal_spec])
+        property_specs = [vmodl.query.PropertyCollector.PropertySpec(type=obj_type, pathSet=paths, all=False)
+                          for obj_type, paths in specs.items()]
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=[object_spec], propSet=property_specs)
+        options = vmodl.query.PropertyCollector.RetrieveOptions(maxObjects=page_size)
+
+        collector = content.propertyCollector
+        result = collector.RetrievePropertiesEx(specSet=[filter_spec], options=options)
+        while result is not None:
+            for obj in result.objects:
+                yield obj.obj, dict((prop.name, prop.val) for prop in obj.propSet)
+            if not result.token:
+                break
+            result = collector.ContinuePropertiesEx(token=result.token)
+    finally:
+        view.Destroy()
+
+
+def get_all_virtual_machines(content, properties=None, page_size=500):
+    properties = properties or []
+    specs = {
+        vim.VirtualMachine: list(set(VM_PROPERTIES + properties)),
+        vim.HostSystem: ['name'],
+        vim.Datastore: ['name'],
+        vim.Folder: ['name', 'parent'],
+        vim.Datacenter: ['name', 'parent'],
+    }
+
+    # Everything comes in one pass, the virtual machines refer to the other
+    # objects by their managed object id
+    virtual_machines = []
+    names = {}
+    parents = {}
+    for obj, props in retrieve_properties(content, specs, page_size):
+        if isinstance(obj, vim.VirtualMachine):
+            virtual_machines.append(props)
+        else:
+            names[obj._moId] = props.get('name')
+            if props.get('parent') is not None:
+                parents[obj._moId] = props['parent']._moId
+
+    def folder_path(moid):
+        path = []
+        while moid in names:
+            path.insert(0, names[moid])
+            moid = parents.get(moid)
+        return '/' + '/'.join(path)
+
+    field_names = {}
+    if content.customFieldsManager is not None:
+        for field in content.customFieldsManager.field:
+            field_names[field.key] = field.name
 
-    for vm in virtual_machines:
-        _ip_address = ""
-        summary = vm.summary
-        if summary.guest is not None:
-            _ip_address = summary.guest.ipAddress
-            if _ip_address is None:
-                _ip_address = ""
+    _virtual_machines = {}
+    for props in virtual_machines:
+        _ip_address = props.get('guest.ipAddress')
+        if _ip_address is None:
+            _ip_address = ""
 
+        host = props.get('runtime.host')
+        parent = props.get('parent')
         virtual_machine = {
-            summary.config.name: {
-                "guest_fullname": summary.config.guestFullName,
-                "power_state": summary.runtime.powerState,
-                "ip_address": _ip_address
-            }
+            "guest_fullname": props.get('config.guestFullName'),
+            "power_state": props.get('runtime.powerState'),
+            "ip_address": _ip_address,
+            "uuid": props.get('config.uuid'),
+            "host": names.get(host._moId) if host is not None else None,
+            "datastores": [names.get(datastore._moId) for datastore in props.get('datastore', [])],
+            "folder": folder_path(parent._moId) if parent is not None else None,
+            "custom_attributes": dict((field_names.get(custom_value.key, str(custom_value.key)), custom_value.value)
+                                      for custom_value in props.get('customValue', [])),
         }
+        if properties:
+            virtual_machine['properties'] = dict((path, to_facts(props.get(path))) for path in properties)
 
-        _virtual_machines.update(virtual_machine)
+        _virtual_machines[props['name']] = virtual_machine
     return _virtual_machines
 
 
 def main():
 
     argument_spec = vmware_argument_spec()
+    argument_spec.update(
+        dict(
+            properties=dict(type='list', default=None),
+            page_size=dict(type='int', default=500),
+        )
+    )
     module = AnsibleModule(argument_spec=argument_spec, supports_check_mode=False)
 
     if not HAS_PYVMOMI:
@@ -85,7 +231,7 @@ def main():
 
     try:
         content = connect_to_api(module)
-        _virtual_machines = get_all_virtual_machines(content)
+        _virtual_machines = get_all_virtual_machines(content, module.params['properties'], module.params['page_size'])
         module.exit_json(changed=False, virtual_machines=_virtual_machines)
     except vmodl.RuntimeFault as runtime_fault:
         module.fail_json(msg=runtime_fault.msg)
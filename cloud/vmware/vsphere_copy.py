@@ -42,6 +42,8 @@ options:
   src:
     description:
       - The file to push to vCenter
+      - If this is a directory, the files it contains (not its
+        subdirectories) are pushed concurrently to the I(path) directory.
     required: true
   datacenter:
     description:
@@ -54,6 +56,7 @@ options:
   path:
     description:
       - The file to push to the datastore on the vCenter server.
+      - The directory to push the files to when I(src) is a directory.
     required: true
   validate_certs:
     description:
@@ -62,10 +65,38 @@ options:
     required: false
     default: 'yes'
     choices: ['yes', 'no']
+  compare:
+    description:
+      - How to find out if the file on the datastore is already identical
+        to I(src), in which case it is not uploaded again. C(size) compares
+        the size returned by a HEAD request, C(checksum) also compares the
+        SHA1 checksums when the sizes match, which means downloading the
+        datastore file. C(none) always uploads.
+    required: false
+    default: none
+    choices: ['none', 'size', 'checksum']
+    version_added: "2.2"
+  retries:
+    description:
+      - Number of times an upload interrupted by a network error or a
+        server error is started again.
+    required: false
+    default: 3
+    version_added: "2.2"
+  threads:
+    description:
+      - Number of files uploaded at the same time, when I(src) is a directory.
+    required: false
+    default: 4
+    version_added: "2.2"
 
 notes:
   - "This module ought to be run from a system that can access vCenter directly and has the file to transfer.
     It can be the normal remote target or you can change it either by using C(transport: local) or using C(delegate_to)."
+  - The file is read from disk as it is sent, the result reports the
+    number of bytes sent, the time it took and the throughput in MB/s.
+  - "The datastore HTTP interface has no partial upload: an upload that is
+    retried starts over from the beginning of the file."
   - Tested on vSphere 5.5
 '''
 
@@ -74,13 +105,27 @@ EXAMPLES = '''
   transport: local
 - vsphere_copy: host=vhost login=vuser password=vpass src=/other/local/file datacenter='DC2 Someplace' datastore=datastore2 path=other/remote/file
   delegate_to: other_system
+- vsphere_copy: host=vhost login=vuser password=vpass src=/srv/images/centos7.iso datacenter='DC1 Someplace' datastore=datastore1 path=iso/centos7.iso compare=size
+  transport: local
+- vsphere_copy: host=vhost login=vuser password=vpass src=/srv/images/ datacenter='DC1 Someplace' datastore=datastore1 path=iso threads=4 compare=checksum
+  transport: local
 '''
 
-import atexit
 import urllib
-import mmap
+import urllib2
 import errno
+import hashlib
+import os
 import socket
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+BUFSIZE = 1024 * 1024
 
 def vmware_path(datastore, datacenter, path):
     ''' Constructs a URL path that VSphere accepts reliably '''
@@ -96,6 +141,164 @@ def vmware_path(datastore, datacenter, path):
     params = urllib.urlencode(params)
     return "%s?%s" % (path, params)
 
+class FileReader(object):
+    ''' File object counting the bytes read out of it, which is how much was sent '''
+
+    def __init__(self, path):
+        self.fd = open(path, "rb")
+        self.size = os.fstat(self.fd.fileno()).st_size
+        self.sent = 0
+
+    def read(self, size=-1):
+        data = self.fd.read(size)
+        self.sent += len(data)
+        return data
+
+    def close(self):
+        self.fd.close()
+
+def local_checksum(path):
+    sha1 = hashlib.sha1()
+    fd = open(path, "rb")
+    try:
+        for data in iter(lambda: fd.read(BUFSIZE), ''):
+            sha1.update(data)
+    finally:
+        fd.close()
+    return sha1.hexdigest()
+
+def remote_size(url, login, password, validate_certs):
+    ''' Returns the size of the datastore file, or None if it does not exist '''
+    try:
+        r = open_url(url, method='HEAD', url_username=login, url_password=password,
+                validate_certs=validate_certs, force_basic_auth=True)
+    except urllib2.HTTPError, e:
+        if e.code == 404:
+            return None
+        raise
+    length = r.headers.get('content-length', None)
+    if length is None:
+        return None
+    return int(length)
+
+def remote_checksum(url, login, password, validate_certs):
+    sha1 = hashlib.sha1()
+    r = open_url(url, url_username=login, url_password=password,
+            validate_certs=validate_certs, force_basic_auth=True)
+    for data in iter(lambda: r.read(BUFSIZE), ''):
+        sha1.update(data)
+    return sha1.hexdigest()
+
+def is_identical(src, size, url, compare, login, password, validate_certs):
+    ''' Tells if the datastore file is the same as src, as far as compare can tell '''
+    if compare == 'none':
+        return False
+    if remote_size(url, login, password, validate_certs) != size:
+        return False
+    if compare == 'size':
+        return True
+    return remote_checksum(url, login, password, validate_certs) == local_checksum(src)
+
+def upload_file(src, url, login, password, validate_certs, compare, retries):
+    ''' Uploads src to url, returns the result, with failed set if it did not succeed '''
+    data = FileReader(src)
+    try:
+        try:
+            if is_identical(src, data.size, url, compare, login, password, validate_certs):
+                return dict(changed=False, src=src, url=url, size=data.size)
+        except Exception, e:
+            return dict(failed=True, msg='Failed to compare with the datastore file: %s' % str(e), src=src, url=url)
+
+        headers = {
+            "Content-Type": "application/octet-stream",
+            "Content-Length": str(data.size),
+        }
+
+        attempt = 0
+        while True:
+            attempt += 1
+            if attempt > 1:
+                # Every attempt sends the file again from offset 0 with a fresh reader
+                data.close()
+                data = FileReader(src)
+            started = time.time()
+            try:
+                r = open_url(url, data=data, headers=headers, method='PUT',
+                        url_username=login, url_password=password, validate_certs=validate_certs,
+                        force_basic_auth=True)
+            except socket.timeout, e:
+                result = dict(failed=True, msg='Timed out while uploading: %s' % str(e), status=None, errno=-1, reason=str(e), src=src, url=url)
+            except socket.error, e:
+                if isinstance(e.args, tuple) and e[0] == errno.ECONNRESET:
+                    # VSphere resets connection if the file is in use and cannot be replaced
+                    result = dict(failed=True, msg='Failed to upload, image probably in use', status=None, errno=e[0], reason=str(e), src=src, url=url)
+                else:
+                    result = dict(failed=True, msg=str(e), status=None, errno=e[0], reason=str(e), src=src, url=url)
+            except urllib2.HTTPError, e:
+                result = dict(failed=True, msg=str(e), status=e.code, errno=-1, reason=str(e), src=src, url=url)
+                if e.code < 500:
+                    return result
+            except urllib2.URLError, e:
+                # Connection refused, DNS failures and timeouts while connecting
+                error_code = getattr(e.reason, 'errno', None)
+                if not isinstance(error_code, int):
+                    error_code = -1
+                result = dict(failed=True, msg=str(e), status=None, errno=error_code, reason=str(e.reason), src=src, url=url)
+            except Exception, e:
+                error_code = -1
+                try:
+                    if isinstance(e[0], int):
+                        error_code = e[0]
+                except (KeyError, IndexError, TypeError):
+                    pass
+                return dict(failed=True, msg=str(e), status=None, errno=error_code, reason=str(e), src=src, url=url)
+            else:
+                break
+
+            # The datastore has no partial upload, a retry sends the whole file again
+            if attempt > retries:
+                result['attempts'] = attempt
+                return result
+            time.sleep(min(2 ** attempt, 30))
+
+        elapsed = time.time() - started
+        status = r.getcode()
+        if 200 <= status < 300:
+            return dict(changed=True, src=src, status=status, reason=r.msg, url=url, size=data.size,
+                        sent=data.sent, seconds=round(elapsed, 2), attempts=attempt,
+                        throughput=round(data.sent / max(elapsed, 0.001) / 1024 / 1024, 2))
+
+        length = r.headers.get('content-length', None)
+        if r.headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunked = 1
+        else:
+            chunked = 0
+        return dict(failed=True, msg='Failed to upload', errno=None, status=status, reason=r.msg, length=length, headers=dict(r.headers), chunked=chunked, src=src, url=url)
+    finally:
+        data.close()
+
+def upload_files(uploads, threads, *args):
+    ''' Uploads the (src, url) of uploads with a pool of threads, returns the result of each '''
+    results = [None] * len(uploads)
+    pending = queue.Queue()
+    for i, upload in enumerate(uploads):
+        pending.put((i, upload))
+
+    def worker():
+        while True:
+            try:
+                i, (src, url) = pending.get_nowait()
+            except queue.Empty:
+                return
+            results[i] = upload_file(src, url, *args)
+
+    workers = [threading.Thread(target=worker) for i in range(max(1, min(threads, len(uploads))))]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return results
+
 def main():
 
     module = AnsibleModule(
@@ -108,6 +311,9 @@ def main():
             datastore = dict(required=True),
             dest = dict(required=True, aliases=[ 'path' ]),
             validate_certs = dict(required=False, default=True, type='bool'),
+            compare = dict(required=False, default='none', choices=['none', 'size', 'checksum']),
+            retries = dict(required=False, default=3, type='int'),
+            threads = dict(required=False, default=4, type='int'),
         ),
         # Implementing check-mode using HEAD is impossible, since size/date is not 100% reliable
         supports_check_mode = False,
@@ -121,51 +327,32 @@ def main():
     datastore = module.params.get('datastore')
     dest = module.params.get('dest')
     validate_certs = module.params.get('validate_certs')
+    compare = module.params.get('compare')
+    retries = module.params.get('retries')
+    threads = module.params.get('threads')
 
-    fd = open(src, "rb")
-    atexit.register(fd.close)
+    if os.path.isdir(src):
+        uploads = []
+        for name in sorted(os.listdir(src)):
+            path = os.path.join(src, name)
+            if os.path.isfile(path):
+                remote_path = vmware_path(datastore, datacenter, "%s/%s" % (dest.rstrip("/"), name))
+                uploads.append((path, 'https://%s%s' % (host, remote_path)))
 
-    data = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
-    atexit.register(data.close)
+        results = upload_files(uploads, threads, login, password, validate_certs, compare, retries)
+        changed = len([r for r in results if r.get('changed')]) > 0
+        failed = [r for r in results if r.get('failed')]
+        if failed:
+            module.fail_json(msg='Failed to upload %d of %d files' % (len(failed), len(results)), changed=changed, files=results)
+        module.exit_json(changed=changed, files=results)
 
     remote_path = vmware_path(datastore, datacenter, dest)
     url = 'https://%s%s' % (host, remote_path)
 
-    headers = {
-        "Content-Type": "application/octet-stream",
-        "Content-Length": str(len(data)),
-    }
-
-    try:
-        r = open_url(url, data=data, headers=headers, method='PUT',
-                url_username=login, url_password=password, validate_certs=validate_certs,
-                force_basic_auth=True)
-    except socket.error, e:
-        if isinstance(e.args, tuple) and e[0] == errno.ECONNRESET:
-            # VSphere resets connection if the file is in use and cannot be replaced
-            module.fail_json(msg='Failed to upload, image probably in use', status=None, errno=e[0], reason=str(e), url=url)
-        else:
-            module.fail_json(msg=str(e), status=None, errno=e[0], reason=str(e), url=url)
-    except Exception, e:
-        error_code = -1
-        try:
-            if isinstance(e[0], int):
-                error_code = e[0]
-        except KeyError:
-            pass
-        module.fail_json(msg=str(e), status=None, errno=error_code, reason=str(e), url=url)
-
-    status = r.getcode()
-    if 200 <= status < 300:
-        module.exit_json(changed=True, status=status, reason=r.msg, url=url)
-    else:
-        length = r.headers.get('content-length', None)
-        if r.headers.get('transfer-encoding', '').lower() == 'chunked':
-            chunked = 1
-        else:
-            chunked = 0
-
-        module.fail_json(msg='Failed to upload', errno=None, status=status, reason=r.msg, length=length, headers=dict(r.headers), chunked=chunked, url=url)
+    result = upload_file(src, url, login, password, validate_certs, compare, retries)
+    if result.pop('failed', False):
+        module.fail_json(**result)
+    module.exit_json(**result)
 
 # Import module snippets
 from ansible.module_utils.basic import *
@@ -111,6 +111,35 @@ options:
         required: false
         default: True
         version_added: "2.1"
+    values:
+        description:
+          - a dict of keys, relative to I(key), and of their values. The
+            whole tree under I(key) is read at once and the keys whose value
+            differs are set through transactions, each key only if it was not
+            modified since it was read. With state 'absent' the keys are
+            removed.
+        required: false
+        default: None
+        version_added: "2.2"
+    src:
+        description:
+          - a local directory used like I(values), the path of every file
+            relative to the directory being its key and its content the value.
+        required: false
+        default: None
+        version_added: "2.2"
+    purge:
+        description:
+          - with I(values) or I(src) and state 'present', remove the keys under
+            I(key) which are not part of them.
+        required: false
+        default: false
+        version_added: "2.2"
+notes:
+  - I(values) and I(src) use transactions, which require Consul 0.7 or later.
+  - The changes of I(values) and I(src) are sent in transactions of at most
+    64 operations, as Consul limits their size. If one fails, its changes
+    are not applied but the ones of the transactions before it are.
 """
 
 
@@ -131,6 +160,19 @@ EXAMPLES = '''
       key: ansible/groups/dc1/somenode
       value: 'top_secret'
 
+  - name: load the configuration tree of an application
+    consul_kv:
+      key: config/myapp
+      src: /etc/myapp/consul
+      purge: yes
+
+  - name: set a few keys of the tree at once
+    consul_kv:
+      key: config/myapp
+      values:
+        db/host: db1.example.com
+        db/port: 5432
+
   - name: Register a key/value pair with an associated session
     consul_kv:
       key: stg/node/server_birthday
@@ -140,9 +182,13 @@ EXAMPLES = '''
 '''
 
 import sys
+import base64
+import json
+import os
 
 try:
     import consul
+    import requests
     from requests.exceptions import ConnectionError
     python_consul_installed = True
 except ImportError, e:
@@ -154,6 +200,9 @@ def execute(module):
 
     state = module.params.get('state')
 
+    if module.params.get('values') is not None or module.params.get('src'):
+        sync_tree(module)
+
     if state == 'acquire' or state == 'release':
         lock(module, state)
     if state == 'present':
@@ -240,6 +289,128 @@ def remove_value(module):
                      data=existing)
 
 
+TXN_MAX_OPS = 64
+
+
+def tree_values(module):
+    ''' the values to sync, by their full key '''
+    prefix = module.params.get('key').rstrip('/')
+    values = module.params.get('values')
+    if module.params.get('src'):
+        src = module.params.get('src')
+        if not os.path.isdir(src):
+            module.fail_json(msg='%s is not a directory' % src)
+        values = {}
+        for root, dirs, files in os.walk(src):
+            for name in files:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, src).replace(os.sep, '/')
+                f = open(path, 'rb')
+                try:
+                    values[relative] = f.read()
+                finally:
+                    f.close()
+
+    result = {}
+    for relative, value in values.items():
+        if value is None:
+            value = ''
+        elif isinstance(value, unicode):
+            value = value.encode('utf-8')
+        else:
+            value = str(value)
+        result['%s/%s' % (prefix, relative.strip('/'))] = value
+    return result
+
+
+def apply_txn(module, ops):
+    ''' sends the operations through /v1/txn, TXN_MAX_OPS at a time, returns
+    the number applied and the errors of the transaction which failed '''
+    session = requests.Session()
+    url = '%s://%s:%s/v1/txn' % (module.params.get('scheme'),
+                                 module.params.get('host'),
+                                 module.params.get('port'))
+    params = {}
+    if module.params.get('token'):
+        params['token'] = module.params.get('token')
+
+    applied = 0
+    for start in range(0, len(ops), TXN_MAX_OPS):
+        chunk = ops[start:start + TXN_MAX_OPS]
+        response = session.put(url, params=params, data=json.dumps(chunk),
+                               verify=module.params.get('validate_certs'))
+        if response.status_code == 409:
+            errors = []
+            for error in response.json().get('Errors') or []:
+                op = chunk[error.get('OpIndex', 0)]['KV']
+                errors.append('%s %s: %s' % (op['Verb'], op['Key'], error.get('What')))
+            return applied, errors
+        elif response.status_code != 200:
+            return applied, [response.text]
+        applied += len(chunk)
+    return applied, []
+
+
+def sync_tree(module):
+    ''' reads the tree under key once and sets or removes the keys which
+    differ from values through transactions, checking their ModifyIndex '''
+    consul_api = get_consul_api(module)
+
+    state = module.params.get('state')
+    if state not in ['present', 'absent']:
+        module.fail_json(msg='values and src require state present or absent')
+
+    key = module.params.get('key').rstrip('/')
+    values = tree_values(module)
+    flags = module.params.get('flags')
+
+    index, existing = consul_api.kv.get(key + '/', recurse=True)
+    current = dict((entry['Key'], entry) for entry in existing or [])
+
+    ops = []
+    created, updated, deleted = [], [], []
+    if state == 'present':
+        for k in sorted(values):
+            entry = current.get(k)
+            if entry is None:
+                created.append(k)
+                modify_index = 0
+            elif ((entry['Value'] or '') != values[k] or
+                  (flags is not None and entry.get('Flags', 0) != int(flags))):
+                updated.append(k)
+                modify_index = entry['ModifyIndex']
+            else:
+                continue
+            op = {'Verb': 'cas', 'Key': k, 'Value': base64.b64encode(values[k]),
+                  'Index': modify_index}
+            if flags is not None:
+                op['Flags'] = int(flags)
+            ops.append({'KV': op})
+        if module.params.get('purge'):
+            deleted = sorted(k for k in current if k not in values)
+    else:
+        deleted = sorted(k for k in values if k in current)
+
+    for k in deleted:
+        ops.append({'KV': {'Verb': 'delete-cas', 'Key': k,
+                           'Index': current[k]['ModifyIndex']}})
+
+    applied = 0
+    if ops and not module.check_mode:
+        applied, errors = apply_txn(module, ops)
+        if errors:
+            module.fail_json(msg='transaction failed after %d of %d changes were applied' %
+                             (applied, len(ops)), errors=errors, changed=applied > 0,
+                             index=index, key=key)
+
+    module.exit_json(changed=len(ops) > 0,
+                     index=index,
+                     key=key,
+                     created=created,
+                     updated=updated,
+                     deleted=deleted)
+
+
 def get_consul_api(module, token=None):
     return consul.Consul(host=module.params.get('host'),
                          port=module.params.get('port'),
@@ -267,10 +438,13 @@ def main():
         state=dict(default='present', choices=['present', 'absent', 'acquire', 'release']),
         token=dict(required=False, default='anonymous', no_log=True),
         value=dict(required=False),
-        session=dict(required=False)
+        session=dict(required=False),
+        values=dict(required=False, type='dict'),
+        src=dict(required=False, type='path'),
+        purge=dict(required=False, default=False, type='bool')
     )
 
-    module = AnsibleModule(argument_spec, supports_check_mode=False)
+    module = AnsibleModule(argument_spec, supports_check_mode=True)
 
     test_dependencies(module)
         
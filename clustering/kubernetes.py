@@ -28,6 +28,9 @@ description:
         Only supports HTTP Basic Auth
         Only supports 'strategic merge' for update, http://goo.gl/fCPYxT
         SSL certs are not working, use 'validate_certs=off' to disable
+    - The existing objects are listed once per kind and namespace, and only
+      the objects which differ from them are sent to the API, over a single
+      keep-alive connection.
 options:
   api_endpoint:
     description:
@@ -39,6 +42,8 @@ options:
     description:
       - The Kubernetes YAML data to send to the API I(endpoint). This option is
         mutually exclusive with C('file_reference').
+      - It can be a list of objects, or a string holding a multi-document
+        YAML manifest.
     required: true
     default: null
   file_reference:
@@ -47,6 +52,16 @@ options:
         This option is mutually exclusive with C('inline_data').
     required: false
     default: null
+  label_selector:
+    description:
+      - Label selector used to list the existing objects of every kind, for
+        instance C(app=frontend). Objects of the data not matching it are
+        considered absent, except with C(state=absent) where they are
+        deleted all the same. By default all the objects of the kind in the
+        namespace are listed.
+    required: false
+    default: null
+    version_added: "2.2"
   certificate_authority_data:
     description:
       - Certificate Authority data for Kubernetes server. Should be in either
@@ -58,6 +73,11 @@ options:
   state:
     description:
       - The desired action to take on the Kubernetes data.
+      - With C(update) an existing object is only sent when a field of the
+        data differs from it. Fields the data does not set, like the ones
+        filled in by the server, are not compared.
+      - With C(replace) the object is always sent, as the fields the data no
+        longer sets have to be removed from it.
     required: true
     default: "present"
     choices: ["present", "absent", "update", "replace"]
@@ -124,6 +144,16 @@ EXAMPLES = '''
     file_reference: /path/to/create_namespace.yaml
     state: present
 
+# Apply a multi-document manifest, only patching the objects which changed.
+- name: Update the frontend objects
+  kubernetes:
+    api_endpoint: 123.45.67.89
+    username: admin
+    password: redacted
+    file_reference: /path/to/frontend.yaml
+    label_selector: app=frontend
+    state: update
+
 '''
 
 RETURN = '''
@@ -150,6 +180,19 @@ api_response:
 
 import yaml
 import base64
+import socket
+import urllib
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+try:
+    import ssl
+    HAS_SSL_CONTEXT = hasattr(ssl, 'create_default_context')
+except ImportError:
+    HAS_SSL_CONTEXT = False
 
 ############################################################################
 ############################################################################
@@ -230,74 +273,212 @@ def decode_cert_data(module):
         module.params["certificate_authority_data"] = base64.b64decode(d)
 
 
-def api_request(module, url, method="GET", headers=None, data=None):
+class K8sResponse(object):
+    """Status and reason of a request made through fetch_url."""
+
+    def __init__(self, status, reason):
+        self.status = status
+        self.reason = reason
+
+
+class K8sClient(object):
+    """One keep-alive connection to the API endpoint, used for every request."""
+
+    def __init__(self, module, transport, api_endpoint):
+        self.module = module
+        self.transport = transport
+        self.api_endpoint = api_endpoint
+        self.headers = {"User-Agent": module.params.get('http_agent')}
+        username = module.params.get('username')
+        password = module.params.get('password')
+        if transport == 'https' and username and password:
+            auth = base64.b64encode("%s:%s" % (username, password))
+            self.headers["Authorization"] = "Basic %s" % auth
+        self.conn = None
+
+    def connect(self):
+        if self.transport == 'http':
+            return httplib.HTTPConnection(self.api_endpoint, timeout=30)
+        kwargs = {}
+        if HAS_SSL_CONTEXT:
+            if self.module.params.get('validate_certs'):
+                kwargs['context'] = ssl.create_default_context()
+            else:
+                kwargs['context'] = ssl._create_unverified_context()
+        return httplib.HTTPSConnection(self.api_endpoint, timeout=30, **kwargs)
+
+    def request(self, url, method="GET", headers=None, data=None):
+        all_headers = dict(self.headers)
+        all_headers.update(headers or {})
+        if self.transport == 'https' and self.module.params.get('validate_certs') and not HAS_SSL_CONTEXT:
+            return self.fetch(url, method, all_headers, data)
+        # The server may have closed the idle connection, retry once on a new one.
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = self.connect()
+            try:
+                self.conn.request(method, url, data, all_headers)
+                response = self.conn.getresponse()
+                return response, response.read()
+            except (httplib.HTTPException, socket.error), e:
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    return None, str(e)
+
+    def fetch(self, url, method, headers, data):
+        """
+        Without ssl.create_default_context, httplib does not check the
+        certificate of the server. fetch_url does, or fails saying why, at
+        the cost of a new connection for each request.
+        """
+        response, info = fetch_url(self.module, "https://%s%s" % (self.api_endpoint, url),
+                                   method=method, headers=headers, data=data)
+        status = int(info['status'])
+        if status == -1:
+            return None, info['msg']
+        if response is not None:
+            content = response.read()
+        else:
+            content = info.get('body', '')
+        return K8sResponse(status, info['msg']), content
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def api_request(client, url, method="GET", headers=None, data=None):
     body = None
     if data:
         data = json.dumps(data)
-    response, info = fetch_url(module, url, method=method, headers=headers, data=data)
-    if int(info['status']) == -1:
-        module.fail_json(msg="Failed to execute the API request: %s" % info['msg'], url=url, method=method, headers=headers)
-    if response is not None:
-        body = json.loads(response.read())
+    response, content = client.request(url, method=method, headers=headers, data=data)
+    if response is None:
+        client.module.fail_json(msg="Failed to execute the API request: %s" % content, url=url, method=method, headers=headers)
+    info = {'status': response.status, 'msg': response.reason}
+    if content:
+        try:
+            body = json.loads(content)
+        except ValueError:
+            body = None
+        if response.status >= 400 and isinstance(body, dict) and body.get('message'):
+            info['msg'] = body['message']
     return info, body
 
 
-def k8s_create_resource(module, url, data):
-    info, body = api_request(module, url, method="POST", data=data, headers={"Content-Type": "application/json"})
+def k8s_list_resources(client, url):
+    """Return the existing objects at url, by name."""
+    label_selector = client.module.params.get('label_selector')
+    if label_selector:
+        url = "%s?%s" % (url, urllib.urlencode({'labelSelector': label_selector}))
+    info, body = api_request(client, url)
+    if info['status'] >= 400:
+        client.module.fail_json(msg="failed to list the resources: %s" % info['msg'], url=url)
+    existing = {}
+    for item in (body or {}).get('items') or []:
+        existing[item.get('metadata', {}).get('name')] = item
+    return existing
+
+
+def k8s_matches(desired, current):
+    """Return True if every field set in desired has the same value in current."""
+    if isinstance(desired, dict):
+        if not isinstance(current, dict):
+            return False
+        for key, value in desired.items():
+            # a null field deletes it in a strategic merge patch
+            if value is None:
+                if current.get(key) is not None:
+                    return False
+            elif not k8s_matches(value, current.get(key)):
+                return False
+        return True
+    if isinstance(desired, list):
+        if not isinstance(current, list) or len(desired) != len(current):
+            return False
+        for d, c in zip(desired, current):
+            if not k8s_matches(d, c):
+                return False
+        return True
+    if desired is None:
+        return current is None
+    if isinstance(desired, (int, long, float)) and not isinstance(desired, bool) and isinstance(current, basestring):
+        return str(desired) == current
+    return desired == current
+
+
+def k8s_unchanged(data, current):
+    """Return True if current, as listed, already matches data."""
+    desired = dict((k, v) for k, v in data.items() if k not in ('kind', 'apiVersion'))
+    return k8s_matches(desired, current)
+
+
+def k8s_listed_body(data, current):
+    """Add the kind and apiVersion a LIST leaves out of its items."""
+    body = dict(current)
+    for key in ('kind', 'apiVersion'):
+        if key in data:
+            body[key] = data[key]
+    return body
+
+
+def k8s_create_resource(client, url, data):
+    info, body = api_request(client, url, method="POST", data=data, headers={"Content-Type": "application/json"})
     if info['status'] == 409:
         name = data["metadata"].get("name", None)
-        info, body = api_request(module, url + "/" + name)
+        info, body = api_request(client, url + "/" + name)
         return False, body
     elif info['status'] >= 400:
-        module.fail_json(msg="failed to create the resource: %s" % info['msg'], url=url)
+        client.module.fail_json(msg="failed to create the resource: %s" % info['msg'], url=url)
     return True, body
 
 
-def k8s_delete_resource(module, url, data):
+def k8s_delete_resource(client, url, data):
     name = data.get('metadata', {}).get('name')
     if name is None:
-        module.fail_json(msg="Missing a named resource in object metadata when trying to remove a resource")
+        client.module.fail_json(msg="Missing a named resource in object metadata when trying to remove a resource")
 
     url = url + '/' + name
-    info, body = api_request(module, url, method="DELETE")
+    info, body = api_request(client, url, method="DELETE")
     if info['status'] == 404:
         return False, "Resource name '%s' already absent" % name
     elif info['status'] >= 400:
-        module.fail_json(msg="failed to delete the resource '%s': %s" % (name, info['msg']), url=url)
+        client.module.fail_json(msg="failed to delete the resource '%s': %s" % (name, info['msg']), url=url)
     return True, "Successfully deleted resource name '%s'" % name
 
 
-def k8s_replace_resource(module, url, data):
+def k8s_replace_resource(client, url, data):
     name = data.get('metadata', {}).get('name')
     if name is None:
-        module.fail_json(msg="Missing a named resource in object metadata when trying to replace a resource")
+        client.module.fail_json(msg="Missing a named resource in object metadata when trying to replace a resource")
 
     headers = {"Content-Type": "application/json"}
     url = url + '/' + name
-    info, body = api_request(module, url, method="PUT", data=data, headers=headers)
+    info, body = api_request(client, url, method="PUT", data=data, headers=headers)
     if info['status'] == 409:
         name = data["metadata"].get("name", None)
-        info, body = api_request(module, url + "/" + name)
+        info, body = api_request(client, url + "/" + name)
         return False, body
     elif info['status'] >= 400:
-        module.fail_json(msg="failed to replace the resource '%s': %s" % (name, info['msg']), url=url)
+        client.module.fail_json(msg="failed to replace the resource '%s': %s" % (name, info['msg']), url=url)
     return True, body
 
 
-def k8s_update_resource(module, url, data):
+def k8s_update_resource(client, url, data):
     name = data.get('metadata', {}).get('name')
     if name is None:
-        module.fail_json(msg="Missing a named resource in object metadata when trying to update a resource")
+        client.module.fail_json(msg="Missing a named resource in object metadata when trying to update a resource")
 
     headers = {"Content-Type": "application/strategic-merge-patch+json"}
     url = url + '/' + name
-    info, body = api_request(module, url, method="PATCH", data=data, headers=headers)
+    info, body = api_request(client, url, method="PATCH", data=data, headers=headers)
     if info['status'] == 409:
         name = data["metadata"].get("name", None)
-        info, body = api_request(module, url + "/" + name)
+        info, body = api_request(client, url + "/" + name)
         return False, body
     elif info['status'] >= 400:
-        module.fail_json(msg="failed to update the resource '%s': %s" % (name, info['msg']), url=url)
+        client.module.fail_json(msg="failed to update the resource '%s': %s" % (name, info['msg']), url=url)
     return True, body
 
 
@@ -315,10 +496,12 @@ def main():
             api_endpoint=dict(required=True),
             file_reference=dict(required=False),
             inline_data=dict(required=False),
+            label_selector=dict(required=False),
             state=dict(default="present", choices=["present", "absent", "update", "replace"])
         ),
         mutually_exclusive = (('file_reference', 'inline_data'), ('username', 'insecure'), ('password', 'insecure')),
         required_one_of = (('file_reference', 'inline_data'),),
+        supports_check_mode=True,
     )
 
     decode_cert_data(module)
@@ -331,6 +514,11 @@ def main():
 
     if inline_data:
         data = inline_data
+        if isinstance(data, basestring):
+            try:
+                data = [x for x in yaml.safe_load_all(data)]
+            except yaml.YAMLError:
+                module.fail_json(msg="The inline_data contained invalid YAML/JSON data")
     else:
         try:
             f = open(file_reference, "r")
@@ -346,40 +534,60 @@ def main():
     if insecure:
         transport = 'http'
 
-    target_endpoint = "%s://%s" % (transport, api_endpoint)
+    client = K8sClient(module, transport, api_endpoint)
 
     body = []
     changed = False
 
-    # make sure the data is a list
+    # make sure the data is a list, leaving out the empty documents
     if not isinstance(data, list):
         data = [ data ]
+    data = [item for item in data if item]
+
+    # the existing objects, listed once per kind and namespace
+    existing = {}
 
     for item in data:
-        namespace = "default"
-        if item and 'metadata' in item:
+        name = None
+        if 'metadata' in item:
             namespace = item.get('metadata', {}).get('namespace', "default")
+            name = item.get('metadata', {}).get('name')
             kind = item.get('kind', '').lower()
             try:
-                url = target_endpoint + KIND_URL[kind]
+                url = KIND_URL[kind]
             except KeyError:
-                module.fail_json("invalid resource kind specified in the data: '%s'" % kind)
+                module.fail_json(msg="invalid resource kind specified in the data: '%s'" % kind)
             url = url.replace("{namespace}", namespace)
         else:
-            url = target_endpoint
+            url = "/"
 
-        if state == 'present':
-            item_changed, item_body = k8s_create_resource(module, url, item)
+        if name is None:
+            current = None
+        else:
+            if url not in existing:
+                existing[url] = k8s_list_resources(client, url)
+            current = existing[url].get(name)
+
+        if current is not None and (state == 'present' or (state == 'update' and k8s_unchanged(item, current))):
+            item_changed, item_body = False, k8s_listed_body(item, current)
+        elif name is not None and current is None and state == 'absent' and not module.params.get('label_selector'):
+            # Not listed under a selector does not mean absent, the DELETE tells
+            item_changed, item_body = False, "Resource name '%s' already absent" % name
+        elif module.check_mode:
+            item_changed, item_body = True, item
+        elif state == 'present':
+            item_changed, item_body = k8s_create_resource(client, url, item)
         elif state == 'absent':
-            item_changed, item_body = k8s_delete_resource(module, url, item)
+            item_changed, item_body = k8s_delete_resource(client, url, item)
         elif state == 'replace':
-            item_changed, item_body = k8s_replace_resource(module, url, item)
+            item_changed, item_body = k8s_replace_resource(client, url, item)
         elif state == 'update':
-            item_changed, item_body = k8s_update_resource(module, url, item)
+            item_changed, item_body = k8s_update_resource(client, url, item)
 
         changed |= item_changed
         body.append(item_body)
 
+    client.close()
     module.exit_json(changed=changed, api_response=body)
 
 
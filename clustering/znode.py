@@ -28,7 +28,8 @@ options:
         required: true
     name:
         description:
-            - The path of the znode.
+            - The path of the znode, or of the root of the tree with I(znodes),
+              I(src) and C(op=export).
         required: true
     value:
         description:
@@ -38,7 +39,11 @@ options:
     op:
         description:
             - An operation to perform. Mutually exclusive with state.
+            - C(export) reads the whole tree under I(name), returned as
+              I(znodes) and written to I(dest) if set. Ephemeral znodes are
+              left out.
         default: None
+        choices: ['get', 'wait', 'list', 'export']
         required: false
     state:
         description:
@@ -56,6 +61,28 @@ options:
         default: False
         required: false
         version_added: "2.1"
+    znodes:
+        description:
+            - A dict of paths relative to I(name), C("") being I(name) itself,
+              and of their values. With C(state=present) they are created or
+              updated, with C(state=absent) deleted, in a single transaction.
+              A znode is only updated if it was not changed since it was read,
+              otherwise nothing is changed.
+        default: None
+        required: false
+        version_added: "2.2"
+    src:
+        description:
+            - A JSON file written by C(op=export), used as I(znodes).
+        default: None
+        required: false
+        version_added: "2.2"
+    dest:
+        description:
+            - The JSON file C(op=export) writes the tree to.
+        default: None
+        required: false
+        version_added: "2.2"
 requirements:
     - kazoo >= 2.1
     - python >= 2.6
@@ -77,8 +104,26 @@ EXAMPLES = """
 
 # Deleting a znode at path /mypath
 - action: znode hosts=localhost:2181 name=/mypath state=absent
+
+# Creating or updating many znodes under /services at once
+- znode:
+    hosts: localhost:2181
+    name: /services
+    state: present
+    znodes:
+      web/port: "8080"
+      web/hosts: "web1,web2"
+      db/port: "5432"
+
+# Saving the tree under /config and restoring it
+- action: znode hosts=localhost:2181 name=/config op=export dest=/var/backups/config.json
+- action: znode hosts=localhost:2181 name=/config state=present src=/var/backups/config.json
 """
 
+import json
+import os
+import threading
+
 try:
     from kazoo.client import KazooClient
     from kazoo.exceptions import NoNodeError, ZookeeperError
@@ -94,10 +139,13 @@ def main():
             hosts=dict(required=True, type='str'),
             name=dict(required=True, type='str'),
             value=dict(required=False, default=None, type='str'),
-            op=dict(required=False, default=None, choices=['get', 'wait', 'list']),
+            op=dict(required=False, default=None, choices=['get', 'wait', 'list', 'export']),
             state=dict(choices=['present', 'absent']),
             timeout=dict(required=False, default=300, type='int'),
-            recursive=dict(required=False, default=False, type='bool')
+            recursive=dict(required=False, default=False, type='bool'),
+            znodes=dict(required=False, default=None, type='dict'),
+            src=dict(required=False, default=None, type='path'),
+            dest=dict(required=False, default=None, type='path')
         ),
         supports_check_mode=False
     )
@@ -119,7 +167,8 @@ def main():
         'op': {
             'get': zoo.get,
             'list': zoo.list,
-            'wait': zoo.wait
+            'wait': zoo.wait,
+            'export': zoo.export
         },
         'state': {
             'present': zoo.present,
@@ -145,6 +194,15 @@ def check_params(params):
     if params['state'] and params['op']:
         return {'success': False, 'msg': 'Please choose an operation (op) or a state, but not both.'}
 
+    if params['znodes'] is not None and params['src']:
+        return {'success': False, 'msg': 'Please choose znodes or src, but not both.'}
+
+    if (params['znodes'] is not None or params['src']) and not params['state']:
+        return {'success': False, 'msg': 'znodes and src can only be used with a state.'}
+
+    if params['dest'] and params['op'] != 'export':
+        return {'success': False, 'msg': 'dest can only be used with op=export.'}
+
     return {'success': True}
 
 
@@ -154,8 +212,14 @@ class KazooCommandProxy():
         self.zk = KazooClient(module.params['hosts'])
 
     def absent(self):
+        znodes = self._znodes()
+        if znodes is not None:
+            return self._absent_many(znodes.keys())
         return self._absent(self.module.params['name'])
 
+    def export(self):
+        return self._export(self.module.params['name'], self.module.params['dest'])
+
     def exists(self, znode):
         return self.zk.exists(znode)
 
@@ -165,6 +229,9 @@ class KazooCommandProxy():
                       'znode': self.module.params['name']}
 
     def present(self):
+        znodes = self._znodes()
+        if znodes is not None:
+            return self._present_many(znodes)
         return self._present(self.module.params['name'], self.module.params['value'])
 
     def get(self):
@@ -180,6 +247,159 @@ class KazooCommandProxy():
     def wait(self):
         return self._wait(self.module.params['name'], self.module.params['timeout'])
 
+    def _path(self, relative):
+        root = self.module.params['name'].rstrip('/')
+        if not relative:
+            return root or '/'
+        return '%s/%s' % (root, relative.strip('/'))
+
+    def _relative(self, path):
+        root = self.module.params['name'].rstrip('/')
+        return path[len(root):].lstrip('/')
+
+    def _znodes(self):
+        znodes = self.module.params['znodes']
+        if self.module.params['src']:
+            try:
+                f = open(self.module.params['src'])
+                try:
+                    znodes = json.load(f)
+                finally:
+                    f.close()
+            except (IOError, ValueError), e:
+                self.module.fail_json(msg='Unable to read %s: %s' % (self.module.params['src'], str(e)))
+        if znodes is None:
+            return None
+        values = {}
+        for k, v in znodes.items():
+            if v is None:
+                v = ''
+            elif isinstance(v, unicode):
+                v = v.encode('utf-8')
+            values[self._path(k)] = str(v)
+        return values
+
+    def _read_many(self, paths):
+        """Return the (value, stat) of the paths which exist, reading them all at once."""
+        pending = [(path, self.zk.get_async(path)) for path in paths]
+        found = {}
+        for path, async_result in pending:
+            try:
+                found[path] = async_result.get()
+            except NoNodeError:
+                pass
+        return found
+
+    def _commit(self, transaction, result):
+        errors = []
+        for op, outcome in zip(transaction.operations, transaction.commit()):
+            if isinstance(outcome, Exception):
+                errors.append('%s %s: %s' % (type(op).__name__, op.path, type(outcome).__name__))
+        if errors:
+            return False, {'msg': 'The transaction failed, no znode was changed.', 'errors': errors}
+        result.update({'changed': True})
+        return True, result
+
+    def _present_many(self, znodes):
+        current = self._read_many(znodes.keys())
+        missing = [path for path in znodes if path not in current]
+
+        # Parents of the new znodes have to be created first, as transactions
+        # cannot create them on their own.
+        parents = set()
+        for path in missing:
+            parent = os.path.dirname(path)
+            while parent != '/' and parent not in znodes and parent not in parents:
+                parents.add(parent)
+                parent = os.path.dirname(parent)
+        existing_parents = self._read_many(parents)
+        parents = [path for path in parents if path not in existing_parents]
+
+        depth = lambda path: (path.count('/'), path)
+        transaction = self.zk.transaction()
+        for path in sorted(parents + missing, key=depth):
+            transaction.create(path, znodes.get(path, ''))
+        updated = []
+        for path in sorted(current):
+            value, zstat = current[path]
+            if value != znodes[path]:
+                transaction.set_data(path, znodes[path], version=zstat.version)
+                updated.append(path)
+
+        result = {'changed': False, 'msg': 'No changes were necessary.', 'znode': self.module.params['name'],
+                  'created': sorted(parents + missing, key=depth), 'updated': updated}
+        if not missing and not updated:
+            return True, result
+        result['msg'] = 'Created %d and updated %d znodes.' % (len(result['created']), len(updated))
+        return self._commit(transaction, result)
+
+    def _absent_many(self, paths):
+        current = dict((path, value[1]) for path, value in self._read_many(paths).items())
+
+        if self.module.params['recursive']:
+            level = list(current)
+            while level:
+                pending = [(path, self.zk.get_children_async(path)) for path in level]
+                children = []
+                for path, async_result in pending:
+                    try:
+                        children.extend('%s/%s' % (path.rstrip('/'), c) for c in async_result.get())
+                    except NoNodeError:
+                        pass
+                children = [c for c in children if c not in current]
+                level = []
+                for path, (value, zstat) in self._read_many(children).items():
+                    current[path] = zstat
+                    level.append(path)
+
+        result = {'changed': False, 'msg': 'The znodes do not exist.', 'znode': self.module.params['name'],
+                  'deleted': []}
+        if not current:
+            return True, result
+
+        # Children go before their parents
+        deleted = sorted(current, key=lambda path: (-path.count('/'), path))
+        transaction = self.zk.transaction()
+        for path in deleted:
+            transaction.delete(path, version=current[path].version)
+        result.update({'msg': 'Deleted %d znodes.' % len(deleted), 'deleted': deleted})
+        return self._commit(transaction, result)
+
+    def _export(self, path, dest):
+        tree = {}
+        level = [path]
+        while level:
+            pending = [(p, self.zk.get_async(p), self.zk.get_children_async(p)) for p in level]
+            level = []
+            for p, data_result, children_result in pending:
+                try:
+                    value, zstat = data_result.get()
+                    children = children_result.get()
+                except NoNodeError:
+                    continue
+                if zstat.ephemeralOwner:
+                    continue
+                tree[self._relative(p)] = value
+                for child in children:
+                    child_path = '%s/%s' % (p.rstrip('/'), child)
+                    if child_path != '/zookeeper':
+                        level.append(child_path)
+
+        if not tree:
+            return False, {'msg': 'The requested node does not exist.', 'znode': path}
+
+        result = {'msg': 'The znodes were exported.', 'znode': path, 'znodes': tree, 'count': len(tree)}
+        if dest:
+            tmp = '%s.%d.tmp' % (dest, os.getpid())
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+            try:
+                os.write(fd, json.dumps(tree, indent=2, sort_keys=True))
+            finally:
+                os.close(fd)
+            os.rename(tmp, dest)
+            result['dest'] = dest
+        return True, result
+
     def _absent(self, znode):
         if self.exists(znode):
             self.zk.delete(znode, recursive=self.module.params['recursive'])
@@ -216,15 +436,20 @@ class KazooCommandProxy():
             self.zk.create(path, value, makepath=True)
             return True, {'changed': True, 'msg': 'Created a new znode.', 'znode': path, 'value': value}
 
-    def _wait(self, path, timeout, interval=5):
+    def _wait(self, path, timeout):
         lim = time.time() + timeout
+        changed = threading.Event()
 
-        while time.time() < lim:
-            if self.exists(path):
+        while True:
+            # The watch fires as soon as the node is created.
+            if self.zk.exists(path, watch=lambda event: changed.set()):
                 return True, {'msg': 'The node appeared before the configured timeout.',
                               'znode': path, 'timeout': timeout}
-            else:
-                time.sleep(interval)
+            remaining = lim - time.time()
+            if remaining <= 0:
+                break
+            changed.wait(remaining)
+            changed.clear()
 
         return False, {'msg': 'The node did not appear before the operation timed out.', 'timeout': timeout,
                        'znode': path}
@@ -26,8 +26,15 @@ except ImportError:
     except ImportError:
         # Let snippet from module_utils/basic.py return a proper error in this case
         pass
+import threading
+import time
 import urllib
 
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
 DOCUMENTATION = '''
 ---
 module: cloudflare_dns
@@ -58,12 +65,32 @@ options:
     required: false
     choices: [ 'tcp', 'udp' ]
     default: null
+  purge:
+    description:
+      - With I(records), delete every record of the zone that is not in the
+        list. Only the record types this module manages are purged.
+    required: false
+    default: false
+    version_added: "2.2"
   record:
     description:
       - Record to add. Required if C(state=present). Default is C(@) (e.g. the zone name)
     required: false
     default: "@"
     aliases: [ "name" ]
+  records:
+    description:
+      - A list of records to manage in one pass, each a dictionary taking
+        the I(record), I(type), I(value), I(ttl), I(priority), I(port),
+        I(proto), I(service), I(weight) and I(state) options. Options not
+        given in an item are taken from the module options.
+      - The records of the zone are fetched once and compared to the list,
+        then the records to create, update or delete are sent through a
+        pool of I(threads) workers.
+      - Mutually exclusive with I(record), I(type), I(value) and I(solo).
+    required: false
+    default: null
+    version_added: "2.2"
   service:
     description: Record service. Required for C(type=SRV)
     required: false
@@ -80,6 +107,14 @@ options:
     required: false
     choices: [ 'present', 'absent' ]
     default: present
+  threads:
+    description:
+      - Number of concurrent API calls used to fetch the pages of a listing
+        and to apply the changes of I(records). Calls that are rate limited
+        by the API are retried after the delay it asks for.
+    required: false
+    default: 4
+    version_added: "2.2"
   timeout:
     description:
       - Timeout for Cloudflare API calls
@@ -174,6 +209,20 @@ EXAMPLES = '''
     weight: 20
     type: SRV
     value: fooserver.my.com
+
+# make the A and CNAME records of my.com exactly these
+- cloudflare_dns:
+    zone: my.com
+    records:
+      - { record: www, type: A, value: 192.0.2.10 }
+      - { record: www, type: A, value: 192.0.2.11 }
+      - { record: api, type: A, value: 192.0.2.20, ttl: 300 }
+      - { record: docs, type: CNAME, value: my.github.io }
+      - { record: old, type: A, value: 192.0.2.99, state: absent }
+    purge: no
+    threads: 8
+    account_email: test@example.com
+    account_api_token: dummyapitoken
 '''
 
 RETURN = '''
@@ -265,8 +314,25 @@ record:
             returned: success
             type: string
             sample: sample.com
+records:
+    description: with I(records), the records created, updated and deleted
+    returned: success, with I(records)
+    type: dictionary
+    sample: {
+        created: [ { type: A, name: www.sample.com, content: 192.0.2.11 } ],
+        updated: [],
+        deleted: []
+    }
 '''
 
+# Types of records managed, that records purge may delete
+RECORD_TYPES = [ 'A', 'AAAA', 'CNAME', 'TXT', 'SRV', 'MX', 'NS', 'SPF' ]
+# Number of times a rate limited (429) API call is retried
+CF_MAX_RETRIES = 5
+
+class CloudflareAPIError(Exception):
+    pass
+
 class CloudflareAPI(object):
 
     cf_api_endpoint = 'https://api.cloudflare.com/client/v4'
@@ -289,6 +355,8 @@ class CloudflareAPI(object):
         self.value             = module.params['value']
         self.weight            = module.params['weight']
         self.zone              = module.params['zone']
+        self.threads           = module.params['threads']
+        self._zone_ids         = {}
 
         if self.record == '@':
             self.record = self.zone
@@ -314,17 +382,21 @@ class CloudflareAPI(object):
             try:
                 data = json.dumps(payload)
             except Exception, e:
-                self.module.fail_json(msg="Failed to encode payload as JSON: {0}".format(e))
-
-        resp, info = fetch_url(self.module,
-                               self.cf_api_endpoint + api_call,
-                               headers=headers,
-                               data=data,
-                               method=method,
-                               timeout=self.timeout)
+                raise CloudflareAPIError("Failed to encode payload as JSON: {0}".format(e))
+
+        for attempt in range(CF_MAX_RETRIES + 1):
+            resp, info = fetch_url(self.module,
+                                   self.cf_api_endpoint + api_call,
+                                   headers=headers,
+                                   data=data,
+                                   method=method,
+                                   timeout=self.timeout)
+            if info['status'] != 429 or attempt == CF_MAX_RETRIES:
+                break
+            time.sleep(self._retry_delay(info, attempt))
 
         if info['status'] not in [200,304,400,401,403,429,405,415]:
-            self.module.fail_json(msg="Failed API call {0}; got unexpected HTTP code {1}".format(api_call,info['status']))
+            raise CloudflareAPIError("Failed API call {0}; got unexpected HTTP code {1}".format(api_call,info['status']))
 
         error_msg = ''
         if info['status'] == 401:
@@ -357,7 +429,7 @@ class CloudflareAPI(object):
 
         # received an error status but no data with details on what failed
         if  (info['status'] not in [200,304]) and (result is None):
-            self.module.fail_json(msg=error_msg)
+            raise CloudflareAPIError(error_msg)
 
         if not result['success']:
             error_msg += "; Error details: "
@@ -366,10 +438,45 @@ class CloudflareAPI(object):
                 if 'error_chain' in error:
                     for chain_error in error['error_chain']:
                         error_msg += "code: {0}, error: {1}; ".format(chain_error['code'],chain_error['message'])
-            self.module.fail_json(msg=error_msg)
+            raise CloudflareAPIError(error_msg)
 
         return result, info['status']
 
+    def _retry_delay(self,info,attempt):
+        # wait as long as the API asks to, or back off exponentially
+        try:
+            return max(1, int(info.get('retry-after')))
+        except (TypeError, ValueError):
+            return min(2 ** attempt, 60)
+
+    def _run_parallel(self,calls):
+        """Run the calls through a pool of threads, return their results in order"""
+        results = [None] * len(calls)
+        errors = []
+        pending = queue.Queue()
+        for i, call in enumerate(calls):
+            pending.put((i, call))
+
+        def worker():
+            while not errors:
+                try:
+                    i, call = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[i] = call()
+                except Exception, e:
+                    errors.append(e)
+
+        workers = [threading.Thread(target=worker) for i in range(max(1, min(self.threads, len(calls))))]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        if errors:
+            raise errors[0]
+        return results
+
     def _cf_api_call(self,api_call,method='GET',payload=None):
         result, status = self._cf_simple_api_call(api_call,method,payload)
 
@@ -378,19 +485,21 @@ class CloudflareAPI(object):
         if 'result_info' in result:
             pagination = result['result_info']
             if pagination['total_pages'] > 1:
-                next_page = int(pagination['page']) + 1
-                parameters = ['page={0}'.format(next_page)]
                 # strip "page" parameter from call parameters (if there are any)
+                parameters = []
                 if '?' in api_call:
                     raw_api_call,query = api_call.split('?',1)
-                    parameters += [param for param in query.split('&') if not param.startswith('page')]
+                    parameters += [param for param in query.split('&') if not param.startswith('page=')]
                 else:
                     raw_api_call = api_call
-                while next_page <= pagination['total_pages']:
-                    raw_api_call += '?' + '&'.join(parameters)
-                    result, status = self._cf_simple_api_call(raw_api_call,method,payload)
+                # the number of pages is known from the first one, fetch
+                # the others concurrently
+                calls = []
+                for page in range(int(pagination['page']) + 1, pagination['total_pages'] + 1):
+                    page_call = raw_api_call + '?' + '&'.join(parameters + ['page={0}'.format(page)])
+                    calls.append(lambda page_call=page_call: self._cf_simple_api_call(page_call,method,payload))
+                for result, status in self._run_parallel(calls):
                     data += result['result']
-                    next_page += 1
 
         return data, status
 
@@ -398,13 +507,17 @@ class CloudflareAPI(object):
         if not zone:
             zone = self.zone
 
+        if zone in self._zone_ids:
+            return self._zone_ids[zone]
+
         zones = self.get_zones(zone)
         if len(zones) > 1:
-            self.module.fail_json(msg="More than one zone matches {0}".format(zone))
+            raise CloudflareAPIError("More than one zone matches {0}".format(zone))
 
         if len(zones) < 1:
-            self.module.fail_json(msg="No zone found with name {0}".format(zone))
+            raise CloudflareAPIError("No zone found with name {0}".format(zone))
 
+        self._zone_ids[zone] = zones[0]['id']
         return zones[0]['id']
 
     def get_zones(self,name=None):
@@ -476,14 +589,8 @@ class CloudflareAPI(object):
                     result, info = self._cf_api_call('/zones/{0}/dns_records/{1}'.format(rr['zone_id'],rr['id']),'DELETE')
         return self.changed
 
-    def ensure_dns_record(self,**kwargs):
-        params = {}
-        for param in ['port','priority','proto','service','ttl','type','record','value','weight','zone']:
-          if param in kwargs:
-              params[param] = kwargs[param]
-          else:
-              params[param] = getattr(self,param)
-
+    def _build_record(self,params):
+        """Return the record to send for params, and the name and content it is found by"""
         search_value = params['value']
         search_record = params['record']
         new_record = None
@@ -537,6 +644,31 @@ class CloudflareAPI(object):
             search_value = str(params['weight']) + '\t' + str(params['port']) + '\t' + params['value']
             search_record = params['service'] + '.' + params['proto'] + '.' + params['record']
 
+        return new_record, search_record, search_value
+
+    def _record_needs_update(self,cur_record,new_record,params):
+        do_update = False
+        if (params['ttl'] is not None) and (cur_record['ttl'] != params['ttl'] ):
+            do_update = True
+        if (params['priority'] is not None) and ('priority' in cur_record) and (cur_record['priority'] != params['priority']):
+            do_update = True
+        if ('data' in new_record) and ('data' in cur_record):
+            if (cur_record['data'] > new_record['data']) - (cur_record['data'] < new_record['data']):
+                do_update = True
+        if (params['type'] == 'CNAME') and (cur_record['content'] != new_record['content']):
+            do_update = True
+        return do_update
+
+    def ensure_dns_record(self,**kwargs):
+        params = {}
+        for param in ['port','priority','proto','service','ttl','type','record','value','weight','zone']:
+          if param in kwargs:
+              params[param] = kwargs[param]
+          else:
+              params[param] = getattr(self,param)
+
+        new_record, search_record, search_value = self._build_record(params)
+
         zone_id = self._get_zone_id(params['zone'])
         records = self.get_dns_records(params['zone'],params['type'],search_record,search_value)
         # in theory this should be impossible as cloudflare does not allow
@@ -546,28 +678,132 @@ class CloudflareAPI(object):
         # record already exists, check if it must be updated
         if len(records) == 1:
             cur_record = records[0]
-            do_update = False
-            if (params['ttl'] is not None) and (cur_record['ttl'] != params['ttl'] ):
-                do_update = True
-            if (params['priority'] is not None) and ('priority' in cur_record) and (cur_record['priority'] != params['priority']):
-                do_update = True
-            if ('data' in new_record) and ('data' in cur_record):
-                if (cur_record['data'] > new_record['data']) - (cur_record['data'] < new_record['data']):
-                    do_update = True
-            if (type == 'CNAME') and (cur_record['content'] != new_record['content']):
-                do_update = True
-            if do_update:
+            if self._record_needs_update(cur_record,new_record,params):
+                result = new_record
                 if not self.module.check_mode:
                     result, info = self._cf_api_call('/zones/{0}/dns_records/{1}'.format(zone_id,records[0]['id']),'PUT',new_record)
                 self.changed = True
                 return result,self.changed
             else:
                 return records,self.changed
+        result = new_record
         if not self.module.check_mode:
             result, info = self._cf_api_call('/zones/{0}/dns_records'.format(zone_id),'POST',new_record)
         self.changed = True
         return result,self.changed
 
+    def _record_params(self,item):
+        """Fill a records item from the module options and normalize it like the module options are"""
+        params = {}
+        for param in ['port','priority','proto','service','ttl','weight']:
+            params[param] = item.get(param, getattr(self,param))
+        params['type'] = item.get('type')
+        params['record'] = item.get('record', item.get('name', '@'))
+        params['value'] = item.get('value', item.get('content'))
+        params['state'] = item.get('state', 'present')
+        params['zone'] = self.zone
+
+        if params['type'] not in RECORD_TYPES:
+            self.module.fail_json(msg="Record type must be one of {0}, got: {1}".format(', '.join(RECORD_TYPES),params['type']))
+        if params['state'] not in ['present', 'absent']:
+            self.module.fail_json(msg="Record state must be present or absent, got: {0}".format(params['state']))
+        for param in ['port','priority','ttl','weight']:
+            if params[param] is not None:
+                try:
+                    params[param] = int(params[param])
+                except ValueError:
+                    self.module.fail_json(msg="Record {0} must be an integer, got: {1}".format(param,params[param]))
+
+        if params['record'] == '@':
+            params['record'] = self.zone
+        if (params['type'] in ['CNAME','NS','MX','SRV']) and (params['value'] is not None):
+            params['value'] = params['value'].rstrip('.')
+        if params['type'] == 'SRV':
+            if (params['proto'] is not None) and (not params['proto'].startswith('_')):
+                params['proto'] = '_' + params['proto']
+            if (params['service'] is not None) and (not params['service'].startswith('_')):
+                params['service'] = '_' + params['service']
+        if not params['record'].endswith(self.zone):
+            params['record'] = params['record'] + '.' + self.zone
+        return params
+
+    def _record_key(self,type,name,content):
+        # there can only be one CNAME per name, its content is what may be updated
+        if type == 'CNAME':
+            content = None
+        return (type, name.lower(), content)
+
+    def sync_dns_records(self,items,purge=False):
+        """
+        Make the records of the zone match items: the zone is listed once,
+        indexed by (type, name, content), and the differences are applied
+        concurrently.
+        """
+        zone_id = self._get_zone_id()
+        current = {}
+        for rr in self._cf_api_call('/zones/{0}/dns_records?per_page=100'.format(zone_id))[0]:
+            current[self._record_key(rr['type'],rr['name'],rr['content'])] = rr
+
+        creates = []
+        updates = []
+        deletes = []
+        deleted_ids = set()
+        wanted = set()
+        for item in items:
+            params = self._record_params(item)
+            if params['state'] == 'absent':
+                # only the name and content are needed to find the record
+                params['priority'] = params['priority'] or 1
+                params['weight'] = params['weight'] or 1
+            new_record, search_record, search_value = self._build_record(params)
+            key = self._record_key(params['type'],search_record,search_value)
+            cur_record = current.get(key)
+            if params['state'] == 'absent':
+                if cur_record is not None and cur_record['id'] not in deleted_ids:
+                    deletes.append(cur_record)
+                    deleted_ids.add(cur_record['id'])
+                continue
+            wanted.add(key)
+            if cur_record is None:
+                creates.append(new_record)
+            elif self._record_needs_update(cur_record,new_record,params):
+                updates.append((cur_record,new_record))
+
+        if purge:
+            for key, rr in sorted(current.items()):
+                if key not in wanted and rr['type'] in RECORD_TYPES and rr['id'] not in deleted_ids:
+                    deletes.append(rr)
+                    deleted_ids.add(rr['id'])
+
+        if creates or updates or deletes:
+            self.changed = True
+
+        result = {
+            'created': creates,
+            'updated': [new_record for cur_record, new_record in updates],
+            'deleted': deletes,
+        }
+        if self.module.check_mode:
+            return result, self.changed
+
+        # deletes go first so that a record may take the place of another
+        # one of a conflicting type, eg. a CNAME replacing A records
+        self._run_parallel([
+            lambda rr=rr: self._cf_api_call('/zones/{0}/dns_records/{1}'.format(zone_id,rr['id']),'DELETE')
+            for rr in deletes
+        ])
+        updated = self._run_parallel([
+            lambda cur_record=cur_record, new_record=new_record: self._cf_api_call('/zones/{0}/dns_records/{1}'.format(zone_id,cur_record['id']),'PUT',new_record)[0]
+            for cur_record, new_record in updates
+        ])
+        created = self._run_parallel([
+            lambda new_record=new_record: self._cf_api_call('/zones/{0}/dns_records'.format(zone_id),'POST',new_record)[0]
+            for new_record in creates
+        ])
+        result['created'] = created
+        result['updated'] = updated
+        return result, self.changed
+
 def main():
     module = AnsibleModule(
         argument_spec = dict(
@@ -576,10 +812,13 @@ def main():
             port              = dict(required=False, default=None, type='int'),
             priority          = dict(required=False, default=1, type='int'),
             proto             = dict(required=False, default=None, choices=[ 'tcp', 'udp' ], type='str'),
+            purge             = dict(required=False, default=False, type='bool'),
             record            = dict(required=False, default='@', aliases=['name'], type='str'),
+            records           = dict(required=False, default=None, type='list'),
             service           = dict(required=False, default=None, type='str'),
             solo              = dict(required=False, default=None, type='bool'),
             state             = dict(required=False, default='present', choices=['present', 'absent'], type='str'),
+            threads           = dict(required=False, default=4, type='int'),
             timeout           = dict(required=False, default=30, type='int'),
             ttl               = dict(required=False, default=1, type='int'),
             type              = dict(required=False, default=None, choices=[ 'A', 'AAAA', 'CNAME', 'TXT', 'SRV', 'MX', 'NS', 'SPF' ], type='str'),
@@ -589,7 +828,6 @@ def main():
         ),
         supports_check_mode = True,
         required_if = ([
-                ('state','present',['record','type']),
                 ('type','MX',['priority','value']),
                 ('type','SRV',['port','priority','proto','service','value','weight']),
                 ('type','A',['value']),
@@ -601,7 +839,10 @@ def main():
             ]
        ),
        required_one_of = (
-            [['record','value','type']]
+            [['record','value','type','records']]
+        ),
+       mutually_exclusive = (
+            [['records','type'],['records','value'],['records','solo']]
         )
     )
 
@@ -611,22 +852,31 @@ def main():
     # sanity checks
     if cf_api.is_solo and cf_api.state == 'absent':
         module.fail_json(msg="solo=true can only be used with state=present")
+    if module.params['records'] is None and cf_api.state == 'present' and cf_api.type is None:
+        module.fail_json(msg="state is present but the following are missing: type")
 
-    # perform add, delete or update (only the TTL can be updated) of one or
-    # more records
-    if cf_api.state == 'present':
-        # delete all records matching record name + type
-        if cf_api.is_solo:
-            changed = cf_api.delete_dns_records(solo=cf_api.is_solo)
-        result,changed = cf_api.ensure_dns_record()
-        if isinstance(result,list):
-            module.exit_json(changed=changed,result={'record': result[0]})
+    try:
+        if module.params['records'] is not None:
+            result,changed = cf_api.sync_dns_records(module.params['records'],module.params['purge'])
+            module.exit_json(changed=changed,result={'records': result})
+
+        # perform add, delete or update (only the TTL can be updated) of one or
+        # more records
+        if cf_api.state == 'present':
+            # delete all records matching record name + type
+            if cf_api.is_solo:
+                changed = cf_api.delete_dns_records(solo=cf_api.is_solo)
+            result,changed = cf_api.ensure_dns_record()
+            if isinstance(result,list):
+                module.exit_json(changed=changed,result={'record': result[0]})
+            else:
+                module.exit_json(changed=changed,result={'record': result})
         else:
-            module.exit_json(changed=changed,result={'record': result})
-    else:
-        # force solo to False, just to be sure
-        changed = cf_api.delete_dns_records(solo=False)
-        module.exit_json(changed=changed)
+            # force solo to False, just to be sure
+            changed = cf_api.delete_dns_records(solo=False)
+            module.exit_json(changed=changed)
+    except CloudflareAPIError, e:
+        module.fail_json(msg=str(e))
 
 # import module snippets
 from ansible.module_utils.basic import *
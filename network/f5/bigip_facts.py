@@ -91,6 +91,67 @@ options:
         default: null
         choices: []
         aliases: []
+    threads:
+        description:
+            - Number of iControl sessions used to collect facts concurrently.
+              With more than one, the fact categories and the attributes
+              within each category are fetched in parallel, each session
+              being used by a single thread.
+        required: false
+        default: 1
+        choices: []
+        aliases: []
+        version_added: "2.2"
+    cache_dir:
+        description:
+            - Directory where the collected facts are kept, one file per
+              device, category and filter. Categories cached less than
+              I(cache_ttl) seconds ago are read from there instead of
+              being collected from the device again.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "2.2"
+    cache_ttl:
+        description:
+            - Number of seconds the facts kept in I(cache_dir) are reused.
+        required: false
+        default: 300
+        choices: []
+        aliases: []
+        version_added: "2.2"
+    partition:
+        description:
+            - Only collect the objects of this partition or folder, such as
+              C(Common) or C(Common/app1), and the folders below it. The
+              scoping is done by the device, which only lists those objects.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "2.2"
+    attributes:
+        description:
+            - List of attributes to collect for each object, such as
+              C(destination) or C(member). Others are neither fetched nor
+              returned, but the objects are still listed by name.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "2.2"
+    dest:
+        description:
+            - Write the facts to this local file as newline-delimited JSON,
+              one object per line with its C(category), C(name) and
+              C(facts), instead of returning them as ansible_facts. Only
+              one category is held in memory at a time.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "2.2"
 '''
 
 EXAMPLES = '''
@@ -110,6 +171,28 @@ EXAMPLES = '''
       password=mysecret
       include=interface,vlan
 
+  - name: Collect all BIG-IP facts over 8 sessions, reusing them for 10 minutes
+    local_action: >
+      bigip_facts
+      server=lb.mydomain.com
+      user=admin
+      password=mysecret
+      include=pool,virtual_server,node,virtual_address
+      threads=8
+      cache_dir=/var/tmp/bigip_facts
+      cache_ttl=600
+
+  - name: Dump the destination and pool of every virtual server of a partition
+    local_action: >
+      bigip_facts
+      server=lb.mydomain.com
+      user=admin
+      password=mysecret
+      include=virtual_server
+      partition=Tenant1
+      attributes=destination,default_pool_name
+      dest=/var/tmp/tenant1-virtual-servers.json
+
 '''
 
 try:
@@ -120,10 +203,26 @@ except ImportError:
 else:
     bigsuds_found = True
 
+import copy
 import fnmatch
+import hashlib
+import os
+import sys
+import threading
+import time
 import traceback
 import re
 
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
 # ===========================================
 # bigip_facts module specific support methods.
 #
@@ -167,6 +266,110 @@ class F5(object):
         return self.api.System.Session.get_active_folder()
 
 
+class F5Pool(object):
+    """F5 iControl session pool class.
+
+    Runs tasks over a fixed set of worker threads, each owning its own
+    iControl session since the underlying suds clients cannot be shared
+    between threads. A task uses the session of the worker running it,
+    as returned by get_api().
+
+    Attributes:
+        size: Number of worker threads and sessions.
+    """
+
+    def __init__(self, size, host, user, password, validate_certs=True, folder="/"):
+        self.size = size
+        self.folder = folder
+        self.connect_args = (host, user, password, True, validate_certs)
+        self.tasks = queue.Queue()
+        self.local = threading.local()
+        for i in range(size):
+            worker = threading.Thread(target=self._work)
+            worker.setDaemon(True)
+            worker.start()
+
+    def _session(self):
+        if getattr(self.local, 'f5', None) is None:
+            # Folder and recursive query state are per session, so they
+            # need no restoring afterwards
+            f5 = F5(*self.connect_args)
+            f5.set_active_folder(self.folder)
+            f5.enable_recursive_query_state()
+            self.local.f5 = f5
+        return self.local.f5
+
+    def get_api(self):
+        return self._session().get_api()
+
+    def _work(self):
+        self.local.is_worker = True
+        while True:
+            self._run(self.tasks.get())
+
+    def _run(self, task):
+        batch, i, fn = task
+        try:
+            batch.done(i, fn(), None)
+        except Exception:
+            batch.done(i, None, sys.exc_info())
+
+    def map(self, fns):
+        """Run the callables fns on the pool and return their results in order"""
+        batch = _Batch(len(fns))
+        for i, fn in enumerate(fns):
+            self.tasks.put((batch, i, fn))
+        if getattr(self.local, 'is_worker', False):
+            # Called from a task; help with the queue rather than hold a
+            # worker idle, which could otherwise starve the pool
+            while not batch.finished():
+                try:
+                    self._run(self.tasks.get_nowait())
+                except queue.Empty:
+                    batch.wait(0.1)
+        else:
+            while not batch.finished():
+                batch.wait(0.1)
+        return batch.get_results()
+
+
+class _Batch(object):
+    """Results of a set of tasks submitted together to an F5Pool."""
+
+    def __init__(self, count):
+        self.results = [None] * count
+        self.error = None
+        self.pending = count
+        self.cond = threading.Condition()
+
+    def done(self, i, result, error):
+        self.cond.acquire()
+        try:
+            self.results[i] = result
+            if error and self.error is None:
+                self.error = error
+            self.pending -= 1
+            self.cond.notify_all()
+        finally:
+            self.cond.release()
+
+    def finished(self):
+        return self.pending == 0
+
+    def wait(self, timeout):
+        self.cond.acquire()
+        try:
+            if self.pending:
+                self.cond.wait(timeout)
+        finally:
+            self.cond.release()
+
+    def get_results(self):
+        if self.error:
+            raise self.error[1]
+        return self.results
+
+
 class Interfaces(object):
     """Interfaces class.
 
@@ -1365,17 +1568,36 @@ class SystemInfo(object):
         return self.api.System.SystemInfo.get_uptime()
 
 
-def generate_dict(api_obj, fields):
+class _Unsupported(object):
+    """Marker for attributes the device does not know about."""
+    pass
+
+def fetch_field(api_obj, field, f5=None):
+    if isinstance(f5, F5Pool):
+        # Query through the session of the thread running this task
+        api_obj = copy.copy(api_obj)
+        api_obj.api = f5.get_api()
+    try:
+        return getattr(api_obj, "get_" + field)()
+    except (MethodNotFound, WebFault):
+        return _Unsupported
+
+def fetch_fields(api_obj, fields, f5=None):
+    """Return the responses of the get_<field> methods of api_obj, fetched
+    concurrently when f5 is a session pool"""
+    if isinstance(f5, F5Pool):
+        return f5.map([lambda field=field: fetch_field(api_obj, field, f5) for field in fields])
+    return [fetch_field(api_obj, field) for field in fields]
+
+def generate_dict(api_obj, fields, f5=None, attributes=None):
+    if attributes:
+        fields = [field for field in fields if field in attributes]
     result_dict = {}
     lists = []
     supported_fields = []
     if api_obj.get_list():
-        for field in fields:
-            try:
-                api_response = getattr(api_obj, "get_" + field)()
-            except (MethodNotFound, WebFault):
-                pass
-            else:
+        for field, api_response in zip(fields, fetch_fields(api_obj, fields, f5)):
+            if api_response is not _Unsupported:
                 lists.append(api_response)
                 supported_fields.append(field)
         for i, j in enumerate(api_obj.get_list()):
@@ -1384,18 +1606,16 @@ def generate_dict(api_obj, fields):
             result_dict[j] = temp
     return result_dict
 
-def generate_simple_dict(api_obj, fields):
+def generate_simple_dict(api_obj, fields, f5=None, attributes=None):
+    if attributes:
+        fields = [field for field in fields if field in attributes]
     result_dict = {}
-    for field in fields:
-        try:
-            api_response = getattr(api_obj, "get_" + field)()
-        except (MethodNotFound, WebFault):
-            pass
-        else:
+    for field, api_response in zip(fields, fetch_fields(api_obj, fields, f5)):
+        if api_response is not _Unsupported:
             result_dict[field] = api_response
     return result_dict
 
-def generate_interface_dict(f5, regex):
+def generate_interface_dict(f5, regex, attributes=None):
     interfaces = Interfaces(f5.get_api(), regex)
     fields = ['active_media', 'actual_flow_control', 'bundle_state',
               'description', 'dual_media_state', 'enabled_state', 'if_index',
@@ -1407,26 +1627,26 @@ def generate_interface_dict(f5, regex):
               'sfp_media_state', 'stp_active_edge_port_state',
               'stp_enabled_state', 'stp_link_type',
               'stp_protocol_detection_reset_state']
-    return generate_dict(interfaces, fields)
+    return generate_dict(interfaces, fields, f5, attributes)
 
-def generate_self_ip_dict(f5, regex):
+def generate_self_ip_dict(f5, regex, attributes=None):
     self_ips = SelfIPs(f5.get_api(), regex)
     fields = ['address', 'allow_access_list', 'description',
               'enforced_firewall_policy', 'floating_state', 'fw_rule',
               'netmask', 'staged_firewall_policy', 'traffic_group',
               'vlan', 'is_traffic_group_inherited']
-    return generate_dict(self_ips, fields)
+    return generate_dict(self_ips, fields, f5, attributes)
 
-def generate_trunk_dict(f5, regex):
+def generate_trunk_dict(f5, regex, attributes=None):
     trunks = Trunks(f5.get_api(), regex)
     fields = ['active_lacp_state', 'configured_member_count', 'description',
               'distribution_hash_option', 'interface', 'lacp_enabled_state',
               'lacp_timeout_option', 'link_selection_policy', 'media_speed',
               'media_status', 'operational_member_count', 'stp_enabled_state',
               'stp_protocol_detection_reset_state']
-    return generate_dict(trunks, fields)
+    return generate_dict(trunks, fields, f5, attributes)
 
-def generate_vlan_dict(f5, regex):
+def generate_vlan_dict(f5, regex, attributes=None):
     vlans = Vlans(f5.get_api(), regex)
     fields = ['auto_lasthop', 'cmp_hash_algorithm', 'description',
               'dynamic_forwarding', 'failsafe_action', 'failsafe_state',
@@ -1435,9 +1655,9 @@ def generate_vlan_dict(f5, regex):
               'sflow_poll_interval', 'sflow_poll_interval_global',
               'sflow_sampling_rate', 'sflow_sampling_rate_global',
               'source_check_state', 'true_mac_address', 'vlan_id']
-    return generate_dict(vlans, fields)
+    return generate_dict(vlans, fields, f5, attributes)
 
-def generate_vs_dict(f5, regex):
+def generate_vs_dict(f5, regex, attributes=None):
     virtual_servers = VirtualServers(f5.get_api(), regex)
     fields = ['actual_hardware_acceleration', 'authentication_profile',
               'auto_lasthop', 'bw_controller_policy', 'clone_pool',
@@ -1455,9 +1675,9 @@ def generate_vs_dict(f5, regex):
               'source_address_translation_type', 'source_port_behavior',
               'staged_firewall_policy', 'translate_address_state',
               'translate_port_state', 'type', 'vlan', 'wildmask']
-    return generate_dict(virtual_servers, fields)
+    return generate_dict(virtual_servers, fields, f5, attributes)
 
-def generate_pool_dict(f5, regex):
+def generate_pool_dict(f5, regex, attributes=None):
     pools = Pools(f5.get_api(), regex)
     fields = ['action_on_service_down', 'active_member_count',
               'aggregate_dynamic_ratio', 'allow_nat_state',
@@ -1471,9 +1691,9 @@ def generate_pool_dict(f5, regex):
               'queue_on_connection_limit_state', 'queue_time_limit',
               'reselect_tries', 'server_ip_tos', 'server_link_qos',
               'simple_timeout', 'slow_ramp_time']
-    return generate_dict(pools, fields)
+    return generate_dict(pools, fields, f5, attributes)
 
-def generate_device_dict(f5, regex):
+def generate_device_dict(f5, regex, attributes=None):
     devices = Devices(f5.get_api(), regex)
     fields = ['active_modules', 'base_mac_address', 'blade_addresses',
               'build', 'chassis_id', 'chassis_type', 'comment',
@@ -1483,49 +1703,49 @@ def generate_device_dict(f5, regex):
               'optional_modules', 'platform_id', 'primary_mirror_address',
               'product', 'secondary_mirror_address', 'software_version',
               'timelimited_modules', 'timezone', 'unicast_addresses']
-    return generate_dict(devices, fields)
+    return generate_dict(devices, fields, f5, attributes)
 
-def generate_device_group_dict(f5, regex):
+def generate_device_group_dict(f5, regex, attributes=None):
     device_groups = DeviceGroups(f5.get_api(), regex)
     fields = ['all_preferred_active', 'autosync_enabled_state','description',
               'device', 'full_load_on_sync_state',
               'incremental_config_sync_size_maximum',
               'network_failover_enabled_state', 'sync_status', 'type']
-    return generate_dict(device_groups, fields)
+    return generate_dict(device_groups, fields, f5, attributes)
 
-def generate_traffic_group_dict(f5, regex):
+def generate_traffic_group_dict(f5, regex, attributes=None):
     traffic_groups = TrafficGroups(f5.get_api(), regex)
     fields = ['auto_failback_enabled_state', 'auto_failback_time',
               'default_device', 'description', 'ha_load_factor',
               'ha_order', 'is_floating', 'mac_masquerade_address',
               'unit_id']
-    return generate_dict(traffic_groups, fields)
+    return generate_dict(traffic_groups, fields, f5, attributes)
 
-def generate_rule_dict(f5, regex):
+def generate_rule_dict(f5, regex, attributes=None):
     rules = Rules(f5.get_api(), regex)
     fields = ['definition', 'description', 'ignore_vertification',
               'verification_status']
-    return generate_dict(rules, fields)
+    return generate_dict(rules, fields, f5, attributes)
 
-def generate_node_dict(f5, regex):
+def generate_node_dict(f5, regex, attributes=None):
     nodes = Nodes(f5.get_api(), regex)
     fields = ['address', 'connection_limit', 'description', 'dynamic_ratio',
               'monitor_instance', 'monitor_rule', 'monitor_status',
               'object_status', 'rate_limit', 'ratio', 'session_status']
-    return generate_dict(nodes, fields)
+    return generate_dict(nodes, fields, f5, attributes)
 
-def generate_virtual_address_dict(f5, regex):
+def generate_virtual_address_dict(f5, regex, attributes=None):
     virtual_addresses = VirtualAddresses(f5.get_api(), regex)
     fields = ['address', 'arp_state', 'auto_delete_state', 'connection_limit',
               'description', 'enabled_state', 'icmp_echo_state',
               'is_floating_state', 'netmask', 'object_status',
               'route_advertisement_state', 'traffic_group']
-    return generate_dict(virtual_addresses, fields)
+    return generate_dict(virtual_addresses, fields, f5, attributes)
 
-def generate_address_class_dict(f5, regex):
+def generate_address_class_dict(f5, regex, attributes=None):
     address_classes = AddressClasses(f5.get_api(), regex)
     fields = ['address_class', 'description']
-    return generate_dict(address_classes, fields)
+    return generate_dict(address_classes, fields, f5, attributes)
 
 def generate_certificate_dict(f5, regex):
     certificates = Certificates(f5.get_api(), regex)
@@ -1535,7 +1755,7 @@ def generate_key_dict(f5, regex):
     keys = Keys(f5.get_api(), regex)
     return dict(zip(keys.get_list(), keys.get_key_list()))
 
-def generate_client_ssl_profile_dict(f5, regex):
+def generate_client_ssl_profile_dict(f5, regex, attributes=None):
     profiles = ProfileClientSSL(f5.get_api(), regex)
     fields = ['alert_timeout', 'allow_nonssl_state', 'authenticate_depth',
               'authenticate_once_state', 'ca_file', 'cache_size',
@@ -1556,9 +1776,9 @@ def generate_client_ssl_profile_dict(f5, regex):
               'server_name', 'session_ticket_state', 'sni_default_state',
               'sni_require_state', 'ssl_option', 'strict_resume_state',
               'unclean_shutdown_state', 'is_base_profile', 'is_system_profile']
-    return generate_dict(profiles, fields)
+    return generate_dict(profiles, fields, f5, attributes)
 
-def generate_system_info_dict(f5):
+def generate_system_info_dict(f5, attributes=None):
     system_info = SystemInfo(f5.get_api())
     fields = ['base_mac_address',
               'blade_temperature', 'chassis_slot_information',
@@ -1568,7 +1788,7 @@ def generate_system_info_dict(f5):
               'product_information', 'pva_version', 'system_id',
               'system_information', 'time',
               'time_zone', 'uptime']
-    return generate_simple_dict(system_info, fields)
+    return generate_simple_dict(system_info, fields, f5, attributes)
 
 def generate_software_list(f5):
     software = Software(f5.get_api())
@@ -1576,6 +1796,56 @@ def generate_software_list(f5):
     return software_list
 
 
+def cached_facts_path(cache_dir, server, category, fact_filter):
+    key = hashlib.sha1(("%s|%s" % (server, fact_filter or '')).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, "%s-%s.json" % (key, category))
+
+def read_cached_facts(cache_dir, cache_ttl, server, category, fact_filter):
+    if not cache_dir:
+        return None
+    path = cached_facts_path(cache_dir, server, category, fact_filter)
+    try:
+        if time.time() - os.path.getmtime(path) > cache_ttl:
+            return None
+        f = open(path)
+        try:
+            return json.load(f)
+        finally:
+            f.close()
+    except (IOError, OSError, ValueError):
+        return None
+
+def write_cached_facts(cache_dir, server, category, fact_filter, data):
+    if not cache_dir:
+        return
+    try:
+        content = json.dumps(data)
+    except (TypeError, ValueError):
+        # not serializable, leave it uncached
+        return
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    path = cached_facts_path(cache_dir, server, category, fact_filter)
+    # facts may hold secrets such as key passphrases
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+    try:
+        os.write(fd, content.encode('utf-8'))
+    finally:
+        os.close(fd)
+    os.rename(tmp, path)
+
+
+def write_ndjson(output, category, data):
+    """Write the facts of a category as one JSON object per line, return the number of lines"""
+    if isinstance(data, dict) and category != 'system_info':
+        for name in sorted(data):
+            output.write(json.dumps(dict(category=category, name=name, facts=data[name])) + "\n")
+        return len(data)
+    output.write(json.dumps(dict(category=category, facts=data)) + "\n")
+    return 1
+
+
 def main():
     module = AnsibleModule(
         argument_spec = dict(
@@ -1586,6 +1856,12 @@ def main():
             session = dict(type='bool', default=False),
             include = dict(type='list', required=True),
             filter = dict(type='str', required=False),
+            threads = dict(type='int', default=1),
+            cache_dir = dict(type='path', required=False),
+            cache_ttl = dict(type='int', default=300),
+            partition = dict(type='str', required=False),
+            attributes = dict(type='list', required=False),
+            dest = dict(type='path', required=False),
         )
     )
 
@@ -1598,6 +1874,18 @@ def main():
     validate_certs = module.params['validate_certs']
     session = module.params['session']
     fact_filter = module.params['filter']
+    threads = module.params['threads']
+    cache_dir = module.params['cache_dir']
+    cache_ttl = module.params['cache_ttl']
+    attributes = module.params['attributes']
+    dest = module.params['dest']
+
+    if module.params['partition']:
+        folder = "/" + module.params['partition'].strip("/")
+    else:
+        folder = "/"
+    # Everything that changes the collected facts is part of the cache key
+    cache_scope = "%s@%s%s:%s" % (user, server, folder, ",".join(sorted(attributes or [])))
 
     if validate_certs:
         import ssl
@@ -1618,63 +1906,91 @@ def main():
     if not all(include_test):
         module.fail_json(msg="value of include must be one or more of: %s, got: %s" % (",".join(valid_includes), ",".join(include)))
 
+    collectors = {
+        'interface': lambda f5: generate_interface_dict(f5, regex, attributes),
+        'self_ip': lambda f5: generate_self_ip_dict(f5, regex, attributes),
+        'trunk': lambda f5: generate_trunk_dict(f5, regex, attributes),
+        'vlan': lambda f5: generate_vlan_dict(f5, regex, attributes),
+        'virtual_server': lambda f5: generate_vs_dict(f5, regex, attributes),
+        'pool': lambda f5: generate_pool_dict(f5, regex, attributes),
+        'device': lambda f5: generate_device_dict(f5, regex, attributes),
+        'device_group': lambda f5: generate_device_group_dict(f5, regex, attributes),
+        'traffic_group': lambda f5: generate_traffic_group_dict(f5, regex, attributes),
+        'rule': lambda f5: generate_rule_dict(f5, regex, attributes),
+        'node': lambda f5: generate_node_dict(f5, regex, attributes),
+        'virtual_address': lambda f5: generate_virtual_address_dict(f5, regex, attributes),
+        'address_class': lambda f5: generate_address_class_dict(f5, regex, attributes),
+        'software': lambda f5: generate_software_list(f5),
+        'certificate': lambda f5: generate_certificate_dict(f5, regex),
+        'key': lambda f5: generate_key_dict(f5, regex),
+        'client_ssl_profile': lambda f5: generate_client_ssl_profile_dict(f5, regex, attributes),
+        'system_info': lambda f5: generate_system_info_dict(f5, attributes),
+    }
+
     try:
         facts = {}
-
-        if len(include) > 0:
+        counts = {}
+        output = None
+        if dest:
+            output = open(dest, 'w')
+
+        def emit(category, data):
+            if output is None:
+                facts[category] = data
+            else:
+                counts[category] = write_ndjson(output, category, data)
+
+        pending = []
+        for category in valid_includes:
+            if category not in include:
+                continue
+            cached = read_cached_facts(cache_dir, cache_ttl, cache_scope, category, fact_filter)
+            if cached is not None:
+                emit(category, cached)
+            else:
+                pending.append(category)
+
+        if len(pending) > 0 and threads > 1:
+            pool = F5Pool(threads, server, user, password, validate_certs, folder)
+            if output is None:
+                results = pool.map([lambda category=category: collectors[category](pool) for category in pending])
+                for category, data in zip(pending, results):
+                    write_cached_facts(cache_dir, cache_scope, category, fact_filter, data)
+                    emit(category, data)
+            else:
+                # One category at a time, so that only one is held in memory
+                for category in pending:
+                    data = collectors[category](pool)
+                    write_cached_facts(cache_dir, cache_scope, category, fact_filter, data)
+                    emit(category, data)
+                    del data
+        elif len(pending) > 0:
             f5 = F5(server, user, password, session, validate_certs)
             saved_active_folder = f5.get_active_folder()
             saved_recursive_query_state = f5.get_recursive_query_state()
-            if saved_active_folder != "/":
-                f5.set_active_folder("/")
+            if saved_active_folder != folder:
+                f5.set_active_folder(folder)
             if saved_recursive_query_state != "STATE_ENABLED":
                 f5.enable_recursive_query_state()
 
-            if 'interface' in include:
-                facts['interface'] = generate_interface_dict(f5, regex)
-            if 'self_ip' in include:
-                facts['self_ip'] = generate_self_ip_dict(f5, regex)
-            if 'trunk' in include:
-                facts['trunk'] = generate_trunk_dict(f5, regex)
-            if 'vlan' in include:
-                facts['vlan'] = generate_vlan_dict(f5, regex)
-            if 'virtual_server' in include:
-                facts['virtual_server'] = generate_vs_dict(f5, regex)
-            if 'pool' in include:
-                facts['pool'] = generate_pool_dict(f5, regex)
-            if 'device' in include:
-                facts['device'] = generate_device_dict(f5, regex)
-            if 'device_group' in include:
-                facts['device_group'] = generate_device_group_dict(f5, regex)
-            if 'traffic_group' in include:
-                facts['traffic_group'] = generate_traffic_group_dict(f5, regex)
-            if 'rule' in include:
-                facts['rule'] = generate_rule_dict(f5, regex)
-            if 'node' in include:
-                facts['node'] = generate_node_dict(f5, regex)
-            if 'virtual_address' in include:
-                facts['virtual_address'] = generate_virtual_address_dict(f5, regex)
-            if 'address_class' in include:
-                facts['address_class'] = generate_address_class_dict(f5, regex)
-            if 'software' in include:
-                facts['software'] = generate_software_list(f5)
-            if 'certificate' in include:
-                facts['certificate'] = generate_certificate_dict(f5, regex)
-            if 'key' in include:
-                facts['key'] = generate_key_dict(f5, regex)
-            if 'client_ssl_profile' in include:
-                facts['client_ssl_profile'] = generate_client_ssl_profile_dict(f5, regex)
-            if 'system_info' in include:
-                facts['system_info'] = generate_system_info_dict(f5)
+            for category in pending:
+                data = collectors[category](f5)
+                write_cached_facts(cache_dir, cache_scope, category, fact_filter, data)
+                emit(category, data)
+                del data
 
             # restore saved state
-            if saved_active_folder and saved_active_folder != "/":
+            if saved_active_folder and saved_active_folder != folder:
                 f5.set_active_folder(saved_active_folder)
             if saved_recursive_query_state and \
                saved_recursive_query_state != "STATE_ENABLED":
                 f5.set_recursive_query_state(saved_recursive_query_state)
 
-        result = {'ansible_facts': facts}
+        if output is None:
+            result = {'ansible_facts': facts}
+        else:
+            output.close()
+            result = {'ansible_facts': {}, 'dest': dest, 'counts': counts}
 
     except Exception, e:
         module.fail_json(msg="received exception: %s\ntraceback: %s" % (e, traceback.format_exc()))
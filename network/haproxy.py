@@ -31,6 +31,7 @@ notes:
       sockets configured for level 'admin'. For example, you can add the line
       'stats socket /var/run/haproxy.sock level admin' to the general section of
       haproxy.cfg. See http://haproxy.1wt.eu/download/1.5/doc/configuration.txt.
+    - C(state=drain) requires HAProxy 1.6 or later.
 options:
   backend:
     description:
@@ -39,7 +40,10 @@ options:
     default: auto-detected
   host:
     description:
-      - Name of the backend host to change.
+      - Name of the backend host to change, or a list of them. An entry may
+        be given as C(backend/host) to change the host in that backend only,
+        so that hosts of several backends can be changed in one task.
+      - All the commands are sent over a single connection to the socket.
     required: true
     default: null
   shutdown_sessions:
@@ -54,16 +58,29 @@ options:
       - Path to the HAProxy socket file.
     required: false
     default: /var/run/haproxy.sock
+  sockets:
+    description:
+      - List of HAProxy socket files, for HAProxy running several processes
+        (nbproc) or instances on the host, each having its own socket. The
+        hosts are changed through every one of them, and waited for in a
+        single polling loop.
+      - Overrides I(socket).
+    required: false
+    default: null
+    version_added: "2.2"
   state:
     description:
       - Desired state of the provided backend host.
     required: true
     default: null
-    choices: [ "enabled", "disabled" ]
+    choices: [ "enabled", "disabled", "drain" ]
   wait:
     description:
-      - Wait until the server reports a status of 'UP' when `state=enabled`, or
-        status of 'MAINT' when `state=disabled`.
+      - Wait until the server reports a status of 'UP' when `state=enabled`,
+        status of 'MAINT' when `state=disabled`, or status of 'DRAIN' when
+        `state=drain`.
+      - The status is polled with 'show servers state' when HAProxy supports
+        it (1.6 and later), and with 'show stat' otherwise.
     required: false
     default: false
     version_added: "2.0"
@@ -79,6 +96,13 @@ options:
     required: false
     default: 25
     version_added: "2.0"
+  wait_timeout:
+    description:
+      - Number of seconds to wait for all the servers to reach their status,
+        in place of I(wait_retries) times I(wait_interval).
+    required: false
+    default: null
+    version_added: "2.2"
   weight:
     description:
       - The value passed in argument. If the value ends with the `%` sign, then
@@ -117,9 +141,41 @@ EXAMPLES = '''
 # enable server in 'www' backend pool with change server(s) weight
 - haproxy: state=enabled host={{ inventory_hostname }} socket=/var/run/haproxy.sock weight=10 backend=www
 
+# drain several servers of the 'www' and 'api' backend pools in one go
+- haproxy:
+    state: drain
+    host:
+      - www/web1
+      - www/web2
+      - api/web1
+    wait: yes
+
+# drain a list of servers on every process of a nbproc HAProxy, waiting at
+# most 10 minutes for all of them
+- haproxy:
+    state: drain
+    backend: www
+    host: "{{ groups['web'] }}"
+    sockets:
+      - /var/run/haproxy-1.sock
+      - /var/run/haproxy-2.sock
+    wait: yes
+    wait_interval: 2
+    wait_timeout: 600
+
 author: "Ravi Bhure (@ravibhure)"
 '''
 
+RETURN = '''
+servers:
+    description: The servers changed, with the time they took to reach their
+                 status when I(wait) is set.
+    returned: success
+    type: list
+    sample: [{"socket": "/var/run/haproxy.sock", "backend": "www",
+              "host": "web1", "status": "DRAIN", "wait_time": 2.01}]
+'''
+
 import socket
 import csv
 import time
@@ -127,14 +183,86 @@ import time
 
 DEFAULT_SOCKET_LOCATION="/var/run/haproxy.sock"
 RECV_SIZE = 1024
-ACTION_CHOICES = ['enabled', 'disabled']
+ACTION_CHOICES = ['enabled', 'disabled', 'drain']
 WAIT_RETRIES=25
 WAIT_INTERVAL=5
+PROMPT = '\n> '
+
+# Status each state is reported with once it has been applied
+WANTED_STATUS = {
+    'enabled': 'UP',
+    'disabled': 'MAINT',
+    'drain': 'DRAIN',
+}
+
+# srv_op_state and srv_admin_state as reported by 'show servers state'
+SRV_RUNNING = 2
+SRV_ADMF_MAINT = 0x01 | 0x02 | 0x04 | 0x20
+SRV_ADMF_DRAIN = 0x08 | 0x10
 
 ######################################################################
 class TimeoutException(Exception):
   pass
 
+class HAProxySocket(object):
+    """
+    A connection to HAProxy's local UNIX socket kept in interactive mode,
+    where HAProxy answers each command followed by a prompt instead of
+    closing the connection, so that any number of commands can be sent
+    over it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.client = None
+
+    def connect(self):
+        self.client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.client.connect(self.path)
+        self.client.sendall('prompt\n')
+        self.read()
+
+    def read(self):
+        """
+        Reads the response to the last command, up to the prompt.
+        """
+        result = ''
+        while not result.endswith(PROMPT):
+            buf = self.client.recv(RECV_SIZE)
+            if not buf:
+                # The connection was closed by HAProxy, a new one will be
+                # opened for the next command.
+                self.close()
+                return result
+            result += buf
+        return result[:-len(PROMPT)]
+
+    def execute(self, cmd):
+        """
+        Runs cmd and returns its output. In interactive mode HAProxy answers
+        each of the ';' separated commands of a line with its own prompt, so
+        they are sent one at a time and their outputs joined.
+        """
+        result = ''
+        for part in cmd.split(';'):
+            part = part.strip()
+            if not part:
+                continue
+            if self.client is None:
+                self.connect()
+            self.client.sendall('%s\n' % part)
+            result += self.read()
+        return result
+
+    def close(self):
+        if self.client is not None:
+            try:
+                self.client.sendall('quit\n')
+            except socket.error:
+                pass
+            self.client.close()
+            self.client = None
+
 class HAProxy(object):
     """
     Used for communicating with HAProxy through its local UNIX socket interface.
@@ -155,188 +283,231 @@ class HAProxy(object):
         self.backend = self.module.params['backend']
         self.weight = self.module.params['weight']
         self.socket = self.module.params['socket']
+        self.sockets = self.module.params['sockets'] or [self.socket]
         self.shutdown_sessions = self.module.params['shutdown_sessions']
         self.wait = self.module.params['wait']
         self.wait_retries = self.module.params['wait_retries']
         self.wait_interval = self.module.params['wait_interval']
+        self.wait_timeout = self.module.params['wait_timeout']
+        if self.wait_timeout is None:
+            self.wait_timeout = self.wait_retries * self.wait_interval
         self.command_results = []
-        self.status_servers = []
-        self.status_weights = []
-        self.previous_weights = []
-        self.previous_states  = []
-        self.current_states   = []
-        self.current_weights  = []
-
-    def execute(self, cmd, timeout=200, capture_output=True):
+        self.clients = [HAProxySocket(path) for path in self.sockets]
+        # Whether 'show servers state' is available on each socket, unset
+        # until known
+        self.servers_state = {}
+
+    def execute(self, cmd, timeout=200, capture_output=True, client=None):
         """
-        Executes a HAProxy command by sending a message to a HAProxy's local
-        UNIX socket and waiting up to 'timeout' milliseconds for the response.
+        Executes a HAProxy command over the socket connection and returns
+        its response.
         """
-
-        self.client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        self.client.connect(self.socket)
-        self.client.sendall('%s\n' % cmd)
-        result = ''
-        buf = ''
-        buf = self.client.recv(RECV_SIZE)
-        while buf:
-            result += buf
-            buf = self.client.recv(RECV_SIZE)
+        if client is None:
+            client = self.clients[0]
+        try:
+            result = client.execute(cmd)
+        except socket.error, e:
+            self.module.fail_json(msg="unable to run '%s' on %s: %s" % (cmd, client.path, str(e)))
         if capture_output:
-            self.command_results = result.strip()
-        self.client.close()
+            self.command_results.append(result.strip())
         return result
 
-    def wait_until_status(self, pxname, svname, status):
+    def show_stat(self, client):
         """
-        Wait for a service to reach the specified status. Try RETRIES times
-        with INTERVAL seconds of sleep in between. If the service has not reached
-        the expected status in that time, the module will fail. If the service was 
-        not found, the module will fail.
+        Returns the rows of 'show stat' keyed by (pxname, svname).
         """
-        for i in range(1, self.wait_retries):
-            data = self.execute('show stat', 200, False).lstrip('# ')
-            r = csv.DictReader(data.splitlines())
-            found = False
-            for row in r:
-                if row['pxname'] == pxname and row['svname'] == svname:
-                    found = True
-                    if row['status'] == status:
-                        return True;
-                    else:
-                        time.sleep(self.wait_interval)
-
-            if not found:
-                self.module.fail_json(msg="unable to find server %s/%s" % (pxname, svname))
-
-        self.module.fail_json(msg="server %s/%s not status '%s' after %d retries. Aborting." % (pxname, svname, status, self.wait_retries))
-
-    def get_current_state(self, host, backend):
+        data = self.execute('show stat', 200, False, client).lstrip('# ')
+        stats = {}
+        for row in csv.DictReader(data.splitlines()):
+            stats[(row['pxname'], row['svname'])] = row
+        return stats
+
+    def show_servers_state(self, client):
+        """
+        Returns the status of every server from 'show servers state', keyed
+        by (pxname, svname), or None if this HAProxy does not support it.
+        Much less is sent than for 'show stat', which makes it the cheaper
+        command to poll.
+        """
+        lines = self.execute('show servers state', 200, False, client).strip().splitlines()
+        if not lines or not lines[0].strip().isdigit():
+            return None
+        states = {}
+        fields = None
+        for line in lines[1:]:
+            if line.startswith('#'):
+                fields = line.lstrip('# ').split()
+                continue
+            if fields is None or not line.strip():
+                continue
+            row = dict(zip(fields, line.split()))
+            admin_state = int(row['srv_admin_state'])
+            if admin_state & SRV_ADMF_MAINT:
+                status = 'MAINT'
+            elif admin_state & SRV_ADMF_DRAIN:
+                status = 'DRAIN'
+            elif int(row['srv_op_state']) == SRV_RUNNING:
+                status = 'UP'
+            else:
+                status = 'DOWN'
+            states[(row['be_name'], row['srv_name'])] = status
+        return states
+
+    def server_status(self, client):
+        """
+        Returns the status of every server keyed by (pxname, svname).
         """
-        Gets the each original state value from show stat. 
-        Runs before and after to determine if values are changed. 
-        This relies on weight always being the next element after 
-        status in "show stat" as well as status states remaining
-        as indicated in status_states and haproxy documentation.
+        if self.servers_state.get(client.path) is not False:
+            states = self.show_servers_state(client)
+            self.servers_state[client.path] = states is not None
+            if states is not None:
+                return states
+        return dict((key, row['status']) for key, row in self.show_stat(client).items())
+
+    def wait_until_status(self, servers, status):
         """
-   
-        output = self.execute('show stat')
-        output = output.lstrip('# ').strip()
-        output = output.split(',')
-        result = output
-        status_states = [ 'UP','DOWN','DRAIN','NOLB','MAINT' ]
-        self.status_server = []
-        status_weight_pos = []
-        self.status_weight = []
-
-        for check, status in enumerate(result):
-            if status in status_states:
-                self.status_server.append(status) 
-                status_weight_pos.append(check + 1) 
-
-        for weight in status_weight_pos:
-                self.status_weight.append(result[weight])
-
-        return{'self.status_server':self.status_server, 'self.status_weight':self.status_weight}
-
-    def enabled(self, host, backend, weight):
+        Wait for all the servers, given as (client, pxname, svname), to reach
+        the specified status. Every socket is polled once per pass, with
+        INTERVAL seconds of sleep in between, until the wait timeout. If
+        any server has not reached the expected status in that time, the
+        module will fail. If a server was not found, the module will fail.
+        Returns the time at which each server reached the status.
+        """
+        deadline = time.time() + self.wait_timeout
+        reached = {}
+        pending = list(servers)
+        while True:
+            polled = {}
+            for client, pxname, svname in pending:
+                if client.path not in polled:
+                    polled[client.path] = self.server_status(client)
+                current = polled[client.path].get((pxname, svname))
+                if current is None:
+                    self.module.fail_json(msg="unable to find server %s/%s on %s" % (pxname, svname, client.path))
+                if current == status:
+                    reached[(client, pxname, svname)] = time.time()
+            pending = [server for server in pending if server not in reached]
+            if not pending:
+                return reached
+            now = time.time()
+            if now >= deadline:
+                break
+            time.sleep(min(self.wait_interval, deadline - now))
+
+        names = ', '.join("%s/%s on %s" % (pxname, svname, client.path) for client, pxname, svname in pending)
+        self.module.fail_json(msg="servers %s not status '%s' after %d seconds. Aborting." % (names, status, self.wait_timeout))
+
+    def get_current_state(self, stats, servers):
+        """
+        Gets the status and weight of each of the servers from the rows of
+        show stat. Runs before and after to determine if values are changed.
+        """
+        state = {}
+        for server in servers:
+            if server in stats:
+                state[server] = (stats[server]['status'], stats[server]['weight'])
+        return state
+
+    def get_servers(self, stats, client):
+        """
+        Resolves the host option to a list of (pxname, svname). A host without
+        a backend, when no backend is given, is looked up in every backend.
+        """
+        servers = []
+        for host in self.host:
+            if '/' in host:
+                servers.append(tuple(host.split('/', 1)))
+            elif self.backend is not None:
+                servers.append((self.backend, host))
+            else:
+                found = [key for key in sorted(stats) if key[1] == host]
+                if not found:
+                    self.module.fail_json(msg="unable to find server %s in any backend on %s" % (host, client.path))
+                servers.extend(found)
+        return servers
+
+    def enabled(self, pxname, svname, weight, client):
         """
         Enabled action, marks server to UP and checks are re-enabled,
         also supports to get current weight for server (default) and
         set the weight for haproxy backend server when provides.
         """
-        svname = host
-        if self.backend is None:
-            output = self.execute('show stat')
-            #sanitize and make a list of lines
-            output = output.lstrip('# ').strip()
-            output = output.split('\n')
-            result = output
-
-            for line in result:
-                if 'BACKEND' in line:
-                    result =  line.split(',')[0]
-                    pxname = result
-                    cmd = "get weight %s/%s ; enable server %s/%s" % (pxname, svname, pxname, svname)
-                    if weight:
-                        cmd += "; set weight %s/%s %s" % (pxname, svname, weight)
-                    self.execute(cmd)
-                    if self.wait:
-                        self.wait_until_status(pxname, svname, 'UP')
-
-        else:
-            pxname = backend
-            cmd = "get weight %s/%s ; enable server %s/%s" % (pxname, svname, pxname, svname)
-            if weight:
-                cmd += "; set weight %s/%s %s" % (pxname, svname, weight)
-            self.execute(cmd)
-            if self.wait:
-                self.wait_until_status(pxname, svname, 'UP')
+        cmd = "get weight %s/%s ; enable server %s/%s" % (pxname, svname, pxname, svname)
+        if weight:
+            cmd += "; set weight %s/%s %s" % (pxname, svname, weight)
+        self.execute(cmd, client=client)
 
-    def disabled(self, host, backend, shutdown_sessions):
+    def disabled(self, pxname, svname, shutdown_sessions, client):
         """
         Disabled action, marks server to DOWN for maintenance. In this mode, no more checks will be
         performed on the server until it leaves maintenance,
         also it shutdown sessions while disabling backend host server.
         """
-        svname = host
-        if self.backend is None:
-            output = self.execute('show stat')
-            #sanitize and make a list of lines
-            output = output.lstrip('# ').strip()
-            output = output.split('\n')
-            result = output
-
-            for line in result:
-                if 'BACKEND' in line:
-                    result =  line.split(',')[0]
-                    pxname = result
-                    cmd = "get weight %s/%s ; disable server %s/%s" % (pxname, svname, pxname, svname)
-                    if shutdown_sessions:
-                        cmd += "; shutdown sessions server %s/%s" % (pxname, svname)
-                    self.execute(cmd)
-                    if self.wait:
-                        self.wait_until_status(pxname, svname, 'MAINT')
-
-        else:
-            pxname = backend
-            cmd = "get weight %s/%s ; disable server %s/%s" % (pxname, svname, pxname, svname)
-            if shutdown_sessions:
-                cmd += "; shutdown sessions server %s/%s" % (pxname, svname)
-            self.execute(cmd)
-            if self.wait:
-                self.wait_until_status(pxname, svname, 'MAINT')
+        cmd = "get weight %s/%s ; disable server %s/%s" % (pxname, svname, pxname, svname)
+        if shutdown_sessions:
+            cmd += "; shutdown sessions server %s/%s" % (pxname, svname)
+        self.execute(cmd, client=client)
+
+    def drain(self, pxname, svname, shutdown_sessions, client):
+        """
+        Drain action, the server stops receiving new connections while the
+        established ones are left to complete.
+        """
+        cmd = "get weight %s/%s ; set server %s/%s state drain" % (pxname, svname, pxname, svname)
+        if shutdown_sessions:
+            cmd += "; shutdown sessions server %s/%s" % (pxname, svname)
+        self.execute(cmd, client=client)
 
     def act(self):
         """
         Figure out what you want to do from ansible, and then do it.
         """
 
-        self.get_current_state(self.host, self.backend)
-        self.previous_states = ','.join(self.status_server)
-        self.previous_weights = ','.join(self.status_weight)
-
-        # toggle enable/disbale server
-        if self.state == 'enabled':
-            self.enabled(self.host, self.backend, self.weight)
-
-        elif self.state == 'disabled':
-            self.disabled(self.host, self.backend, self.shutdown_sessions)
-
-        else:
-            self.module.fail_json(msg="unknown state specified: '%s'" % self.state)
-
-        self.get_current_state(self.host, self.backend)
-        self.current_states = ','.join(self.status_server)
-        self.current_weights = ','.join(self.status_weight)
+        servers = []
+        previous_state = {}
+        for client in self.clients:
+            stats = self.show_stat(client)
+            client_servers = self.get_servers(stats, client)
+            previous_state[client.path] = self.get_current_state(stats, client_servers)
+            servers.extend((client, pxname, svname) for pxname, svname in client_servers)
+
+        changed_at = {}
+        for client, pxname, svname in servers:
+            # toggle enable/disbale server
+            if self.state == 'enabled':
+                self.enabled(pxname, svname, self.weight, client)
+
+            elif self.state == 'disabled':
+                self.disabled(pxname, svname, self.shutdown_sessions, client)
+
+            elif self.state == 'drain':
+                self.drain(pxname, svname, self.shutdown_sessions, client)
+
+            else:
+                self.module.fail_json(msg="unknown state specified: '%s'" % self.state)
+            changed_at[(client, pxname, svname)] = time.time()
+
+        if self.wait:
+            reached = self.wait_until_status(servers, WANTED_STATUS[self.state])
+
+        result = []
+        for server in servers:
+            client, pxname, svname = server
+            entry = dict(socket=client.path, backend=pxname, host=svname)
+            if self.wait:
+                entry['status'] = WANTED_STATUS[self.state]
+                entry['wait_time'] = round(max(0, reached[server] - changed_at[server]), 2)
+            result.append(entry)
 
+        changed = False
+        for client in self.clients:
+            client_servers = [(pxname, svname) for c, pxname, svname in servers if c is client]
+            current_state = self.get_current_state(self.show_stat(client), client_servers)
+            if current_state != previous_state[client.path]:
+                changed = True
+            client.close()
 
-        if self.current_weights != self.previous_weights:
-            self.module.exit_json(stdout=self.command_results, changed=True)  
-        elif self.current_states != self.previous_states:
-            self.module.exit_json(stdout=self.command_results, changed=True)
-        else:
-            self.module.exit_json(stdout=self.command_results, changed=False)  
+        self.module.exit_json(stdout='\n'.join(self.command_results), changed=changed, servers=result)
 
 def main():
 
@@ -344,14 +515,16 @@ def main():
     module = AnsibleModule(
         argument_spec = dict(
             state = dict(required=True, default=None, choices=ACTION_CHOICES),
-            host=dict(required=True, default=None),
+            host=dict(required=True, default=None, type='list'),
             backend=dict(required=False, default=None),
             weight=dict(required=False, default=None),
             socket = dict(required=False, default=DEFAULT_SOCKET_LOCATION),
-            shutdown_sessions=dict(required=False, default=False),
+            sockets = dict(required=False, default=None, type='list'),
+            shutdown_sessions=dict(required=False, default=False, type='bool'),
             wait=dict(required=False, default=False, type='bool'),
             wait_retries=dict(required=False, default=WAIT_RETRIES, type='int'),
             wait_interval=dict(required=False, default=WAIT_INTERVAL, type='int'),
+            wait_timeout=dict(required=False, default=None, type='int'),
         ),
 
     )
@@ -365,4 +538,5 @@ def main():
 # import module snippets
 from ansible.module_utils.basic import *
 
-main()
+if __name__ == '__main__':
+    main()
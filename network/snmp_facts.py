@@ -31,7 +31,50 @@ options:
     host:
         description:
             - Set to target snmp server (normally {{inventory_hostname}})
-        required: true
+            - Required unless I(hosts) is given.
+        required: false
+    hosts:
+        description:
+            - A list of snmp servers to poll concurrently with the same
+              credentials. Their facts are returned in C(snmp_hosts), keyed by
+              host, instead of being set as facts of the current host.
+        required: false
+        version_added: "2.2"
+    threads:
+        description:
+            - Maximum number of I(hosts) polled at the same time.
+        required: false
+        default: 16
+        version_added: "2.2"
+    bulk_size:
+        description:
+            - Number of rows asked for in each GETBULK request when walking
+              tables (max-repetitions). Set to 0 to walk with GETNEXT.
+        required: false
+        default: 25
+        version_added: "2.2"
+    timeout:
+        description:
+            - Seconds to wait for each SNMP response.
+        required: false
+        default: 1
+        version_added: "2.2"
+    retries:
+        description:
+            - Number of times an unanswered SNMP request is retried.
+        required: false
+        default: 5
+        version_added: "2.2"
+    include:
+        description:
+            - Additional tables to collect. C(interface_counters) adds the
+              64-bit traffic counters, error counters, high speed and name of
+              every interface from IF-MIB, C(entity) adds the physical
+              inventory (chassis, modules, serial numbers) from ENTITY-MIB
+              as C(ansible_entities).
+        choices: [ 'interface_counters', 'entity' ]
+        required: false
+        version_added: "2.2"
     version:
         description:
             - SNMP Version to use, v2/v2c or v3
@@ -86,10 +129,27 @@ EXAMPLES = '''
     authkey=abc12345
     privkey=def6789
   delegate_to: localhost
+
+# Poll a list of switches concurrently, with their inventory and counters
+- snmp_facts:
+    hosts: "{{ groups['switches'] }}"
+    version: v2c
+    community: public
+    include: [ 'interface_counters', 'entity' ]
+    threads: 32
+  run_once: true
+  delegate_to: localhost
+  register: inventory
 '''
 
 from ansible.module_utils.basic import *
 from collections import defaultdict
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
 
 try:
     from pysnmp.entity.rfc3413.oneliner import cmdgen
@@ -121,6 +181,12 @@ class DefineOid(object):
         self.ifPhysAddress = dp + "1.3.6.1.2.1.2.2.1.6"
         self.ifAdminStatus = dp + "1.3.6.1.2.1.2.2.1.7"
         self.ifOperStatus  = dp + "1.3.6.1.2.1.2.2.1.8"
+        self.ifInErrors    = dp + "1.3.6.1.2.1.2.2.1.14"
+        self.ifOutErrors   = dp + "1.3.6.1.2.1.2.2.1.20"
+        self.ifName        = dp + "1.3.6.1.2.1.31.1.1.1.1"
+        self.ifHCInOctets  = dp + "1.3.6.1.2.1.31.1.1.1.6"
+        self.ifHCOutOctets = dp + "1.3.6.1.2.1.31.1.1.1.10"
+        self.ifHighSpeed   = dp + "1.3.6.1.2.1.31.1.1.1.15"
         self.ifAlias       = dp + "1.3.6.1.2.1.31.1.1.1.18"
 
         # From IP-MIB
@@ -128,6 +194,17 @@ class DefineOid(object):
         self.ipAdEntIfIndex = dp + "1.3.6.1.2.1.4.20.1.2"
         self.ipAdEntNetMask = dp + "1.3.6.1.2.1.4.20.1.3"
 
+        # From ENTITY-MIB
+        self.entPhysicalDescr       = dp + "1.3.6.1.2.1.47.1.1.1.1.2"
+        self.entPhysicalContainedIn = dp + "1.3.6.1.2.1.47.1.1.1.1.4"
+        self.entPhysicalClass       = dp + "1.3.6.1.2.1.47.1.1.1.1.5"
+        self.entPhysicalName        = dp + "1.3.6.1.2.1.47.1.1.1.1.7"
+        self.entPhysicalHardwareRev = dp + "1.3.6.1.2.1.47.1.1.1.1.8"
+        self.entPhysicalFirmwareRev = dp + "1.3.6.1.2.1.47.1.1.1.1.9"
+        self.entPhysicalSoftwareRev = dp + "1.3.6.1.2.1.47.1.1.1.1.10"
+        self.entPhysicalSerialNum   = dp + "1.3.6.1.2.1.47.1.1.1.1.11"
+        self.entPhysicalModelName   = dp + "1.3.6.1.2.1.47.1.1.1.1.13"
+
 
 def decode_hex(hexstring):
 
@@ -173,10 +250,223 @@ def lookup_operstatus(int_operstatus):
     else:
         return ""
 
+def lookup_physicalclass(int_physicalclass):
+    physicalclass_options = {
+                              1: 'other',
+                              2: 'unknown',
+                              3: 'chassis',
+                              4: 'backplane',
+                              5: 'container',
+                              6: 'powerSupply',
+                              7: 'fan',
+                              8: 'sensor',
+                              9: 'module',
+                              10: 'port',
+                              11: 'stack',
+                              12: 'cpu'
+                            }
+    if int_physicalclass in physicalclass_options.keys():
+        return physicalclass_options[int_physicalclass]
+    else:
+        return ""
+
+
+def build_tables(v, include):
+    """Return the tables to walk, as lists of (column OID, table, key, converter)
+    where table is the fact the row goes to and key the field within the row"""
+    tables = []
+    tables.append([
+        (v.ifIndex, 'interfaces', 'ifindex', None),
+        (v.ifDescr, 'interfaces', 'name', None),
+        (v.ifMtu, 'interfaces', 'mtu', None),
+        (v.ifSpeed, 'interfaces', 'speed', None),
+        (v.ifPhysAddress, 'interfaces', 'mac', decode_mac),
+        (v.ifAdminStatus, 'interfaces', 'adminstatus', lambda x: lookup_adminstatus(int(x))),
+        (v.ifOperStatus, 'interfaces', 'operstatus', lambda x: lookup_operstatus(int(x))),
+    ])
+    tables.append([
+        (v.ifAlias, 'interfaces', 'description', None),
+    ])
+    tables.append([
+        (v.ipAdEntAddr, 'ipv4', 'address', None),
+        (v.ipAdEntIfIndex, 'ipv4', 'interface', None),
+        (v.ipAdEntNetMask, 'ipv4', 'netmask', None),
+    ])
+    if 'interface_counters' in include:
+        tables[0].extend([
+            (v.ifInErrors, 'interfaces', 'in_errors', None),
+            (v.ifOutErrors, 'interfaces', 'out_errors', None),
+        ])
+        tables[1].extend([
+            (v.ifName, 'interfaces', 'ifname', None),
+            (v.ifHCInOctets, 'interfaces', 'hc_in_octets', None),
+            (v.ifHCOutOctets, 'interfaces', 'hc_out_octets', None),
+            (v.ifHighSpeed, 'interfaces', 'high_speed', None),
+        ])
+    if 'entity' in include:
+        tables.append([
+            (v.entPhysicalDescr, 'entities', 'description', None),
+            (v.entPhysicalContainedIn, 'entities', 'contained_in', None),
+            (v.entPhysicalClass, 'entities', 'class', lambda x: lookup_physicalclass(int(x))),
+            (v.entPhysicalName, 'entities', 'name', None),
+            (v.entPhysicalHardwareRev, 'entities', 'hardware_rev', None),
+            (v.entPhysicalFirmwareRev, 'entities', 'firmware_rev', None),
+            (v.entPhysicalSoftwareRev, 'entities', 'software_rev', None),
+            (v.entPhysicalSerialNum, 'entities', 'serial', None),
+            (v.entPhysicalModelName, 'entities', 'model', None),
+        ])
+    return tables
+
+
+def walk_table(cmdGen, snmp_auth, transport, columns, bulk_size):
+    """Walk the columns of a table with GETBULK, or GETNEXT if bulk_size is 0"""
+    varNames = [cmdgen.MibVariable("." + column,) for column, table, key, convert in columns]
+    if bulk_size > 0:
+        errorIndication, errorStatus, errorIndex, varTable = cmdGen.bulkCmd(
+            snmp_auth, transport, 0, bulk_size, *varNames, **dict(lookupMib=False))
+    else:
+        errorIndication, errorStatus, errorIndex, varTable = cmdGen.nextCmd(
+            snmp_auth, transport, *varNames, **dict(lookupMib=False))
+    if errorIndication:
+        raise SnmpError(str(errorIndication))
+    return varTable
+
+
+class SnmpError(Exception):
+    pass
+
+
+def collect_facts(cmdGen, snmp_auth, host, options):
+    """Poll host and return its facts"""
+    # Use p to prefix OIDs with a dot for polling
+    p = DefineOid(dotprefix=True)
+    # Use v without a prefix to use with return values
+    v = DefineOid(dotprefix=False)
+
+    Tree = lambda: defaultdict(Tree)
+
+    results = Tree()
+
+    transport = cmdgen.UdpTransportTarget((host, 161), timeout=options['timeout'], retries=options['retries'])
+
+    errorIndication, errorStatus, errorIndex, varBinds = cmdGen.getCmd(
+        snmp_auth,
+        transport,
+        cmdgen.MibVariable(p.sysDescr,),
+        cmdgen.MibVariable(p.sysObjectId,),
+        cmdgen.MibVariable(p.sysUpTime,),
+        cmdgen.MibVariable(p.sysContact,),
+        cmdgen.MibVariable(p.sysName,),
+        cmdgen.MibVariable(p.sysLocation,),
+        lookupMib=False
+    )
+
+
+    if errorIndication:
+        raise SnmpError(str(errorIndication))
+
+    for oid, val in varBinds:
+        current_oid = oid.prettyPrint()
+        current_val = val.prettyPrint()
+        if current_oid == v.sysDescr:
+            results['ansible_sysdescr'] = decode_hex(current_val)
+        elif current_oid == v.sysObjectId:
+            results['ansible_sysobjectid'] = current_val
+        elif current_oid == v.sysUpTime:
+            results['ansible_sysuptime'] = current_val
+        elif current_oid == v.sysContact:
+            results['ansible_syscontact'] = current_val
+        elif current_oid == v.sysName:
+            results['ansible_sysname'] = current_val
+        elif current_oid == v.sysLocation:
+            results['ansible_syslocation'] = current_val
+
+    rows = dict(interfaces=Tree(), ipv4=Tree(), entities=Tree())
+
+    for columns in build_tables(v, options['include']):
+        # Column OID -> handler, the row index being whatever follows it
+        handlers = dict((column, (table, key, convert)) for column, table, key, convert in columns)
+        lengths = set([len(column.split('.')) for column in handlers])
+        for varBinds in walk_table(cmdGen, snmp_auth, transport, columns, options['bulk_size']):
+            for oid, val in varBinds:
+                parts = oid.prettyPrint().split('.')
+                for length in lengths:
+                    column = '.'.join(parts[:length])
+                    if column in handlers:
+                        break
+                else:
+                    # GETBULK may return rows past the end of the table
+                    continue
+                table, key, convert = handlers[column]
+                index = '.'.join(parts[length:])
+                current_val = val.prettyPrint()
+                if convert:
+                    current_val = convert(current_val)
+                rows[table][index][key] = current_val
+
+    for index, interface in rows['interfaces'].items():
+        results['ansible_interfaces'][int(index)].update(interface)
+
+    all_ipv4_addresses = []
+    interface_to_ipv4 = {}
+    for ipv4_network in rows['ipv4'].values():
+        all_ipv4_addresses.append(ipv4_network['address'])
+        current_network = {
+                            'address':  ipv4_network['address'],
+                            'netmask':  ipv4_network['netmask']
+                          }
+        interface_to_ipv4.setdefault(ipv4_network['interface'], []).append(current_network)
+
+    for interface in interface_to_ipv4:
+        results['ansible_interfaces'][int(interface)]['ipv4'] = interface_to_ipv4[interface]
+
+    results['ansible_all_ipv4_addresses'] = all_ipv4_addresses
+
+    if 'entity' in options['include']:
+        for index, entity in rows['entities'].items():
+            results['ansible_entities'][int(index)] = entity
+
+    return results
+
+
+def collect_many(snmp_auth, hosts, options, threads):
+    """Poll hosts concurrently, return a dict of host to facts or error"""
+    pending = queue.Queue()
+    for host in hosts:
+        pending.put(host)
+    results = {}
+
+    def worker():
+        # A command generator holds its own engine state, keep one per thread
+        cmdGen = cmdgen.CommandGenerator()
+        while True:
+            try:
+                host = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[host] = collect_facts(cmdGen, snmp_auth, host, options)
+            except Exception, e:
+                results[host] = dict(failed=True, msg=str(e))
+
+    workers = [threading.Thread(target=worker) for i in range(max(1, min(threads, len(hosts))))]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return results
+
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
-            host=dict(required=True),
+            host=dict(required=False),
+            hosts=dict(required=False, type='list'),
+            threads=dict(required=False, type='int', default=16),
+            bulk_size=dict(required=False, type='int', default=25),
+            timeout=dict(required=False, type='int', default=1),
+            retries=dict(required=False, type='int', default=5),
+            include=dict(required=False, type='list', default=[]),
             version=dict(required=True, choices=['v2', 'v2c', 'v3']),
             community=dict(required=False, default=False),
             username=dict(required=False),
@@ -187,6 +477,8 @@ def main():
             privkey=dict(required=False),
             removeplaceholder=dict(required=False)),
             required_together = ( ['username','level','integrity','authkey'],['privacy','privkey'],),
+            required_one_of = ( ['host', 'hosts'], ),
+            mutually_exclusive = ( ['host', 'hosts'], ),
         supports_check_mode=False)
 
     m_args = module.params
@@ -194,7 +486,9 @@ def main():
     if not has_pysnmp:
         module.fail_json(msg='Missing required pysnmp module (check docs)')
 
-    cmdGen = cmdgen.CommandGenerator()
+    for table in m_args['include']:
+        if table not in ('interface_counters', 'entity'):
+            module.fail_json(msg='include must be one or more of: interface_counters, entity, got: %s' % table)
 
     # Verify that we receive a community when using snmp v2
     if m_args['version'] == "v2" or m_args['version'] == "v2c":
@@ -231,135 +525,17 @@ def main():
     else:
         snmp_auth = cmdgen.UsmUserData(m_args['username'], authKey=m_args['authkey'], privKey=m_args['privkey'], authProtocol=integrity_proto, privProtocol=privacy_proto)
 
-    # Use p to prefix OIDs with a dot for polling
-    p = DefineOid(dotprefix=True)
-    # Use v without a prefix to use with return values
-    v = DefineOid(dotprefix=False)
-
-    Tree = lambda: defaultdict(Tree)
-
-    results = Tree()
-
-    errorIndication, errorStatus, errorIndex, varBinds = cmdGen.getCmd(
-        snmp_auth,
-        cmdgen.UdpTransportTarget((m_args['host'], 161)),
-        cmdgen.MibVariable(p.sysDescr,),
-        cmdgen.MibVariable(p.sysObjectId,),
-        cmdgen.MibVariable(p.sysUpTime,),
-        cmdgen.MibVariable(p.sysContact,),
-        cmdgen.MibVariable(p.sysName,),
-        cmdgen.MibVariable(p.sysLocation,),
-        lookupMib=False
-    )
-
-
-    if errorIndication:
-        module.fail_json(msg=str(errorIndication))
-
-    for oid, val in varBinds:
-        current_oid = oid.prettyPrint()
-        current_val = val.prettyPrint()
-        if current_oid == v.sysDescr:
-            results['ansible_sysdescr'] = decode_hex(current_val)
-        elif current_oid == v.sysObjectId:
-            results['ansible_sysobjectid'] = current_val
-        elif current_oid == v.sysUpTime:
-            results['ansible_sysuptime'] = current_val
-        elif current_oid == v.sysContact:
-            results['ansible_syscontact'] = current_val
-        elif current_oid == v.sysName:
-            results['ansible_sysname'] = current_val
-        elif current_oid == v.sysLocation:
-            results['ansible_syslocation'] = current_val
+    if m_args['hosts']:
+        results = collect_many(snmp_auth, m_args['hosts'], m_args, m_args['threads'])
+        failed = [host for host in results if results[host].get('failed')]
+        module.exit_json(changed=False, snmp_hosts=results, failed_hosts=failed)
 
-    errorIndication, errorStatus, errorIndex, varTable = cmdGen.nextCmd(
-        snmp_auth,
-        cmdgen.UdpTransportTarget((m_args['host'], 161)),
-        cmdgen.MibVariable(p.ifIndex,),
-        cmdgen.MibVariable(p.ifDescr,),
-        cmdgen.MibVariable(p.ifMtu,),
-        cmdgen.MibVariable(p.ifSpeed,),
-        cmdgen.MibVariable(p.ifPhysAddress,),
-        cmdgen.MibVariable(p.ifAdminStatus,),
-        cmdgen.MibVariable(p.ifOperStatus,),
-        cmdgen.MibVariable(p.ipAdEntAddr,),
-        cmdgen.MibVariable(p.ipAdEntIfIndex,),
-        cmdgen.MibVariable(p.ipAdEntNetMask,),
-
-        cmdgen.MibVariable(p.ifAlias,),
-        lookupMib=False
-    )
-
-
-    if errorIndication:
-        module.fail_json(msg=str(errorIndication))
-
-    interface_indexes = []
-
-    all_ipv4_addresses = []
-    ipv4_networks = Tree()
-
-    for varBinds in varTable:
-        for oid, val in varBinds:
-            current_oid = oid.prettyPrint()
-            current_val = val.prettyPrint()
-            if v.ifIndex in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['ifindex'] = current_val
-                interface_indexes.append(ifIndex)
-            if v.ifDescr in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['name'] = current_val
-            if v.ifMtu in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['mtu'] = current_val
-            if v.ifMtu in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['speed'] = current_val
-            if v.ifPhysAddress in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['mac'] = decode_mac(current_val)
-            if v.ifAdminStatus in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['adminstatus'] = lookup_adminstatus(int(current_val))
-            if v.ifOperStatus in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['operstatus'] = lookup_operstatus(int(current_val))
-            if v.ipAdEntAddr in current_oid:
-                curIPList = current_oid.rsplit('.', 4)[-4:]
-                curIP = ".".join(curIPList)
-                ipv4_networks[curIP]['address'] = current_val
-                all_ipv4_addresses.append(current_val)
-            if v.ipAdEntIfIndex in current_oid:
-                curIPList = current_oid.rsplit('.', 4)[-4:]
-                curIP = ".".join(curIPList)
-                ipv4_networks[curIP]['interface'] = current_val
-            if v.ipAdEntNetMask in current_oid:
-                curIPList = current_oid.rsplit('.', 4)[-4:]
-                curIP = ".".join(curIPList)
-                ipv4_networks[curIP]['netmask'] = current_val
-
-            if v.ifAlias in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['description'] = current_val
-
-    interface_to_ipv4 = {}
-    for ipv4_network in ipv4_networks:
-        current_interface = ipv4_networks[ipv4_network]['interface']
-        current_network = {
-                            'address':  ipv4_networks[ipv4_network]['address'],
-                            'netmask':  ipv4_networks[ipv4_network]['netmask']
-                          }
-        if not current_interface in interface_to_ipv4:
-            interface_to_ipv4[current_interface] = []
-            interface_to_ipv4[current_interface].append(current_network)
-        else:
-            interface_to_ipv4[current_interface].append(current_network)
-
-    for interface in interface_to_ipv4:
-        results['ansible_interfaces'][int(interface)]['ipv4'] = interface_to_ipv4[interface]
+    cmdGen = cmdgen.CommandGenerator()
 
-    results['ansible_all_ipv4_addresses'] = all_ipv4_addresses
+    try:
+        results = collect_facts(cmdGen, snmp_auth, m_args['host'], m_args)
+    except SnmpError, e:
+        module.fail_json(msg=str(e))
 
     module.exit_json(ansible_facts=results)
 
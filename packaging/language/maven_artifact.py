@@ -23,8 +23,21 @@ __author__ = 'cschmidt'
 
 from lxml import etree
 import os
+import errno
 import hashlib
-import sys
+import shutil
+import tempfile
+import threading
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
 
 DOCUMENTATION = '''
 ---
@@ -43,11 +56,15 @@ options:
     group_id:
         description:
             - The Maven groupId coordinate
-        required: true
+            - Required unless I(artifacts) is given, which it is mutually exclusive with.
+        required: false
+        default: null
     artifact_id:
         description:
             - The maven artifactId coordinate
-        required: true
+            - Required unless I(artifacts) is given, which it is mutually exclusive with.
+        required: false
+        default: null
     version:
         description:
             - The maven version coordinate
@@ -81,8 +98,9 @@ options:
     dest:
         description:
             - The path where the artifact should be written to
-        required: true
-        default: false
+            - Required unless I(artifacts) is given, which it is mutually exclusive with.
+        required: false
+        default: null
     state:
         description:
             - The desired state of the artifact
@@ -96,6 +114,39 @@ options:
         default: 'yes'
         choices: ['yes', 'no']
         version_added: "1.9.3"
+    cache_dir:
+        description:
+            - Path of a local cache directory. Downloaded artifacts are stored in it keyed by their checksum and
+              are hardlinked (or copied across filesystems) to C(dest) when the same checksum is requested again.
+            - The size, modification time, inode and checksum of every file written or verified are recorded there
+              too, so an unchanged C(dest) is not read and hashed again on the next run.
+            - The C(maven-metadata.xml) files are kept there as well and only refetched when the repository reports
+              a change through C(ETag)/C(Last-Modified).
+        required: false
+        default: null
+        version_added: "2.1"
+    checksum_algorithm:
+        description:
+            - The checksum file published next to the artifact in the repository that is used to verify it.
+        required: false
+        default: md5
+        choices: ['md5', 'sha1', 'sha256']
+        version_added: "2.1"
+    artifacts:
+        description:
+            - A list of artifacts to download concurrently instead of the single one given by I(group_id) and
+              I(artifact_id). Each item is a hash taking the I(group_id), I(artifact_id), I(version), I(classifier),
+              I(extension) and I(dest) keys, with the same meaning and defaults as the module options.
+            - Mutually exclusive with I(group_id), I(artifact_id) and I(dest).
+        required: false
+        default: null
+        version_added: "2.1"
+    threads:
+        description:
+            - The maximum number of artifacts from I(artifacts) downloaded at the same time.
+        required: false
+        default: 4
+        version_added: "2.1"
 '''
 
 EXAMPLES = '''
@@ -110,6 +161,14 @@ EXAMPLES = '''
 
 # Download a WAR File to the Tomcat webapps directory to be deployed
 - maven_artifact: group_id=com.company artifact_id=web-app extension=war repository_url=https://repo.company.com/maven dest=/var/lib/tomcat7/webapps/web-app.war
+
+# Download several artifacts at once, reusing a local cache across runs
+- maven_artifact:
+    cache_dir: /var/cache/maven_artifact
+    threads: 8
+    artifacts:
+      - { group_id: junit, artifact_id: junit, version: "4.11", dest: /opt/app/lib/ }
+      - { group_id: org.hamcrest, artifact_id: hamcrest-core, version: "1.3", dest: /opt/app/lib/ }
 '''
 
 class Artifact(object):
@@ -180,16 +239,29 @@ class Artifact(object):
 
 
 class MavenDownloader:
-    def __init__(self, module, base="http://repo1.maven.org/maven2"):
+    # Size of the reads from the repository and writes to disk when streaming an artifact
+    buffer_size = 1024 * 1024
+
+    def __init__(self, module, base="http://repo1.maven.org/maven2", cache_dir=None, algorithm="md5"):
         self.module = module
         if base.endswith("/"):
             base = base.rstrip("/")
         self.base = base
+        self.cache_dir = cache_dir
+        self.algorithm = algorithm
         self.user_agent = "Maven Artifact Downloader/1.0"
+        # maven-metadata.xml documents already fetched during this run, by URL
+        self._metadata = {}
+        # one lock per URL, so that only the threads wanting the same document wait for each other
+        self._metadata_locks = {}
+        self._metadata_lock = threading.Lock()
+        # Remote checksums already fetched during this run, by URL
+        self._checksums = {}
+        self._checksums_lock = threading.Lock()
 
     def _find_latest_version_available(self, artifact):
         path = "/%s/maven-metadata.xml" % (artifact.path(False))
-        xml = self._request(self.base + path, "Failed to download maven-metadata.xml", lambda r: etree.parse(r))
+        xml = self._metadata_request(self.base + path, "Failed to download maven-metadata.xml")
         v = xml.xpath("/metadata/versioning/versions/version[last()]/text()")
         if v:
             return v[0]
@@ -200,7 +272,7 @@ class MavenDownloader:
 
         if artifact.is_snapshot():
             path = "/%s/maven-metadata.xml" % (artifact.path())
-            xml = self._request(self.base + path, "Failed to download maven-metadata.xml", lambda r: etree.parse(r))
+            xml = self._metadata_request(self.base + path, "Failed to download maven-metadata.xml")
             timestamp = xml.xpath("/metadata/versioning/snapshot/timestamp/text()")[0]
             buildNumber = xml.xpath("/metadata/versioning/snapshot/buildNumber/text()")[0]
             return self._uri_for_artifact(artifact, artifact.version.replace("SNAPSHOT", timestamp + "-" + buildNumber))
@@ -217,18 +289,138 @@ class MavenDownloader:
 
         return self.base + "/" + artifact.path() + "/" + artifact.artifact_id + "-" + version + "." + artifact.extension
 
-    def _request(self, url, failmsg, f):
+    def _request(self, url, failmsg, f, headers=None, expected=(200,)):
         # Hack to add parameters in the way that fetch_url expects
         self.module.params['url_username'] = self.module.params.get('username', '')
         self.module.params['url_password'] = self.module.params.get('password', '')
         self.module.params['http_agent'] = self.module.params.get('user_agent', None)
 
-        response, info = fetch_url(self.module, url)
-        if info['status'] != 200:
+        response, info = fetch_url(self.module, url, headers=headers)
+        if info['status'] not in expected:
             raise ValueError(failmsg + " because of " + info['msg'] + "for URL " + url)
         else:
-            return f(response)
-
+            return f(response, info)
+
+    def _metadata_request(self, url, failmsg):
+        self._metadata_lock.acquire()
+        try:
+            if url in self._metadata:
+                return self._metadata[url]
+            url_lock = self._metadata_locks.setdefault(url, threading.Lock())
+        finally:
+            self._metadata_lock.release()
+
+        url_lock.acquire()
+        try:
+            # another thread may have fetched it while this one waited
+            xml = self._metadata.get(url)
+            if xml is None:
+                xml = etree.fromstring(self._fetch_metadata(url, failmsg))
+                self._metadata_lock.acquire()
+                try:
+                    self._metadata[url] = xml
+                finally:
+                    self._metadata_lock.release()
+            return xml
+        finally:
+            url_lock.release()
+
+    def _fetch_metadata(self, url, failmsg):
+        if not self.cache_dir:
+            return self._request(url, failmsg, lambda r, info: r.read())
+
+        # Revalidate the cached copy with a conditional request so an
+        # unchanged document is not transferred again
+        cache_file = os.path.join(self.cache_dir, "metadata", hashlib.sha1(url.encode('utf-8')).hexdigest())
+        headers = {}
+        validators = {}
+        if os.path.exists(cache_file) and os.path.exists(cache_file + ".json"):
+            with open(cache_file + ".json") as f:
+                validators = json.load(f)
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last-modified'):
+                headers['If-Modified-Since'] = validators['last-modified']
+
+        def _store(response, info):
+            if info['status'] == 304 and headers:
+                with open(cache_file, 'rb') as f:
+                    return f.read()
+            data = response.read()
+            self._write_atomic(cache_file, data)
+            self._write_atomic(cache_file + ".json", json.dumps(dict(
+                (k, info[k]) for k in ('etag', 'last-modified') if info.get(k))))
+            return data
+
+        return self._request(url, failmsg, _store, headers=headers, expected=(200, 304))
+
+    def _write_atomic(self, filename, data):
+        fd, tmp = self._mkstemp(filename)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        os.rename(tmp, filename)
+
+    def _mkstemp(self, filename):
+        # The temporary file lives next to its destination so that the final
+        # rename is atomic, with the permissions a plain open() would give
+        dirname = os.path.dirname(filename)
+        if dirname and not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        fd, tmp = tempfile.mkstemp(prefix=".%s." % os.path.basename(filename), dir=dirname or None)
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0o666 & ~umask)
+        return fd, tmp
+
+    def _cache_path(self, digest):
+        return os.path.join(self.cache_dir, self.algorithm, digest[:2], digest)
+
+    def _stat_path(self, file):
+        return os.path.join(self.cache_dir, "stat", hashlib.sha1(os.path.abspath(file).encode('utf-8')).hexdigest())
+
+    def _stat_key(self, file):
+        st = os.stat(file)
+        return dict(size=st.st_size, mtime=st.st_mtime, inode=st.st_ino, device=st.st_dev)
+
+    def _record_checksum(self, file, digest):
+        # Remember the digest of file along with what identifies its
+        # current content, so it does not have to be read again
+        if not self.cache_dir:
+            return
+        entry = self._stat_key(file)
+        entry['path'] = os.path.abspath(file)
+        entry[self.algorithm] = digest
+        self._write_atomic(self._stat_path(file), json.dumps(entry))
+
+    def _recorded_checksum(self, file):
+        if not self.cache_dir or not os.path.exists(self._stat_path(file)):
+            return None
+        try:
+            with open(self._stat_path(file)) as f:
+                entry = json.load(f)
+        except ValueError:
+            return None
+        for key, value in self._stat_key(file).items():
+            if entry.get(key) != value:
+                return None
+        return entry.get(self.algorithm)
+
+    def _link_or_copy(self, src, dest):
+        fd, tmp = self._mkstemp(dest)
+        os.close(fd)
+        os.remove(tmp)
+        try:
+            os.link(src, tmp)
+        except OSError:
+            # Different filesystem or no hardlink support
+            shutil.copyfile(src, tmp)
+        os.rename(tmp, dest)
 
     def download(self, artifact, filename=None):
         filename = artifact.get_filename(filename)
@@ -237,59 +429,136 @@ class MavenDownloader:
                                 artifact.classifier, artifact.extension)
 
         url = self.find_uri_for_artifact(artifact)
-        if not self.verify_md5(filename, url + ".md5"):
-            response = self._request(url, "Failed to download artifact " + str(artifact), lambda r: r)
-            if response:
-                with open(filename, 'w') as f:
-                    # f.write(response.read())
-                    self._write_chunks(response, f, report_hook=self.chunk_report)
-                return True
-            else:
-                return False
-        else:
+        remote = self._remote_checksum(url + "." + self.algorithm)
+        if os.path.exists(filename) and self._local_checksum(filename) == remote:
             return True
 
-    def chunk_report(self, bytes_so_far, chunk_size, total_size):
-        percent = float(bytes_so_far) / total_size
-        percent = round(percent * 100, 2)
-        sys.stdout.write("Downloaded %d of %d bytes (%0.2f%%)\r" %
-                         (bytes_so_far, total_size, percent))
-
-        if bytes_so_far >= total_size:
-            sys.stdout.write('\n')
+        if self.cache_dir and os.path.exists(self._cache_path(remote)):
+            self._link_or_copy(self._cache_path(remote), filename)
+            self._record_checksum(filename, remote)
+            return True
 
-    def _write_chunks(self, response, file, chunk_size=8192, report_hook=None):
-        total_size = response.info().getheader('Content-Length').strip()
-        total_size = int(total_size)
-        bytes_so_far = 0
+        response = self._request(url, "Failed to download artifact " + str(artifact), lambda r, info: r)
+        if not response:
+            return False
 
+        fd, tmp = self._mkstemp(filename)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                digest = self._write_chunks(response, f)
+            if digest != remote:
+                raise ValueError("Checksum mismatch for artifact " + str(artifact) + ": expected " + remote + ", got " + digest)
+            os.rename(tmp, filename)
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        # The digest was computed while streaming, the file is never read back
+        self._record_checksum(filename, digest)
+        if self.cache_dir and not os.path.exists(self._cache_path(remote)):
+            self._link_or_copy(filename, self._cache_path(remote))
+        return True
+
+    def _write_chunks(self, response, file):
+        h = hashlib.new(self.algorithm)
         while 1:
-            chunk = response.read(chunk_size)
-            bytes_so_far += len(chunk)
-
+            chunk = response.read(self.buffer_size)
             if not chunk:
                 break
-
+            h.update(chunk)
             file.write(chunk)
-            if report_hook:
-                report_hook(bytes_so_far, chunk_size, total_size)
-
-        return bytes_so_far
-
-    def verify_md5(self, file, remote_md5):
+        return h.hexdigest()
+
+    def _remote_checksum(self, url):
+        self._checksums_lock.acquire()
+        try:
+            if url in self._checksums:
+                return self._checksums[url]
+        finally:
+            self._checksums_lock.release()
+        # Checksum files may hold "<digest>  <filename>"
+        remote = self._request(url, "Failed to download " + self.algorithm.upper(), lambda r, info: r.read()).strip()
+        self._checksums_lock.acquire()
+        try:
+            return self._checksums.setdefault(url, remote.split()[0].lower() if remote else remote)
+        finally:
+            self._checksums_lock.release()
+
+    def verify_checksum(self, file, remote_url):
         if not os.path.exists(file):
             return False
         else:
-            local_md5 = self._local_md5(file)
-            remote = self._request(remote_md5, "Failed to download MD5", lambda r: r.read())
-            return local_md5 == remote
+            local = self._local_checksum(file)
+            remote = self._remote_checksum(remote_url)
+            return local == remote
+
+    def _local_checksum(self, file):
+        digest = self._recorded_checksum(file)
+        if digest is not None:
+            return digest
 
-    def _local_md5(self, file):
-        md5 = hashlib.md5()
+        h = hashlib.new(self.algorithm)
         with open(file, 'rb') as f:
-            for chunk in iter(lambda: f.read(8192), ''):
-                md5.update(chunk)
-        return md5.hexdigest()
+            for chunk in iter(lambda: f.read(self.buffer_size), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self._record_checksum(file, digest)
+        return digest
+
+
+def ensure_artifact(downloader, group_id, artifact_id, version, classifier, extension, dest):
+    """Download one artifact to dest unless it is already there, return whether it changed"""
+    artifact = Artifact(group_id, artifact_id, version, classifier, extension)
+
+    if os.path.isdir(dest):
+        dest = dest + "/" + artifact_id + "-" + version + "." + extension
+    if os.path.lexists(dest) and downloader.verify_checksum(dest, downloader.find_uri_for_artifact(artifact) + '.' + downloader.algorithm):
+        return dest, False
+
+    if downloader.download(artifact, dest):
+        return dest, True
+    raise ValueError("Unable to download the artifact " + str(artifact))
+
+
+def ensure_artifacts(downloader, artifacts, threads):
+    """Download a list of artifacts through a bounded pool of threads, return the result of each"""
+    results = [None] * len(artifacts)
+    pending = queue.Queue()
+    for i, spec in enumerate(artifacts):
+        pending.put((i, spec))
+
+    def worker():
+        while True:
+            try:
+                i, spec = pending.get_nowait()
+            except queue.Empty:
+                return
+            result = dict(
+                group_id=spec.get('group_id'),
+                artifact_id=spec.get('artifact_id'),
+                version=spec.get('version') or 'latest',
+                classifier=spec.get('classifier'),
+                extension=spec.get('extension') or 'jar',
+                dest=spec.get('dest'),
+            )
+            try:
+                if not result['dest']:
+                    raise ValueError("dest must be set")
+                result['dest'], result['changed'] = ensure_artifact(downloader, result['group_id'], result['artifact_id'],
+                                                                    result['version'], result['classifier'],
+                                                                    result['extension'], os.path.expanduser(result['dest']))
+            except Exception as e:
+                result['failed'] = True
+                result['msg'] = str(e)
+            results[i] = result
+
+    workers = [threading.Thread(target=worker) for i in range(max(1, min(threads, len(artifacts))))]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return results
 
 
 def main():
@@ -306,7 +575,12 @@ def main():
             state = dict(default="present", choices=["present","absent"]), # TODO - Implement a "latest" state
             dest = dict(type="path", default=None),
             validate_certs = dict(required=False, default=True, type='bool'),
-        )
+            cache_dir = dict(type="path", default=None),
+            artifacts = dict(type="list", default=None),
+            threads = dict(type="int", default=4),
+            checksum_algorithm = dict(default="md5", choices=["md5", "sha1", "sha256"]),
+        ),
+        mutually_exclusive = [['artifacts', 'group_id'], ['artifacts', 'artifact_id'], ['artifacts', 'dest']],
     )
 
     group_id = module.params["group_id"]
@@ -319,38 +593,35 @@ def main():
     repository_password = module.params["password"]
     state = module.params["state"]
     dest = module.params["dest"]
+    cache_dir = module.params["cache_dir"]
+    artifacts = module.params["artifacts"]
 
     if not repository_url:
         repository_url = "http://repo1.maven.org/maven2"
 
     #downloader = MavenDownloader(module, repository_url, repository_username, repository_password)
-    downloader = MavenDownloader(module, repository_url)
+    downloader = MavenDownloader(module, repository_url, cache_dir, module.params["checksum_algorithm"])
+
+    if artifacts:
+        results = ensure_artifacts(downloader, artifacts, module.params["threads"])
+        changed = any(r.get('changed') for r in results)
+        failed = [r for r in results if r.get('failed')]
+        if failed:
+            module.fail_json(msg="Unable to download %d of %d artifact(s)" % (len(failed), len(results)), results=results, changed=changed)
+        module.exit_json(state=state, repository_url=repository_url, results=results, changed=changed)
+
+    if dest is None:
+        module.fail_json(msg="dest is required unless artifacts is given")
 
     try:
-        artifact = Artifact(group_id, artifact_id, version, classifier, extension)
+        dest, changed = ensure_artifact(downloader, group_id, artifact_id, version, classifier, extension, dest)
     except ValueError as e:
         module.fail_json(msg=e.args[0])
 
-    prev_state = "absent"
-    if os.path.isdir(dest):
-        dest = dest + "/" + artifact_id + "-" + version + "." + extension
-    if os.path.lexists(dest) and downloader.verify_md5(dest, downloader.find_uri_for_artifact(artifact) + '.md5'):
-        prev_state = "present"
-    else:
-        path = os.path.dirname(dest)
-        if not os.path.exists(path):
-            os.makedirs(path)
-
-    if prev_state == "present":
+    if not changed:
         module.exit_json(dest=dest, state=state, changed=False)
 
-    try:
-        if downloader.download(artifact, dest):
-            module.exit_json(state=state, dest=dest, group_id=group_id, artifact_id=artifact_id, version=version, classifier=classifier, extension=extension, repository_url=repository_url, changed=True)
-        else:
-            module.fail_json(msg="Unable to download the artifact")
-    except ValueError as e:
-        module.fail_json(msg=e.args[0])
+    module.exit_json(state=state, dest=dest, group_id=group_id, artifact_id=artifact_id, version=version, classifier=classifier, extension=extension, repository_url=repository_url, changed=True)
 
 
 # import module snippets
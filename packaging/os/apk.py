@@ -52,6 +52,10 @@ options:
     required: false
     default: no
     choices: [ "yes", "no" ]
+notes:
+  - The installed packages are read once from C(/lib/apk/db/installed) and
+    all the packages in I(name) are added or deleted with a single I(apk)
+    call. The names of the packages acted upon are returned in C(packages).
 '''
 
 EXAMPLES = '''
@@ -89,6 +93,8 @@ EXAMPLES = '''
 import os
 import re
 
+APK_DB_INSTALLED = '/lib/apk/db/installed'
+
 def update_package_db(module):
     cmd = "%s update" % (APK_PATH)
     rc, stdout, stderr = module.run_command(cmd, check_rc=False)
@@ -97,22 +103,54 @@ def update_package_db(module):
     else:
         module.fail_json(msg="could not update package db")
 
-def query_package(module, name):
-    cmd = "%s -v info --installed %s" % (APK_PATH, name)
+def parse_installed_db(data):
+    # The installed database is a list of stanzas separated by blank lines,
+    # each holding one "X:value" field per line. P is the package name and
+    # V its version.
+    index = {}
+    name = None
+    for line in data.split('\n'):
+        if line.startswith('P:'):
+            name = line[2:].strip()
+        elif line.startswith('V:') and name is not None:
+            index[name] = line[2:].strip()
+        elif not line.strip():
+            name = None
+    return index
+
+def get_installed_index(module):
+    # Read the installed database once and index it by package name,
+    # falling back to a single "apk info -v" if it cannot be read
+    try:
+        f = open(APK_DB_INSTALLED)
+        try:
+            return parse_installed_db(f.read())
+        finally:
+            f.close()
+    except IOError:
+        pass
+    cmd = "%s info -v" % (APK_PATH)
     rc, stdout, stderr = module.run_command(cmd, check_rc=False)
-    if rc == 0:
-        return True
-    else:
-        return False
-
-def query_latest(module, name):
-    cmd = "%s version %s" % (APK_PATH, name)
+    if rc != 0:
+        module.fail_json(msg="could not list installed packages", stderr=stderr)
+    index = {}
+    for line in stdout.split('\n'):
+        match = re.match("^(.+)-([^-]+-r\d+)$", line.strip())
+        if match:
+            index[match.group(1)] = match.group(2)
+    return index
+
+def get_outdated_index(module):
+    # A single "apk version" reports every installed package that differs
+    # from the repositories, keep the ones that have a newer version
+    cmd = "%s version" % (APK_PATH)
     rc, stdout, stderr = module.run_command(cmd, check_rc=False)
-    search_pattern = "(%s)-[\d\.\w]+-[\d\w]+\s+(.)\s+[\d\.\w]+-[\d\w]+\s+" % (name)
-    match = re.search(search_pattern, stdout)
-    if match and match.group(2) == "<":
-        return False
-    return True
+    outdated = {}
+    for line in stdout.split('\n'):
+        match = re.match("^(.+)-([^-]+-r\d+)\s+(.)\s+(\S+)", line.strip())
+        if match and match.group(3) == "<":
+            outdated[match.group(1)] = match.group(4)
+    return outdated
 
 def upgrade_packages(module):
     if module.check_mode:
@@ -127,17 +165,17 @@ def upgrade_packages(module):
     module.exit_json(changed=True, msg="upgraded packages")
 
 def install_packages(module, names, state):
-    upgrade = False
-    uninstalled = []
-    for name in names:
-        if not query_package(module, name):
-            uninstalled.append(name)
-        elif state == 'latest' and not query_latest(module, name):
-            upgrade = True
-    if not uninstalled and not upgrade:
-        module.exit_json(changed=False, msg="package(s) already installed")
-    names = " ".join(uninstalled)
-    if upgrade:
+    installed = get_installed_index(module)
+    uninstalled = [name for name in names if name not in installed]
+    upgradable = []
+    if state == 'latest':
+        outdated = get_outdated_index(module)
+        upgradable = [name for name in names if name in installed and name in outdated]
+    if not uninstalled and not upgradable:
+        module.exit_json(changed=False, msg="package(s) already installed", packages=[])
+    packages = uninstalled + upgradable
+    names = " ".join(packages)
+    if upgradable:
         if module.check_mode:
             cmd = "%s add --upgrade --simulate %s" % (APK_PATH, names)
         else:
@@ -149,16 +187,14 @@ def install_packages(module, names, state):
             cmd = "%s add %s" % (APK_PATH, names)
     rc, stdout, stderr = module.run_command(cmd, check_rc=False)
     if rc != 0:
-        module.fail_json(msg="failed to install %s" % (names))
-    module.exit_json(changed=True, msg="installed %s package(s)" % (names))
+        module.fail_json(msg="failed to install %s" % (names), stdout=stdout, stderr=stderr)
+    module.exit_json(changed=True, msg="installed %s package(s)" % (names), packages=packages)
 
 def remove_packages(module, names):
-    installed = []
-    for name in names:
-        if query_package(module, name):
-            installed.append(name)
+    index = get_installed_index(module)
+    installed = [name for name in names if name in index]
     if not installed:
-        module.exit_json(changed=False, msg="package(s) already removed")
+        module.exit_json(changed=False, msg="package(s) already removed", packages=[])
     names = " ".join(installed)
     if module.check_mode:
         cmd = "%s del --purge --simulate %s" % (APK_PATH, names)
@@ -166,8 +202,8 @@ def remove_packages(module, names):
         cmd = "%s del --purge %s" % (APK_PATH, names)
     rc, stdout, stderr = module.run_command(cmd, check_rc=False)
     if rc != 0:
-        module.fail_json(msg="failed to remove %s package(s)" % (names))
-    module.exit_json(changed=True, msg="removed %s package(s)" % (names))
+        module.fail_json(msg="failed to remove %s package(s)" % (names), stdout=stdout, stderr=stderr)
+    module.exit_json(changed=True, msg="removed %s package(s)" % (names), packages=installed)
         
 # ==========================================
 # Main control flow.
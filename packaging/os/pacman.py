@@ -32,7 +32,11 @@ author:
     - "Indrajit Raychaudhuri (@indrajitr)"
     - "'Aaron Bull Schaefer (@elasticdog)' <aaron@elasticdog.com>"
     - "Afterburn"
-notes: []
+notes:
+    - When given a list of packages, the package states are resolved with a
+      single query of the local and sync databases and all the packages are
+      installed or removed in one pacman transaction. The names of the
+      packages acted upon are returned in C(packages).
 requirements: []
 options:
     name:
@@ -116,38 +120,70 @@ import os
 import re
 import sys
 
-def get_version(pacman_output):
-    """Take pacman -Qi or pacman -Si output and get the Version"""
-    lines = pacman_output.split('\n')
-    for line in lines:
-        if 'Version' in line:
-            return line.split(':')[1].strip()
-    return None
-
-def query_package(module, pacman_path, name, state="present"):
-    """Query the package status in both the local system and the repository. Returns a boolean to indicate if the package is installed, a second boolean to indicate if the package is up-to-date and a third boolean to indicate whether online information were available"""
-    if state == "present":
-        lcmd = "%s -Qi %s" % (pacman_path, name)
-        lrc, lstdout, lstderr = module.run_command(lcmd, check_rc=False)
-        if lrc != 0:
-            # package is not installed locally
-            return False, False, False
-
-        # get the version installed locally (if any)
-        lversion = get_version(lstdout)
-
-        rcmd = "%s -Si %s" % (pacman_path, name)
-        rrc, rstdout, rstderr = module.run_command(rcmd, check_rc=False)
-        # get the version in the repository
-        rversion = get_version(rstdout)
-
-        if rrc == 0:
-            # Return True to indicate that the package is installed locally, and the result of the version number comparison
-            # to determine if the package is up-to-date.
-            return True, (lversion == rversion), False
+def get_local_versions(module, pacman_path):
+    """Read the whole local package database with a single pacman -Q and return a dict of package name to installed version"""
+    cmd = "%s -Q" % (pacman_path)
+    rc, stdout, stderr = module.run_command(cmd, check_rc=False)
+    if rc != 0:
+        module.fail_json(msg="could not query the local package database", stderr=stderr)
+
+    versions = {}
+    for line in stdout.split('\n'):
+        fields = line.split()
+        if len(fields) == 2:
+            versions[fields[0]] = fields[1]
+    return versions
+
+def get_remote_versions(module, pacman_path, names):
+    """Query the repositories for all the given packages with a single pacman -Si and return a dict of package name to repository version"""
+    versions = {}
+    if not names:
+        return versions
+
+    cmd = "%s -Si %s" % (pacman_path, " ".join(names))
+    # pacman exits non-zero if any of the targets is missing from the
+    # repositories but still prints the ones it found, so parse regardless
+    rc, stdout, stderr = module.run_command(cmd, check_rc=False)
 
-    # package is installed but cannot fetch remote Version. Last True stands for the error
-        return True, True, True
+    name = None
+    for line in stdout.split('\n'):
+        if ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        key = key.strip()
+        if key == 'Name':
+            name = value.strip()
+        elif key == 'Version' and name is not None:
+            versions[name] = value.strip()
+            name = None
+    return versions
+
+def query_packages(module, pacman_path, names, state="present"):
+    """Query the status of all the given packages in both the local system and the repository at once. Returns a dict of package name to a tuple of a boolean to indicate if the package is installed, a second boolean to indicate if the package is up-to-date and a third boolean to indicate whether online information could not be fetched"""
+    local_versions = get_local_versions(module, pacman_path)
+
+    remote_versions = {}
+    if state == "latest":
+        installed = [name for name in names if name.split('/')[-1] in local_versions]
+        remote_versions = get_remote_versions(module, pacman_path, installed)
+
+    status = {}
+    for name in names:
+        # a package may be given as repo/name, the databases only know the name
+        pkgname = name.split('/')[-1]
+        lversion = local_versions.get(pkgname)
+        if lversion is None:
+            # package is not installed locally
+            status[name] = (False, False, False)
+        elif state != "latest":
+            status[name] = (True, True, False)
+        elif pkgname in remote_versions:
+            # Installed locally, the version number comparison determines if the package is up-to-date.
+            status[name] = (True, (lversion == remote_versions[pkgname]), False)
+        else:
+            # package is installed but cannot fetch remote Version. Last True stands for the error
+            status[name] = (True, True, True)
+    return status
 
 
 def update_package_db(module, pacman_path):
@@ -192,37 +228,34 @@ def remove_packages(module, pacman_path, packages):
     else:
         args = "R"
 
-    remove_c = 0
-    # Using a for loop incase of error, we can report the package that failed
-    for package in packages:
-        # Query the package first, to see if we even need to remove
-        installed, updated, unknown = query_package(module, pacman_path, package)
-        if not installed:
-            continue
-
-        cmd = "%s -%s %s --noconfirm" % (pacman_path, args, package)
-        rc, stdout, stderr = module.run_command(cmd, check_rc=False)
-
-        if rc != 0:
-            module.fail_json(msg="failed to remove %s" % (package))
+    # Query all the packages first, to see which we even need to remove
+    status = query_packages(module, pacman_path, packages)
+    to_remove = [package for package in packages if status[package][0]]
 
-        remove_c += 1
+    if not to_remove:
+        module.exit_json(changed=False, msg="package(s) already absent", packages=[])
 
-    if remove_c > 0:
+    # Remove everything in a single transaction
+    cmd = "%s -%s %s --noconfirm" % (pacman_path, args, " ".join(to_remove))
+    rc, stdout, stderr = module.run_command(cmd, check_rc=False)
 
-        module.exit_json(changed=True, msg="removed %s package(s)" % remove_c)
+    if rc != 0:
+        module.fail_json(msg="failed to remove %s" % (", ".join(to_remove)), stdout=stdout, stderr=stderr)
 
-    module.exit_json(changed=False, msg="package(s) already absent")
+    module.exit_json(changed=True, msg="removed %s package(s)" % len(to_remove), packages=to_remove)
 
 
 def install_packages(module, pacman_path, state, packages, package_files):
-    install_c = 0
     package_err = []
     message = ""
 
+    status = query_packages(module, pacman_path, packages, state)
+
+    to_install_repos = []
+    to_install_files = []
     for i, package in enumerate(packages):
         # if the package is installed and state == present or state == latest and is up-to-date then skip
-        installed, updated, latestError = query_package(module, pacman_path, package)
+        installed, updated, latestError = status[package]
         if latestError and state == 'latest':
             package_err.append(package)
 
@@ -230,30 +263,40 @@ def install_packages(module, pacman_path, state, packages, package_files):
             continue
 
         if package_files[i]:
-            params = '-U %s' % package_files[i]
+            to_install_files.append(package_files[i])
         else:
-            params = '-S %s' % package
+            to_install_repos.append(package)
 
-        cmd = "%s %s --noconfirm --needed" % (pacman_path, params)
+    # Install each kind of target in a single transaction, pacman -U cannot
+    # pull from the repositories and -S cannot take local files
+    if to_install_repos:
+        cmd = "%s -S %s --noconfirm --needed" % (pacman_path, " ".join(to_install_repos))
         rc, stdout, stderr = module.run_command(cmd, check_rc=False)
+        if rc != 0:
+            module.fail_json(msg="failed to install %s" % (", ".join(to_install_repos)), stdout=stdout, stderr=stderr)
 
+    if to_install_files:
+        cmd = "%s -U %s --noconfirm --needed" % (pacman_path, " ".join(to_install_files))
+        rc, stdout, stderr = module.run_command(cmd, check_rc=False)
         if rc != 0:
-            module.fail_json(msg="failed to install %s" % (package))
+            module.fail_json(msg="failed to install %s" % (", ".join(to_install_files)), stdout=stdout, stderr=stderr)
 
-        install_c += 1
+    installed = [package for i, package in enumerate(packages)
+                 if package in to_install_repos or package_files[i] in to_install_files]
 
     if state == 'latest' and len(package_err) > 0:
         message = "But could not ensure 'latest' state for %s package(s) as remote version could not be fetched." % (package_err)
 
-    if install_c > 0:
-        module.exit_json(changed=True, msg="installed %s package(s). %s" % (install_c, message))
+    if installed:
+        module.exit_json(changed=True, msg="installed %s package(s). %s" % (len(installed), message), packages=installed)
 
-    module.exit_json(changed=False, msg="package(s) already installed. %s" % (message))
+    module.exit_json(changed=False, msg="package(s) already installed. %s" % (message), packages=[])
 
 def check_packages(module, pacman_path, packages, state):
     would_be_changed = []
+    status = query_packages(module, pacman_path, packages, state)
     for package in packages:
-        installed, updated, unknown = query_package(module, pacman_path, package)
+        installed, updated, unknown = status[package]
         if ((state in ["present", "latest"] and not installed) or
                 (state == "absent" and installed) or
                 (state == "latest" and not updated)):
@@ -262,24 +305,30 @@ def check_packages(module, pacman_path, packages, state):
         if state == "absent":
             state = "removed"
         module.exit_json(changed=True, msg="%s package(s) would be %s" % (
-            len(would_be_changed), state))
+            len(would_be_changed), state), packages=would_be_changed)
     else:
-        module.exit_json(changed=False, msg="package(s) already %s" % state)
+        module.exit_json(changed=False, msg="package(s) already %s" % state, packages=[])
 
 
 def expand_package_groups(module, pacman_path, pkgs):
     expanded = []
 
-    for pkg in pkgs:
-        cmd = "%s -Sgq %s" % (pacman_path, pkg)
-        rc, stdout, stderr = module.run_command(cmd, check_rc=False)
+    # List the members of every group in the sync databases at once
+    # instead of asking pacman about each name in turn
+    cmd = "%s -Sg" % (pacman_path)
+    rc, stdout, stderr = module.run_command(cmd, check_rc=False)
 
-        if rc == 0:
+    groups = {}
+    if rc == 0:
+        for line in stdout.split('\n'):
+            fields = line.split()
+            if len(fields) == 2:
+                groups.setdefault(fields[0], []).append(fields[1])
+
+    for pkg in pkgs:
+        if pkg in groups:
             # A group was found matching the name, so expand it
-            for name in stdout.split('\n'):
-                name = name.strip()
-                if name:
-                    expanded.append(name)
+            expanded.extend(groups[pkg])
         else:
             expanded.append(pkg)
 
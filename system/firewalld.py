@@ -86,7 +86,34 @@ options:
     required: false
     default: null
     version_added: "2.1"
+  ports:
+    description:
+      - "A list of ports or port ranges, in the same form as C(port), to add/remove to/from the zone at once."
+    required: false
+    default: null
+    version_added: "2.2"
+  services:
+    description:
+      - "A list of services to add/remove to/from the zone at once."
+    required: false
+    default: null
+    version_added: "2.2"
+  rich_rules:
+    description:
+      - "A list of rich rules to add/remove to/from the zone at once."
+    required: false
+    default: null
+    version_added: "2.2"
+  sources:
+    description:
+      - "A list of sources/networks to add/remove to/from the zone at once."
+    required: false
+    default: null
+    version_added: "2.2"
 notes:
+  - The C(ports), C(services), C(rich_rules) and C(sources) lists read the zone configuration once and commit all
+    the permanent changes in a single zone update; only the items whose state differs are sent to the runtime
+    configuration. They cannot be combined with the single item options.
   - Not tested on any Debian based system.
   - Requires the python2 bindings of firewalld, who may not be installed by default if the distribution switched to python 3 
 requirements: [ 'firewalld >= 0.2.11' ]
@@ -102,6 +129,15 @@ EXAMPLES = '''
 - firewalld: source='192.168.1.0/24' zone=internal state=enabled
 - firewalld: zone=trusted interface=eth2 permanent=true state=enabled
 - firewalld: masquerade=yes state=enabled permanent=true zone=dmz
+- firewalld:
+    zone: public
+    ports: [ 8080/tcp, 8443/tcp, 161-162/udp ]
+    services: [ http, https ]
+    rich_rules:
+      - 'rule family="ipv4" source address="10.0.0.0/8" service name="ssh" accept'
+    permanent: true
+    immediate: true
+    state: enabled
 '''
 
 import os
@@ -329,6 +365,82 @@ def set_rich_rule_disabled_permanent(zone, rule):
     fw_zone.update(fw_settings)
 
 
+####################
+# batch handling
+#
+# Name of the add/remove/get methods of both the zone settings and the
+# runtime client for every kind of item
+BATCH_METHODS = dict(
+    port='Port',
+    service='Service',
+    rich_rule='RichRule',
+    source='Source',
+)
+
+def get_zone_items_permanent(fw_settings):
+    return dict(
+        port=[tuple(p) for p in fw_settings.getPorts()],
+        service=list(fw_settings.getServices()),
+        rich_rule=list(fw_settings.getRichRules()),
+        source=list(fw_settings.getSources()),
+    )
+
+def get_zone_items(zone):
+    return dict(
+        port=[tuple(p) for p in fw.getPorts(zone)],
+        service=list(fw.getServices(zone)),
+        rich_rule=list(fw.getRichRules(zone)),
+    )
+
+def diff_zone_items(current, wanted, kinds, enabled):
+    changes = []
+    for kind in kinds:
+        for item in wanted[kind]:
+            if (item in current[kind]) != enabled:
+                changes.append((kind, item))
+    return changes
+
+def item_args(item):
+    if isinstance(item, tuple):
+        return item
+    return (item,)
+
+def apply_batch(module, zone, wanted, desired_state, permanent, immediate, timeout):
+    """Snapshot the zone once and apply all the differing items, committing
+    the permanent configuration in a single zone update"""
+    enabled = (desired_state == "enabled")
+    changes = []
+
+    # Sources are only managed in the permanent configuration, as with source
+    if permanent or wanted['source']:
+        fw_zone = fw.config().getZoneByName(zone)
+        fw_settings = fw_zone.getSettings()
+        kinds = ['source']
+        if permanent:
+            kinds.extend(['port', 'service', 'rich_rule'])
+        permanent_changes = diff_zone_items(get_zone_items_permanent(fw_settings), wanted, kinds, enabled)
+        if permanent_changes and not module.check_mode:
+            for kind, item in permanent_changes:
+                if enabled:
+                    getattr(fw_settings, 'add' + BATCH_METHODS[kind])(*item_args(item))
+                else:
+                    getattr(fw_settings, 'remove' + BATCH_METHODS[kind])(*item_args(item))
+            fw_zone.update(fw_settings)
+        changes.extend([(kind, item, 'permanent') for kind, item in permanent_changes])
+
+    if (immediate or not permanent) and (wanted['port'] or wanted['service'] or wanted['rich_rule']):
+        runtime_changes = diff_zone_items(get_zone_items(zone), wanted, ['port', 'service', 'rich_rule'], enabled)
+        if not module.check_mode:
+            for kind, item in runtime_changes:
+                if enabled:
+                    getattr(fw, 'add' + BATCH_METHODS[kind])(zone, *(item_args(item) + (timeout,)))
+                else:
+                    getattr(fw, 'remove' + BATCH_METHODS[kind])(zone, *item_args(item))
+        changes.extend([(kind, item, 'runtime') for kind, item in runtime_changes])
+
+    return changes
+
+
 def main():
 
     module = AnsibleModule(
@@ -344,10 +456,18 @@ def main():
             timeout=dict(type='int',required=False,default=0),
             interface=dict(required=False,default=None),
             masquerade=dict(required=False,default=None),
+            ports=dict(type='list',required=False,default=None),
+            services=dict(type='list',required=False,default=None),
+            rich_rules=dict(type='list',required=False,default=None),
+            sources=dict(type='list',required=False,default=None),
         ),
         supports_check_mode=True
     )
-    if module.params['source'] == None and module.params['permanent'] == None:
+    batch = module.params['ports'] or module.params['services'] or module.params['rich_rules'] or module.params['sources']
+    if batch:
+        if (module.params['ports'] or module.params['services'] or module.params['rich_rules']) and module.params['permanent'] == None:
+            module.fail_json(msg='permanent is a required parameter')
+    elif module.params['source'] == None and module.params['permanent'] == None:
         module.fail_json(msg='permanent is a required parameter')
 
     if module.params['interface'] != None and module.params['zone'] == None:
@@ -394,6 +514,29 @@ def main():
         module.fail_json(msg="firewalld connection can't be established,\
                 version likely too old. Requires firewalld >= 2.0.11")
 
+    if batch:
+        for name in ['service', 'port', 'rich_rule', 'source', 'interface', 'masquerade']:
+            if module.params[name] != None:
+                module.fail_json(msg='%s cannot be combined with ports, services, rich_rules or sources' % name)
+
+        wanted = dict(port=[], service=[], rich_rule=[], source=[])
+        for item in module.params['ports'] or []:
+            if '/' not in item:
+                module.fail_json(msg='improper port format (missing protocol?) for %s' % item)
+            wanted['port'].append(tuple(item.split('/', 1)))
+        wanted['service'] = module.params['services'] or []
+        # Convert the rule strings to standard format
+        # before checking whether they are present
+        wanted['rich_rule'] = [str(Rich_Rule(rule_str=rule)) for rule in module.params['rich_rules'] or []]
+        wanted['source'] = module.params['sources'] or []
+
+        changes = apply_batch(module, zone, wanted, desired_state, permanent, immediate, timeout)
+        for kind, item, where in changes:
+            if kind == 'port':
+                item = '%s/%s' % item
+            msgs.append("Changed %s %s to %s (%s)" % (kind, item, desired_state, where))
+        module.exit_json(changed=bool(changes), msg=', '.join(msgs))
+
     modification_count = 0
     if service != None:
         modification_count += 1
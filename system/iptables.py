@@ -22,6 +22,14 @@ BINS = dict(
     ipv4='iptables',
     ipv6='ip6tables',
 )
+SAVE_BINS = dict(
+    ipv4='iptables-save',
+    ipv6='ip6tables-save',
+)
+RESTORE_BINS = dict(
+    ipv4='iptables-restore',
+    ipv6='ip6tables-restore',
+)
 
 DOCUMENTATION = '''
 ---
@@ -37,9 +45,15 @@ description:
     that are present in memory. This is the same as the behaviour of the
     "iptables" and "ip6tables" command which this module uses internally.
 notes:
-  - This module just deals with individual rules. If you need advanced
-    chaining of rules the recommended way is to template the iptables restore
-    file.
+  - This module just deals with individual rules, or with a list of
+    individual rules through C(rules). If you need advanced chaining of rules
+    the recommended way is to template the iptables restore file.
+  - With C(rules), the current table is read once with C(iptables-save) and
+    all the changes are applied in a single C(iptables-restore --noflush)
+    transaction. Rules that cannot be found in the saved table as given
+    (for instance because the kernel prints them in another form) are
+    checked individually with C(iptables -C) before being added or
+    removed, so only those rules cost an extra command.
 options:
   table:
     description:
@@ -75,7 +89,8 @@ options:
       - "Chain to operate on. This option can either be the name of a user
         defined chain or any of the builtin chains: 'INPUT', 'FORWARD',
         'OUTPUT', 'PREROUTING', 'POSTROUTING', 'SECMARK', 'CONNSECMARK'"
-    required: true
+      - Required unless C(rules) is given.
+    required: false
   protocol:
     description:
       - The protocol of the rule or of the packet to check. The specified
@@ -281,6 +296,15 @@ options:
         type/code pair, or one of the ICMP type names shown by the command 
         'iptables -p icmp -h'"
     required: false
+  rules:
+    version_added: "2.2"
+    description:
+      - A list of rules to manage in C(table) at once. Each item is a hash
+        taking the C(chain), C(state), C(action) and rule options of this
+        module, with the same meaning and defaults. When given, the rule
+        options of the module itself are ignored.
+    required: false
+    default: null
 '''
 
 EXAMPLES = '''
@@ -301,8 +325,20 @@ EXAMPLES = '''
 
 # Tag all outbound tcp packets with DSCP DiffServ class CS1
 - iptables: chain=OUTPUT jump=DSCP table=mangle set_dscp_mark_class=CS1 protocol=tcp
+
+# Manage many rules in a single iptables-restore transaction
+- iptables:
+    table: filter
+    rules:
+      - { chain: INPUT, protocol: tcp, destination_port: 22, jump: ACCEPT }
+      - { chain: INPUT, protocol: tcp, destination_port: 443, jump: ACCEPT, action: insert }
+      - { chain: INPUT, source: 8.8.8.8, jump: DROP, state: absent }
+  become: yes
 '''
 
+import re
+import shlex
+
 
 def append_param(rule, param, flag, is_list):
     if is_list:
@@ -390,43 +426,259 @@ def remove_rule(iptables_path, module, params):
     module.run_command(cmd, check_rc=True)
 
 
+# Options describing a single rule, accepted by the module itself and by each item of rules
+RULE_ARGUMENT_SPEC = dict(
+    state=dict(required=False, default='present', choices=['present', 'absent']),
+    action=dict(required=False, default='append', type='str', choices=['append', 'insert']),
+    chain=dict(required=False, default=None, type='str'),
+    protocol=dict(required=False, default=None, type='str'),
+    source=dict(required=False, default=None, type='str'),
+    destination=dict(required=False, default=None, type='str'),
+    to_destination=dict(required=False, default=None, type='str'),
+    match=dict(required=False, default=[], type='list'),
+    jump=dict(required=False, default=None, type='str'),
+    goto=dict(required=False, default=None, type='str'),
+    in_interface=dict(required=False, default=None, type='str'),
+    out_interface=dict(required=False, default=None, type='str'),
+    fragment=dict(required=False, default=None, type='str'),
+    set_counters=dict(required=False, default=None, type='str'),
+    source_port=dict(required=False, default=None, type='str'),
+    destination_port=dict(required=False, default=None, type='str'),
+    to_ports=dict(required=False, default=None, type='str'),
+    set_dscp_mark=dict(required=False,default=None, type='str'),
+    set_dscp_mark_class=dict(required=False,default=None, type='str'),
+    comment=dict(required=False, default=None, type='str'),
+    ctstate=dict(required=False, default=[], type='list'),
+    limit=dict(required=False, default=None, type='str'),
+    limit_burst=dict(required=False, default=None, type='str'),
+    uid_owner=dict(required=False, default=None, type='str'),
+    reject_with=dict(required=False, default=None, type='str'),
+    icmp_type=dict(required=False, default=None, type='str'),
+)
+
+# Long options that iptables-save prints in their short or canonical form
+OPTION_ALIASES = {
+    '--protocol': '-p',
+    '--source': '-s',
+    '--src': '-s',
+    '--destination': '-d',
+    '--dst': '-d',
+    '--match': '-m',
+    '--jump': '-j',
+    '--goto': '-g',
+    '--in-interface': '-i',
+    '--out-interface': '-o',
+    '--fragment': '-f',
+    '--source-port': '--sport',
+    '--destination-port': '--dport',
+}
+
+LIMIT_UNITS = {
+    's': 'sec', 'sec': 'sec', 'second': 'sec',
+    'm': 'min', 'min': 'min', 'minute': 'min',
+    'h': 'hour', 'hour': 'hour',
+    'd': 'day', 'day': 'day',
+}
+
+
+def normalize_address(address, ip_version):
+    if '/' not in address:
+        if ip_version == 'ipv6':
+            return address + '/128'
+        if re.match(r'^\d+\.\d+\.\d+\.\d+$', address):
+            return address + '/32'
+        return address
+    addr, mask = address.split('/', 1)
+    if re.match(r'^\d+\.\d+\.\d+\.\d+$', mask):
+        bits = ''.join([bin(int(octet))[2:].zfill(8) for octet in mask.split('.')])
+        if '01' not in bits:
+            mask = str(bits.count('1'))
+    return '%s/%s' % (addr, mask)
+
+
+def normalize_value(option, value, ip_version):
+    if option in ('-s', '-d'):
+        return normalize_address(value, ip_version)
+    if option in ('--state', '--ctstate'):
+        return ','.join(sorted(value.upper().split(',')))
+    if option == '-p':
+        return value.lower()
+    if option == '--limit' and '/' in value:
+        rate, unit = value.split('/', 1)
+        return '%s/%s' % (rate, LIMIT_UNITS.get(unit, unit))
+    if option == '--set-dscp':
+        try:
+            return '0x%02x' % int(value, 0)
+        except ValueError:
+            return value
+    return value
+
+
+def normalize_rule(args, ip_version):
+    """Turn the arguments of a rule into a hashable form that does not depend
+    on option order or spelling, so rules given to the module can be looked up
+    among the ones printed by iptables-save"""
+    options = []
+    negate = False
+    for arg in args:
+        if arg == '!':
+            negate = True
+        elif arg.startswith('-') and not arg[1:2].isdigit():
+            options.append([OPTION_ALIASES.get(arg, arg), negate, []])
+            negate = False
+        elif options:
+            if negate:
+                # old style "-s ! address" negation
+                options[-1][1] = True
+                negate = False
+            options[-1][2].append(arg)
+
+    protocols = [values[0].lower() for option, neg, values in options if option == '-p' and values]
+    normalized = []
+    for option, neg, values in options:
+        # iptables-save adds the implicit protocol match and never prints counters
+        if option == '-m' and values and values[0] in protocols:
+            continue
+        if option == '-c':
+            continue
+        values = tuple([normalize_value(option, value, ip_version) for value in values])
+        normalized.append((option, neg, values))
+    return tuple(sorted(normalized))
+
+
+def save_table(module, ip_version, table):
+    """Read the rules of table with a single iptables-save and index them by chain"""
+    cmd = [module.get_bin_path(SAVE_BINS[ip_version], True), '-t', table]
+    rc, stdout, stderr = module.run_command(cmd, check_rc=True)
+    chains = {}
+    for line in stdout.splitlines():
+        if line.startswith(':'):
+            chains.setdefault(line[1:].split()[0], [])
+        elif line.startswith('-A '):
+            args = shlex.split(line)
+            chains.setdefault(args[1], []).append(normalize_rule(args[2:], ip_version))
+    return chains
+
+
+def quote_arg(arg):
+    if not arg or re.search(r'[\s"\']', arg):
+        return '"%s"' % arg.replace('"', '\\"')
+    return arg
+
+
+def rule_params(module, item):
+    """Build the parameters of one item of rules, with the module defaults"""
+    params = dict((k, v['default']) for k, v in RULE_ARGUMENT_SPEC.items())
+    for k, v in item.items():
+        if k not in RULE_ARGUMENT_SPEC:
+            module.fail_json(msg="Unsupported option %s in rules" % k)
+        spec = RULE_ARGUMENT_SPEC[k]
+        if spec.get('type') == 'list' and not isinstance(v, list):
+            v = [x.strip() for x in str(v).split(',')]
+        elif spec.get('type', 'str') == 'str' and v is not None:
+            v = str(v)
+        if 'choices' in spec and v not in spec['choices']:
+            module.fail_json(msg="value of %s in rules must be one of: %s, got: %s" % (k, ', '.join(spec['choices']), v))
+        params[k] = v
+    if not params['chain']:
+        module.fail_json(msg="chain is required for every item of rules")
+    if params['set_dscp_mark'] and params['set_dscp_mark_class']:
+        module.fail_json(msg="set_dscp_mark and set_dscp_mark_class are mutually exclusive")
+    params['table'] = module.params['table']
+    return params
+
+
+def apply_rules(module, iptables_path, ip_version, table, rules):
+    """Compute the changes needed for a list of rules against a single
+    iptables-save of the table and commit them with one iptables-restore"""
+    chains = save_table(module, ip_version, table)
+    results = []
+    deletes = []
+    inserts = []
+    appends = []
+    for item in rules:
+        params = rule_params(module, item)
+        chain = params['chain']
+        args = construct_rule(params)
+        key = normalize_rule(args, ip_version)
+        current = chains.setdefault(chain, [])
+
+        is_present = key in current
+        if not is_present and current:
+            # iptables-save prints some options in another form than the one
+            # given (DSCP classes, ICMP type names, default limit bursts,
+            # user and host names), ask the kernel for those
+            is_present = check_present(iptables_path, module, params)
+        should_be_present = (params['state'] == 'present')
+
+        if is_present != should_be_present:
+            if should_be_present:
+                current.append(key)
+                if params['action'] == 'insert':
+                    inserts.append((chain, args))
+                else:
+                    appends.append((chain, args))
+            else:
+                if key in current:
+                    current.remove(key)
+                deletes.append((chain, args))
+
+        results.append(dict(
+            chain=chain,
+            rule=' '.join(args),
+            state=params['state'],
+            changed=(is_present != should_be_present),
+        ))
+
+    lines = []
+    for chain, args in deletes:
+        lines.append(' '.join(['-D', chain] + [quote_arg(a) for a in args]))
+    # Inserted rules end up at the top of their chain in the order given
+    positions = {}
+    for chain, args in inserts:
+        positions[chain] = positions.get(chain, 0) + 1
+        lines.append(' '.join(['-I', chain, str(positions[chain])] + [quote_arg(a) for a in args]))
+    for chain, args in appends:
+        lines.append(' '.join(['-A', chain] + [quote_arg(a) for a in args]))
+
+    if lines and not module.check_mode:
+        data = '\n'.join(['*%s' % table] + lines + ['COMMIT', ''])
+        cmd = [module.get_bin_path(RESTORE_BINS[ip_version], True), '--noflush']
+        rc, stdout, stderr = module.run_command(cmd, data=data, check_rc=False)
+        if rc != 0:
+            module.fail_json(msg="iptables-restore failed: %s" % stderr, restore=data, results=results)
+
+    return results
+
+
 def main():
+    argument_spec = dict(
+        table=dict(required=False, default='filter', choices=['filter', 'nat', 'mangle', 'raw', 'security']),
+        ip_version=dict(required=False, default='ipv4', choices=['ipv4', 'ipv6']),
+        rules=dict(required=False, default=None, type='list'),
+    )
+    argument_spec.update(RULE_ARGUMENT_SPEC)
     module = AnsibleModule(
         supports_check_mode=True,
-        argument_spec=dict(
-            table=dict(required=False, default='filter', choices=['filter', 'nat', 'mangle', 'raw', 'security']),
-            state=dict(required=False, default='present', choices=['present', 'absent']),
-            action=dict(required=False, default='append', type='str', choices=['append', 'insert']),
-            ip_version=dict(required=False, default='ipv4', choices=['ipv4', 'ipv6']),
-            chain=dict(required=True, default=None, type='str'),
-            protocol=dict(required=False, default=None, type='str'),
-            source=dict(required=False, default=None, type='str'),
-            destination=dict(required=False, default=None, type='str'),
-            to_destination=dict(required=False, default=None, type='str'),
-            match=dict(required=False, default=[], type='list'),
-            jump=dict(required=False, default=None, type='str'),
-            goto=dict(required=False, default=None, type='str'),
-            in_interface=dict(required=False, default=None, type='str'),
-            out_interface=dict(required=False, default=None, type='str'),
-            fragment=dict(required=False, default=None, type='str'),
-            set_counters=dict(required=False, default=None, type='str'),
-            source_port=dict(required=False, default=None, type='str'),
-            destination_port=dict(required=False, default=None, type='str'),
-            to_ports=dict(required=False, default=None, type='str'),
-            set_dscp_mark=dict(required=False,default=None, type='str'),
-            set_dscp_mark_class=dict(required=False,default=None, type='str'),
-            comment=dict(required=False, default=None, type='str'),
-            ctstate=dict(required=False, default=[], type='list'),
-            limit=dict(required=False, default=None, type='str'),
-            limit_burst=dict(required=False, default=None, type='str'),
-            uid_owner=dict(required=False, default=None, type='str'),
-            reject_with=dict(required=False, default=None, type='str'),
-            icmp_type=dict(required=False, default=None, type='str'),
-        ),
+        argument_spec=argument_spec,
+        required_one_of=[['chain', 'rules']],
         mutually_exclusive=(
             ['set_dscp_mark', 'set_dscp_mark_class'],
         ),
     )
+    if not module.params['rules'] and not module.params['chain']:
+        module.fail_json(msg="chain is required when rules is empty")
+    if module.params['rules']:
+        ip_version = module.params['ip_version']
+        iptables_path = module.get_bin_path(BINS[ip_version], True)
+        results = apply_rules(module, iptables_path, ip_version, module.params['table'], module.params['rules'])
+        module.exit_json(
+            changed=any([r['changed'] for r in results]),
+            ip_version=ip_version,
+            table=module.params['table'],
+            results=results,
+        )
+
     args = dict(
         changed=False,
         failed=False,
@@ -32,7 +32,8 @@ options:
     aliases: [ 'host' ]
     description:
       - The host to add or remove (must match a host specified in key)
-    required: true
+      - Required unless I(hosts) is given.
+    required: false
     default: null
   key:
     description:
@@ -50,6 +51,17 @@ options:
     choices: [ "present", "absent" ]
     required: no
     default: present
+  hosts:
+    description:
+      - A list of hosts to add or remove at once instead of I(name). Each item is a hash with the I(name), I(key) and
+        I(state) keys, with the same meaning as the module options.
+      - The known_hosts file is parsed once, hashed (C(|1|)) entries are matched in-process, all the changes are made
+        in memory and the file is written once. Unlike C(ssh-keygen -R), no C(.old) backup is kept.
+      - Removing a host only takes its name out of lines listing several hosts. Wildcard and negated patterns
+        are not expanded, an item only matches them when its I(name) is the pattern as written.
+    required: no
+    default: null
+    version_added: "2.2"
 requirements: [ ]
 author: "Matthew Vernon (@mcv21)"
 '''
@@ -60,6 +72,14 @@ EXAMPLES = '''
   known_hosts: path='/etc/ssh/ssh_known_hosts'
                name='foo.com.invalid'
                key="{{ lookup('file', 'pubkeys/foo.com.invalid') }}"
+
+# Add many hosts and remove another one in a single pass over the file
+- known_hosts:
+    path: /etc/ssh/ssh_known_hosts
+    hosts:
+      - { name: foo.com.invalid, key: "{{ lookup('file', 'pubkeys/foo.com.invalid') }}" }
+      - { name: bar.com.invalid, key: "{{ lookup('file', 'pubkeys/bar.com.invalid') }}" }
+      - { name: old.com.invalid, state: absent }
 '''
 
 # Makes sure public host keys are present or absent in the given known_hosts
@@ -74,8 +94,12 @@ EXAMPLES = '''
 
 import os
 import os.path
+import re
 import tempfile
 import errno
+import hmac
+import base64
+import hashlib
 
 def enforce_state(module, params):
     """
@@ -232,19 +256,211 @@ def search_for_host_key(module,host,key,path,sshkeygen):
     #No match found, return current and replace
     return True, True
 
+def hash_host(host,salt):
+    '''Hash host the way HashKnownHosts does, with the given raw salt'''
+    mac=hmac.new(salt,host,hashlib.sha1)
+    return base64.b64encode(mac.digest())
+
+def match_pattern(pattern,host):
+    if '*' not in pattern and '?' not in pattern:
+        return pattern==host
+    regex=re.escape(pattern).replace('\\*','.*').replace('\\?','.')
+    return re.match('^%s$' % regex,host) is not None
+
+def match_host_field(field,host):
+    '''match_host_field(field,host) -> Boolean
+
+    Does the host field of a known_hosts line match host? Handles hashed
+    (|1|salt|hash) fields as well as comma separated lists of patterns,
+    including wildcards and negations.
+    '''
+    host=host.lower()
+    if field.startswith('|1|'):
+        try:
+            salt,hashed=field[3:].split('|',1)
+            return hash_host(host,base64.b64decode(salt))==hashed
+        except (ValueError,TypeError):
+            return False
+    matched=False
+    for pattern in field.lower().split(','):
+        if pattern.startswith('!'):
+            if match_pattern(pattern[1:],host):
+                return False
+        elif match_pattern(pattern,host):
+            matched=True
+    return matched
+
+def parse_known_hosts_line(line):
+    '''parse_known_hosts_line(line) -> (marker,hosts,keytype,keydata) or None
+
+    Returns None for blank lines, comments and lines that cannot be parsed.
+    '''
+    fields=line.split()
+    if not fields or fields[0].startswith('#'):
+        return None
+    marker=None
+    #The optional "marker" field, used for @cert-authority or @revoked
+    if fields[0].startswith('@'):
+        marker=fields.pop(0)
+    if len(fields)<3:
+        return None
+    return marker,fields[0],fields[1],fields[2]
+
+class KnownHostsIndex(object):
+    '''In-memory copy of a known_hosts file, indexed by host name.
+
+    Host names and patterns map straight to the lines listing them as
+    written, while hashed entries are kept aside and matched when looked up.
+    '''
+
+    def __init__(self,lines):
+        self.lines=list(lines)
+        self.entries={}
+        self.by_host={}
+        self.hashed=[]
+        for i,line in enumerate(self.lines):
+            self._index(i,line)
+
+    def _index(self,i,line):
+        entry=parse_known_hosts_line(line)
+        if entry is None:
+            return
+        field=entry[1]
+        self.entries[i]=entry
+        if field.startswith('|'):
+            self.hashed.append(i)
+        else:
+            for name in field.lower().split(','):
+                self.by_host.setdefault(name,[]).append(i)
+
+    def find(self,host):
+        '''Return the indexes of the lines naming host, in file order'''
+        found=[i for i in self.by_host.get(host.lower(),[]) if i in self.entries]
+        found.extend([i for i in self.hashed if i in self.entries and match_host_field(self.entries[i][1],host)])
+        return sorted(found)
+
+    def remove(self,host):
+        '''Remove host, keeping the other hosts of the lines listing several'''
+        host=host.lower()
+        for i in self.find(host):
+            marker,field,keytype,keydata=self.entries[i]
+            names=[name for name in field.split(',') if name.lower()!=host]
+            if field.startswith('|') or not names:
+                self.lines[i]=None
+                del self.entries[i]
+                continue
+            prefix,rest=re.match(r'(\s*(?:@\S+\s+)?)\S+(.*)$',self.lines[i],re.S).groups()
+            self.lines[i]='%s%s%s' % (prefix,','.join(names),rest)
+            self.entries[i]=(marker,','.join(names),keytype,keydata)
+            self.by_host[host].remove(i)
+
+    def add(self,line):
+        self.lines.append(line)
+        self._index(len(self.lines)-1,line)
+
+    def contents(self):
+        return ''.join([line for line in self.lines if line is not None])
+
+def enforce_state_bulk(module,params):
+    '''
+    Add or remove many keys, reading and writing the file only once.
+    '''
+    path=params.get("path")
+    lines=[]
+    try:
+        inf=open(path,"r")
+        lines=inf.readlines()
+        inf.close()
+    except IOError, e:
+        if e.errno != errno.ENOENT:
+            module.fail_json(msg="Failed to read %s: %s" % \
+                                 (path,str(e)))
+    # Make sure appended entries start on a line of their own
+    if lines and not lines[-1].endswith('\n'):
+        lines[-1]+='\n'
+    index=KnownHostsIndex(lines)
+
+    results=[]
+    for item in params["hosts"]:
+        host=item.get("name") or item.get("host")
+        key=item.get("key")
+        state=item.get("state","present")
+        if not host:
+            module.fail_json(msg="name is required for every item of hosts")
+        if state not in ("present","absent"):
+            module.fail_json(msg="state must be present or absent for %s" % host)
+        if key is None and state != "absent":
+            module.fail_json(msg="No key specified when adding host %s" % host)
+
+        new_entry=None
+        if key is not None:
+            # Trailing newline in files gets lost, so re-add if necessary
+            if key[-1] != '\n':
+                key+='\n'
+            # Checked in-process instead of one ssh-keygen -F per key
+            new_entry=parse_known_hosts_line(key)
+            if new_entry is None or not match_host_field(new_entry[1],host):
+                module.fail_json(msg="Host parameter %s does not match hashed host field in supplied key" % host)
+
+        found=index.find(host)
+        current=len(found)>0
+        replace=False
+        if current and key is not None and state=="present":
+            #Compare everything but the host field, like search_for_host_key
+            replace=True
+            for i in found:
+                marker,hosts,keytype,keydata=index.entries[i]
+                if (marker,keytype,keydata)==(new_entry[0],new_entry[2],new_entry[3]):
+                    replace=False
+                    break
+
+        changed=replace or ((state=="present") != current)
+        if replace or (current and state=="absent"):
+            index.remove(host)
+        if replace or (not current and state=="present"):
+            index.add(key)
+        results.append(dict(name=host,state=state,changed=changed))
+
+    params['results']=results
+    params['changed']=any([r['changed'] for r in results])
+    if not params['changed'] or module.check_mode:
+        return params
+
+    try:
+        outf=tempfile.NamedTemporaryFile(dir=os.path.dirname(path))
+        outf.write(index.contents())
+        outf.flush()
+        module.atomic_move(outf.name,path)
+    except (IOError,OSError),e:
+        module.fail_json(msg="Failed to write to file %s: %s" % \
+                             (path,str(e)))
+
+    try:
+        outf.close()
+    except:
+        pass
+
+    return params
+
 def main():
 
     module = AnsibleModule(
         argument_spec = dict(
-            name      = dict(required=True,  type='str', aliases=['host']),
+            name      = dict(required=False,  type='str', aliases=['host']),
             key       = dict(required=False,  type='str'),
             path      = dict(default="~/.ssh/known_hosts", type='path'),
             state     = dict(default='present', choices=['absent','present']),
+            hosts     = dict(required=False,  type='list'),
             ),
+        required_one_of = [['name','hosts']],
+        mutually_exclusive = [['name','hosts'],['key','hosts']],
         supports_check_mode = True
         )
 
-    results = enforce_state(module,module.params)
+    if module.params['hosts']:
+        results = enforce_state_bulk(module,module.params)
+    else:
+        results = enforce_state(module,module.params)
     module.exit_json(**results)
 
 # import module snippets
@@ -0,0 +1,87 @@
+# Tests for the HAProxy socket client of network/haproxy.py
+#
+# Run with: python -m unittest discover -s test -p 'test_*.py'
+
+import imp
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+haproxy = imp.load_source('haproxy', os.path.join(os.path.dirname(__file__), '..', '..', 'network', 'haproxy.py'))
+
+RESPONSES = {
+    'prompt': '',
+    'get weight www/web1': '1 (initial 1)\n',
+    'enable server www/web1': '',
+    'set weight www/web1 10': '',
+    'show stat': '# pxname,svname,status\nwww,web1,UP\n',
+}
+
+
+class FakeHAProxy(threading.Thread):
+    """
+    Answers like HAProxy in interactive mode: every ';' separated command
+    of a line gets its output followed by its own prompt.
+    """
+
+    def __init__(self, path):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(1)
+        self.received = []
+
+    def run(self):
+        conn = self.server.accept()[0]
+        data = ''
+        while True:
+            buf = conn.recv(1024)
+            if not buf:
+                break
+            data += buf
+            while '\n' in data:
+                line, data = data.split('\n', 1)
+                self.received.append(line)
+                if line == 'quit':
+                    conn.close()
+                    return
+                for cmd in line.split(';'):
+                    conn.sendall(RESPONSES[cmd.strip()] + haproxy.PROMPT)
+        conn.close()
+
+
+class HAProxySocketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, 'haproxy.sock')
+        self.server = FakeHAProxy(path)
+        self.server.start()
+        self.client = haproxy.HAProxySocket(path)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.join(5)
+        self.server.server.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_chained_commands(self):
+        output = self.client.execute('get weight www/web1 ; enable server www/web1; set weight www/web1 10')
+        self.assertEqual(output, '1 (initial 1)\n')
+        # The next response must not start with leftovers of the chained commands
+        self.assertEqual(self.client.execute('show stat'), RESPONSES['show stat'])
+        self.assertEqual(self.server.received, [
+            'prompt',
+            'get weight www/web1',
+            'enable server www/web1',
+            'set weight www/web1 10',
+            'show stat',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()